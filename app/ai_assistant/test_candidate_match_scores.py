@@ -0,0 +1,44 @@
+"""
+Тесты нормализации match_score при построении CandidateMatch
+"""
+from types import SimpleNamespace
+
+from app.services.hr_candidate_search_service import HRCandidateSearchService, _normalize_llm_score
+
+
+def _make_user():
+    return SimpleNamespace(
+        id=1,
+        display_name="Иван Петров",
+        email="ivan@example.com",
+        work_experience=[],
+        other_competencies=["Python"],
+        programming_languages=["Python"],
+    )
+
+
+def test_fallback_with_negative_similarity():
+    """Отрицательное сходство из <#> не должно ломать валидацию CandidateMatch"""
+    match = HRCandidateSearchService()._create_fallback_candidate_match(_make_user(), -0.3)
+    assert match.match_score == 0.0
+    assert match.similarity_score == -0.3
+
+
+def test_strong_match_is_clamped():
+    match = HRCandidateSearchService()._create_strong_candidate_match(_make_user(), 1.0001)
+    assert match.match_score == 1.0
+
+
+def test_llm_score_in_percent():
+    assert _normalize_llm_score(85) == 0.85
+    assert _normalize_llm_score("72%") == 0.72
+    assert _normalize_llm_score(0.4) == 0.4
+    assert _normalize_llm_score(-5) == 0.0
+    assert _normalize_llm_score(None) == 0.5
+
+
+if __name__ == "__main__":
+    test_fallback_with_negative_similarity()
+    test_strong_match_is_clamped()
+    test_llm_score_in_percent()
+    print("✅ Все тесты пройдены")
@@ -0,0 +1,41 @@
+"""
+Тест сериализации списка сообщений чата, загруженных из БД
+"""
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, ChatMessage, ChatSession
+from app.schemas import CHAT_MESSAGE_LIST_ADAPTER, dump_list_json
+
+
+def test_list_messages_from_db():
+    """metadata в ответе берётся из колонки message_metadata, None-поля не выбрасываются"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ChatSession.__table__, ChatMessage.__table__])
+    db = sessionmaker(bind=engine)()
+
+    chat_session = ChatSession(user_id=1)
+    db.add(chat_session)
+    db.flush()
+    db.add_all([
+        ChatMessage(session_id=chat_session.id, role="user", content="Привет"),
+        ChatMessage(
+            session_id=chat_session.id, role="assistant", content="Здравствуйте!",
+            message_metadata={"response_type": "general"},
+        ),
+    ])
+    db.commit()
+
+    messages = db.query(ChatMessage).order_by(ChatMessage.id).all()
+    data = json.loads(dump_list_json(CHAT_MESSAGE_LIST_ADAPTER, messages))
+
+    assert [m["role"] for m in data] == ["user", "assistant"]
+    assert data[0]["metadata"] is None
+    assert data[1]["metadata"] == {"response_type": "general"}
+
+
+if __name__ == "__main__":
+    test_list_messages_from_db()
+    print("✅ Все тесты пройдены")
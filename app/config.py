@@ -19,6 +19,12 @@ class Settings(BaseSettings):
 
     upload_dir: str = Field("uploads", validation_alias="UPLOAD_DIR")
 
+    # Строгая проверка email через email-validator при регистрации (по умолчанию — только регулярка)
+    strict_email_validation: bool = Field(False, validation_alias="STRICT_EMAIL_VALIDATION")
+
+    # Уровень логирования AI-ассистента (DEBUG включает трассировку запросов к LLM)
+    ai_assistant_log_level: str = Field("INFO", validation_alias="AI_ASSISTANT_LOG_LEVEL")
+
     # Настройки сервиса анализа резюме
     agent_id: str | None = Field(None, validation_alias="AGENT_ID")
     api_key: str | None = Field(None, validation_alias="API_KEY")
@@ -44,6 +50,12 @@ class Settings(BaseSettings):
     heroku_ai_model: str | None = Field(None, validation_alias="INFERENCE_MODEL_ID")
     scibox_embeddings_api_key: str | None = Field("sk-qyu9jfUQ5rpT5RqfjyEjlg", validation_alias="SCIBOX_EMBEDDINGS_API_KEY")
     scibox_embeddings_base_url: str | None = Field("http://176.119.5.23:4000/v1", validation_alias="SCIBOX_EMBEDDINGS_BASE_URL")
+    # Максимум одновременных запросов к LLM из одного процесса (лимит QPM провайдера)
+    llm_max_concurrency: int = Field(8, validation_alias="LLM_MAX_CONCURRENCY")
+    # Поиск кандидатов: AI-анализ только для векторного сходства в этом диапазоне,
+    # ниже — базовая оценка, выше — сильный кандидат без вызова LLM
+    candidate_ai_min_similarity: float = Field(0.35, validation_alias="CANDIDATE_AI_MIN_SIMILARITY")
+    candidate_ai_max_similarity: float = Field(0.85, validation_alias="CANDIDATE_AI_MAX_SIMILARITY")
     # S3 (AWS-совместимое) хранилище
     s3_bucket: str | None = Field(None, validation_alias="S3_BUCKET")
     s3_region: str | None = Field(None, validation_alias="AWS_REGION")
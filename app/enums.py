@@ -0,0 +1,39 @@
+"""
+Перечисления предметной области.
+Вынесены из app.models, чтобы схемы могли импортировать их без загрузки SQLAlchemy.
+"""
+
+import enum
+
+class UserRole(enum.Enum):
+    HR = "hr"
+    USER = "user"
+
+class EmploymentType(enum.Enum):
+    FULL_TIME = "full_time"
+    PART_TIME = "part_time"
+    CONTRACT = "contract"
+    FREELANCE = "freelance"
+    INTERNSHIP = "internship"
+
+class VacancyStatus(enum.Enum):
+    OPEN = "open"
+    CLOSED = "closed"
+
+class InterviewStatus(enum.Enum):
+    NOT_STARTED = "not_started"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+class ApplicationStatus(enum.Enum):
+    PENDING = "pending"  # На рассмотрении
+    INTERVIEW_SCHEDULED = "interview_scheduled"  # Интервью назначено
+    INTERVIEW_COMPLETED = "interview_completed"  # Интервью пройдено
+    ACCEPTED = "accepted"  # Принято
+    REJECTED = "rejected"  # Отклонено
+
+class ProcessingStatus(enum.Enum):
+    PENDING = "pending"  # Ожидает обработки
+    PROCESSING = "processing"  # В процессе обработки
+    COMPLETED = "completed"  # Обработка завершена
+    FAILED = "failed"  # Ошибка обработки
@@ -82,6 +82,9 @@ async def startup_event():
         start_job_workers_and_recover()
         log_startup("Фоновая очередь обработки резюме запущена!")
         
+        # Создаём AI-ассистента заранее: пул соединений и индекс вакансий строятся один раз
+        await _warmup_ai_assistant()
+        
         log_startup("VTB HR Backend готов к работе!")
     except Exception as e:
         logger.error(f"STARTUP ERROR: {str(e)}")
@@ -89,6 +92,40 @@ async def startup_event():
         log_startup("Приложение запущено с ошибками базы данных")
 
 
+async def _warmup_ai_assistant():
+    from app.database import SessionLocal
+    from app.services.ai_assistant_service import get_ai_assistant_service
+    
+    service = get_ai_assistant_service()
+    db = SessionLocal()
+    try:
+        await service.warmup(db)
+        # Сохраняем векторы вакансий, посчитанные при прогреве, иначе close() их откатит
+        db.commit()
+        log_startup("AI-ассистент прогрет!")
+    except Exception as e:
+        # Индекс досинхронизируется при первом запросе
+        logger.warning(f"AI assistant warmup failed: {str(e)}")
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Закрываем пулы HTTP-соединений сервисов, если они успели создаться
+    from app.services import (
+        ai_assistant_service, candidate_selection_service, hr_ai_assistant_service, hr_candidate_search_service,
+    )
+    if ai_assistant_service._ai_assistant_service is not None:
+        await ai_assistant_service._ai_assistant_service.aclose()
+    if candidate_selection_service.candidate_selection_service is not None:
+        await candidate_selection_service.candidate_selection_service.aclose()
+    if hr_ai_assistant_service._hr_ai_assistant_service is not None:
+        await hr_ai_assistant_service._hr_ai_assistant_service.aclose()
+    if hr_candidate_search_service._hr_search_service is not None:
+        await hr_candidate_search_service._hr_search_service.aclose()
+
+
 @app.get("/")
 async def root():
     logger.info("Root endpoint accessed")
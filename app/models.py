@@ -1,46 +1,13 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum, Float, Date
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, Enum, Float, Date, Index, LargeBinary, cast, func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property
 from datetime import datetime, date
 from sqlalchemy.orm import mapped_column
-from pgvector.sqlalchemy import Vector
-import enum
+from pgvector.sqlalchemy import Vector, HALFVEC
+from app.enums import UserRole, EmploymentType, VacancyStatus, InterviewStatus, ApplicationStatus, ProcessingStatus
 
 Base = declarative_base()
 
-class UserRole(enum.Enum):
-    HR = "hr"
-    USER = "user"
-
-class EmploymentType(enum.Enum):
-    FULL_TIME = "full_time"
-    PART_TIME = "part_time"
-    CONTRACT = "contract"
-    FREELANCE = "freelance"
-    INTERNSHIP = "internship"
-
-class VacancyStatus(enum.Enum):
-    OPEN = "open"
-    CLOSED = "closed"
-
-class InterviewStatus(enum.Enum):
-    NOT_STARTED = "not_started"
-    IN_PROGRESS = "in_progress"
-    COMPLETED = "completed"
-
-class ApplicationStatus(enum.Enum):
-    PENDING = "pending"  # На рассмотрении
-    INTERVIEW_SCHEDULED = "interview_scheduled"  # Интервью назначено
-    INTERVIEW_COMPLETED = "interview_completed"  # Интервью пройдено
-    ACCEPTED = "accepted"  # Принято
-    REJECTED = "rejected"  # Отклонено
-
-class ProcessingStatus(enum.Enum):
-    PENDING = "pending"  # Ожидает обработки
-    PROCESSING = "processing"  # В процессе обработки
-    COMPLETED = "completed"  # Обработка завершена
-    FAILED = "failed"  # Ошибка обработки
-
 class User(Base):
     __tablename__ = "users"
     
@@ -76,6 +43,17 @@ class User(Base):
     resume_upload_skipped = Column(Boolean, default=False)  # Пропустил загрузку резюме
     
     xp = Column(Integer, default=0)
+
+    # Отображаемое имя, вычисляется в SQL: full_name -> "first_name last_name" -> username.
+    # Отложенное: загружается только при явном запросе (load_only / undefer)
+    display_name = column_property(
+        func.coalesce(
+            func.nullif(full_name, ''),
+            func.nullif(func.trim(func.coalesce(first_name, '') + ' ' + func.coalesce(last_name, '')), ''),
+            username,
+        ),
+        deferred=True,
+    )
     
     vacancies = relationship("Vacancy", back_populates="creator")
     resumes = relationship("Resume", back_populates="user")
@@ -226,6 +204,11 @@ class Vec_profile(Base):
     """
     Векторные профили пользователей для семантического поиска.
     Хранит embedding представления профилей для AI-поиска кандидатов.
+    Векторы хранятся нормированными к единичной длине: косинусное сходство
+    считается как скалярное произведение (<#>), поэтому записывать сюда
+    ненормированные векторы нельзя.
+    Индекс строится по FP16-копии (halfvec) — вдвое меньше FP32, точные
+    значения остаются в vector и используются для переранжирования.
     """
     __tablename__ = "vec_profiles"
 
@@ -237,6 +220,34 @@ class Vec_profile(Base):
     user = relationship("User")
 
 
+# HNSW-индекс по halfvec-выражению для ранжирования по скалярному произведению (<#>);
+# запросы должны сортировать по тому же выражению cast(vector, HALFVEC(1024))
+Index(
+    "ix_vec_profiles_vector_halfvec_hnsw",
+    cast(Vec_profile.vector, HALFVEC(1024)).label("vector_half"),
+    postgresql_using="hnsw", postgresql_ops={"vector_half": "halfvec_ip_ops"},
+)
+
+
+class Vec_vacancy(Base):
+    """
+    Векторные представления вакансий для подбора вакансий AI-ассистентом.
+    content_hash — sha256 текста вакансии: при его изменении вектор пересчитывается.
+    vector_q — int8-копия вектора (см. app.services.quantization),
+    по которой идёт ранжирование: в 4 раза меньше данных, чем float32.
+    """
+    __tablename__ = "vec_vacancies"
+
+    vacancy_id = Column(Integer, ForeignKey("vacancies.id"), primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    vector = mapped_column(Vector(1024))  # bge-m3 embeddings (1024 измерения)
+    vector_q = Column(LargeBinary)  # int8[1024]
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    vacancy = relationship("Vacancy")
+
+
 class DevelopmentRoadmap(Base):
     __tablename__ = "development_roadmaps"
 
@@ -270,6 +281,9 @@ class ChatSession(Base):
     user = relationship("User")
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
 
+    # Поиск сессии пользователя по (id, user_id) идёт по одному индексу
+    __table_args__ = (Index("ix_chat_sessions_user_id_id", "user_id", "id"),)
+
 class ChatMessage(Base):
     """
     Отдельные сообщения в чате с AI-ассистентом.
@@ -9,13 +9,14 @@ AI Assistant Router - API эндпоинты для персонального 
 - Статистика работы ассистента
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, func, or_, String
 from typing import List, Optional
 from datetime import datetime, timedelta
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.auth import get_current_user
 from app.models import (
     User, ChatSession, ChatMessage, Course, AssistantRecommendation, UserRole
@@ -27,7 +28,8 @@ from app.schemas import (
     # Specialized schemas
     CourseRecommendationRequest, CourseRecommendationResponse,
     CareerGuidanceRequest, CareerGuidanceResponse,
-    CourseResponse, AssistantStatsResponse
+    CourseResponse, AssistantStatsResponse,
+    CHAT_MESSAGE_LIST_ADAPTER, dump_list_json
 )
 from app.services.ai_assistant_service import get_ai_assistant_service
 
@@ -61,7 +63,8 @@ async def send_message_to_assistant(
         # Обрабатываем сообщение
         response = await assistant_service.process_chat_message(request, current_user, db)
         
-        return response
+        # Сериализуем сразу в JSON через pydantic-core, минуя повторную валидацию FastAPI
+        return Response(content=response.model_dump_json(), media_type="application/json")
         
     except Exception as e:
         print(f"❌ AI Assistant error: {e}")
@@ -70,6 +73,38 @@ async def send_message_to_assistant(
             detail=f"Ошибка при обработке сообщения: {str(e)}"
         )
 
+@router.post("/chat/stream")
+async def stream_message_to_assistant(
+    request: AssistantChatRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    🤖 Потоковая версия /chat (Server-Sent Events)
+    
+    События:
+    - delta: {"content": "..."} — очередной фрагмент текста ответа
+    - done: полный AssistantChatResponse после сохранения в БД
+    """
+    user_id = current_user.id
+    assistant_service = get_ai_assistant_service()
+
+    async def event_stream():
+        # Сессия БД живёт столько же, сколько поток: зависимость get_db
+        # закрывается до отправки тела StreamingResponse
+        db = SessionLocal()
+        try:
+            user = db.get(User, user_id)
+            async for event in assistant_service.stream_chat_message(request, user, db):
+                yield event
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/sessions", response_model=List[ChatSessionResponse])
 async def get_chat_sessions(
     limit: int = Query(10, ge=1, le=50),
@@ -154,9 +189,12 @@ async def get_chat_messages(
         # Получаем сообщения
         messages = db.query(ChatMessage).filter(
             ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at).offset(skip).limit(limit).all()
+        ).order_by(ChatMessage.created_at, ChatMessage.id).offset(skip).limit(limit).all()
         
-        return messages
+        return Response(
+            content=dump_list_json(CHAT_MESSAGE_LIST_ADAPTER, messages),
+            media_type="application/json"
+        )
         
     except HTTPException:
         raise
@@ -241,7 +279,7 @@ async def get_career_guidance(
             
             missing_profile_fields = []
 
-        return CareerGuidanceResponse(
+        guidance = CareerGuidanceResponse(
             advice=advice,
             action_plan=action_plan,
             courses=[CourseResponse(
@@ -258,6 +296,7 @@ async def get_career_guidance(
             profile_completeness=profile_analysis["completeness"]["percentage"],
             missing_profile_fields=missing_profile_fields
         )
+        return Response(content=guidance.model_dump_json(), media_type="application/json")
         
     except Exception as e:
         print(f"❌ Career guidance error: {e}")
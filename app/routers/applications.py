@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks, Response
+from sqlalchemy.orm import Session, joinedload, selectinload, raiseload
 from typing import List, Optional
 from app.database import get_db
 from app.models import Interview, User, Vacancy, Resume, ApplicationStatus, ProcessingStatus
 from app.auth import get_current_user, get_current_hr_user
-from app.schemas import ResumeResponse, ApplicationCreate
+from app.schemas import ResumeResponse, ApplicationCreate, RESUME_LIST_ADAPTER, dump_list_json
 from app.services.async_resume_processor import async_resume_processor
 from datetime import datetime
 import os
@@ -82,9 +82,10 @@ def get_my_applications(
     current_user: User = Depends(get_current_user)
 ):
     """Получение заявок текущего пользователя"""
-    return db.query(Resume).join(Vacancy).filter(
+    applications = db.query(Resume).join(Vacancy).filter(
         Resume.user_id == current_user.id
     ).order_by(Resume.uploaded_at.desc()).all()
+    return Response(content=dump_list_json(RESUME_LIST_ADAPTER, applications), media_type="application/json")
 
 
 @router.get("/interview/{resume_id}")
@@ -210,7 +211,7 @@ def get_all_applications(
     # Сортировка по дате загрузки (последние сверху)
     query = query.order_by(Resume.uploaded_at.desc())
     
-    return query.all()
+    return Response(content=dump_list_json(RESUME_LIST_ADAPTER, query.all()), media_type="application/json")
 
 @router.get("/{application_id}", response_model=ResumeResponse)
 def get_application_details(
@@ -219,7 +220,13 @@ def get_application_details(
     current_user: User = Depends(get_current_user)
 ):
     """Получение деталей заявки"""
-    application = db.query(Resume).filter(Resume.id == application_id).first()
+    # Загружаем ровно те связи, что нужны ResumeResponse; остальные lazy-load запрещены
+    application = db.query(Resume).options(
+        selectinload(Resume.user),
+        selectinload(Resume.vacancy),
+        selectinload(Resume.analysis),
+        raiseload('*')
+    ).filter(Resume.id == application_id).first()
     
     if not application:
         raise HTTPException(
@@ -3,15 +3,29 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User
+from app.models import User, UserRole, EmploymentType
 from app.schemas import UserCreate, UserLogin, UserResponse, Token, UserProfileUpdate
 from app.auth import get_password_hash, verify_password, create_access_token, get_current_user
 from app.config import settings
 
 router = APIRouter()
 
+def _validate_email_strict(email: str) -> str:
+    """Полная проверка email через email-validator (включается STRICT_EMAIL_VALIDATION)"""
+    from email_validator import validate_email, EmailNotValidError
+    try:
+        return validate_email(email, check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid email: {e}"
+        )
+
 @router.post("/register", response_model=UserResponse)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
+    if settings.strict_email_validation:
+        user.email = _validate_email_strict(user.email)
+
     db_user = db.query(User).filter(
         (User.username == user.username) | (User.email == user.email)
     ).first()
@@ -37,7 +51,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         username=user.username,
         email=user.email,
         hashed_password=hashed_password,
-        role=user.role,
+        role=UserRole(user.role),
         full_name=user.full_name,
         first_name=first_name,
         last_name=last_name
@@ -100,6 +114,8 @@ def update_user_profile(
     """Обновление профиля пользователя"""
     # Обновляем только переданные поля
     update_data = profile_update.dict(exclude_unset=True)
+    if update_data.get('employment_type') is not None:
+        update_data['employment_type'] = EmploymentType(update_data['employment_type'])
     
     for field, value in update_data.items():
         setattr(current_user, field, value)
@@ -10,11 +10,12 @@ HR AI Assistant Router - API эндпоинты для HR AI-ассистент
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models import User, ChatSession, ChatMessage
 from app.auth import get_current_hr_user
 from app.schemas import (
@@ -73,6 +74,39 @@ async def hr_chat_with_assistant(
         )
 
 
+@router.post("/chat/stream")
+async def hr_stream_chat_with_assistant(
+    request: AssistantChatRequest,
+    current_user: User = Depends(get_current_hr_user)
+):
+    """
+    💬 Потоковая версия /chat (Server-Sent Events)
+    
+    События:
+    - delta: {"content": "..."} — очередной фрагмент текста ответа
+    - done: полный ответ ассистента после сохранения в БД
+    """
+    user_id = current_user.id
+    hr_service = get_hr_ai_assistant_service()
+
+    async def event_stream():
+        # Сессия БД живёт столько же, сколько поток: зависимость get_db
+        # закрывается до отправки тела StreamingResponse
+        db = SessionLocal()
+        try:
+            hr_user = db.get(User, user_id)
+            async for event in hr_service.stream_chat_message(db, hr_user, request):
+                yield event
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/search-candidates", response_model=CandidateSearchResponse)
 async def search_candidates_by_description(
     request: CandidateSearchRequest,
@@ -1,9 +1,9 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session, joinedload
 from app.database import get_db
 from app.models import Interview, Resume, Vacancy, User
-from app.schemas import InterviewCreate, InterviewUpdate, InterviewResponse
+from app.schemas import InterviewCreate, InterviewUpdate, InterviewResponse, INTERVIEW_LIST_ADAPTER, dump_list_json
 from app.auth import get_current_user, get_current_hr_user
 from app.models import ApplicationStatus
 
@@ -58,10 +58,11 @@ def get_interviews(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_hr_user)
 ):
-    return db.query(Interview).options(
+    interviews = db.query(Interview).options(
         joinedload(Interview.resume).joinedload(Resume.user),
         joinedload(Interview.vacancy)
     ).offset(skip).limit(limit).all()
+    return Response(content=dump_list_json(INTERVIEW_LIST_ADAPTER, interviews), media_type="application/json")
 
 @router.get("/vacancy/{vacancy_id}", response_model=List[InterviewResponse])
 def get_interviews_by_vacancy(
@@ -76,10 +77,11 @@ def get_interviews_by_vacancy(
             detail="Vacancy not found"
         )
     
-    return db.query(Interview).options(
+    interviews = db.query(Interview).options(
         joinedload(Interview.resume).joinedload(Resume.user),
         joinedload(Interview.vacancy)
     ).filter(Interview.vacancy_id == vacancy_id).all()
+    return Response(content=dump_list_json(INTERVIEW_LIST_ADAPTER, interviews), media_type="application/json")
 
 @router.get("/{interview_id}", response_model=InterviewResponse)
 def get_interview(
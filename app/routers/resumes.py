@@ -1,12 +1,12 @@
 import os
 import shutil
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response
 from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Resume, Vacancy, User, ResumeAnalysis
-from app.schemas import ResumeResponse, ResumeAnalysisResponse
+from app.schemas import ResumeResponse, ResumeListItem, ResumeAnalysisResponse, RESUME_LIST_ITEM_ADAPTER, dump_list_json
 from app.auth import get_current_user, get_current_hr_user
 from app.config import settings
 from app.services.resume_processor import process_resume
@@ -126,23 +126,25 @@ async def upload_resume_by_user(
     
     return db_resume
 
-@router.get("/", response_model=List[ResumeResponse])
+@router.get("/", response_model=List[ResumeListItem])
 def get_user_resumes(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Получение заявок текущего пользователя"""
-    return db.query(Resume).join(Vacancy).filter(Resume.user_id == current_user.id).all()
+    resumes = db.query(Resume).join(Vacancy).filter(Resume.user_id == current_user.id).all()
+    return Response(content=dump_list_json(RESUME_LIST_ITEM_ADAPTER, resumes), media_type="application/json")
 
-@router.get("/candidates", response_model=List[ResumeResponse])
+@router.get("/candidates", response_model=List[ResumeListItem])
 def get_all_candidates(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_hr_user)
 ):
     """Получение всех кандидатов для HR"""
-    return db.query(Resume).join(User).filter(Resume.user_id.isnot(None)).all()
+    resumes = db.query(Resume).join(User).filter(Resume.user_id.isnot(None)).all()
+    return Response(content=dump_list_json(RESUME_LIST_ITEM_ADAPTER, resumes), media_type="application/json")
 
-@router.get("/vacancy/{vacancy_id}", response_model=List[ResumeResponse])
+@router.get("/vacancy/{vacancy_id}", response_model=List[ResumeListItem])
 def get_resumes_by_vacancy(
     vacancy_id: int,
     db: Session = Depends(get_db),
@@ -155,7 +157,8 @@ def get_resumes_by_vacancy(
             detail="Vacancy not found"
         )
     
-    return db.query(Resume).filter(Resume.vacancy_id == vacancy_id).all()
+    resumes = db.query(Resume).filter(Resume.vacancy_id == vacancy_id).all()
+    return Response(content=dump_list_json(RESUME_LIST_ITEM_ADAPTER, resumes), media_type="application/json")
 
 @router.get("/{resume_id}/analysis", response_model=ResumeAnalysisResponse)
 def get_resume_analysis(
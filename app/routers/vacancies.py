@@ -1,10 +1,10 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from app.database import get_db
 from app.models import Vacancy, User, VacancyStatus, Resume
-from app.schemas import VacancyCreate, VacancyUpdate, VacancyResponse
+from app.schemas import VacancyCreate, VacancyUpdate, VacancyResponse, VACANCY_LIST_ADAPTER, dump_list_json
 from app.auth import get_current_user, get_current_hr_user
 
 router = APIRouter()
@@ -15,7 +15,9 @@ def create_vacancy(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_hr_user)
 ):
-    db_vacancy = Vacancy(**vacancy.dict(), creator_id=current_user.id)
+    vacancy_data = vacancy.dict()
+    vacancy_data['status'] = VacancyStatus(vacancy_data['status'])
+    db_vacancy = Vacancy(**vacancy_data, creator_id=current_user.id)
     db.add(db_vacancy)
     db.commit()
     db.refresh(db_vacancy)
@@ -31,7 +33,8 @@ def get_vacancies(
     query = db.query(Vacancy).join(User)
     if status:
         query = query.filter(Vacancy.status == status)
-    return query.offset(skip).limit(limit).all()
+    vacancies = query.offset(skip).limit(limit).all()
+    return Response(content=dump_list_json(VACANCY_LIST_ADAPTER, vacancies), media_type="application/json")
 
 @router.get("/formatted")
 def get_formatted_vacancies(
@@ -116,9 +119,10 @@ def get_open_vacancies(
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    return db.query(Vacancy).join(User).filter(
+    vacancies = db.query(Vacancy).join(User).filter(
         Vacancy.status == VacancyStatus.OPEN
     ).offset(skip).limit(limit).all()
+    return Response(content=dump_list_json(VACANCY_LIST_ADAPTER, vacancies), media_type="application/json")
 
 @router.get("/{vacancy_id}", response_model=VacancyResponse)
 def get_vacancy(vacancy_id: int, db: Session = Depends(get_db)):
@@ -151,6 +155,8 @@ def update_vacancy(
         )
     
     update_data = vacancy_update.dict(exclude_unset=True)
+    if update_data.get('status') is not None:
+        update_data['status'] = VacancyStatus(update_data['status'])
     for field, value in update_data.items():
         setattr(vacancy, field, value)
     
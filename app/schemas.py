@@ -1,21 +1,71 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional, List, Dict, Any, Union
+import enum
+from pydantic import AliasChoices, BaseModel, BeforeValidator, ConfigDict, Field, StringConstraints, TypeAdapter
+from typing import Optional, List, Dict, Any, Union, Annotated, Literal
 from datetime import datetime, date
-from app.models import UserRole, VacancyStatus, InterviewStatus, ApplicationStatus, EmploymentType
+from app.enums import UserRole, VacancyStatus, InterviewStatus, ApplicationStatus, EmploymentType
+
+# Лёгкая проверка email: регулярка компилируется pydantic-core один раз,
+# без DNS/IDNA-проверок email-validator (строгая проверка — см. STRICT_EMAIL_VALIDATION)
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+Email = Annotated[str, StringConstraints(pattern=EMAIL_PATTERN, max_length=254)]
+
+# Общая конфигурация входных схем: лишние поля молча отбрасываются, строки не трогаем
+REQUEST_CONFIG = ConfigDict(extra='ignore', populate_by_name=True, str_strip_whitespace=False)
+
+# Поля профиля, которые в старых записях хранились строкой через запятую
+def _parse_csv_list(v):
+    if isinstance(v, str):
+        return [item.strip() for item in v.split(',') if item.strip()]
+    return v
+
+def _parse_lang_csv(v):
+    if isinstance(v, str):
+        # Преобразуем в список объектов с языком и уровнем
+        return [{"language": item, "level": "Не указан"} for item in _parse_csv_list(v)]
+    return v
+
+CsvList = Annotated[Optional[List[str]], BeforeValidator(_parse_csv_list)]
+ForeignLanguages = Annotated[Optional[List[Dict[str, Any]]], BeforeValidator(_parse_lang_csv)]
+
+# Неизменяемые value-объекты: создаются пачками и после построения не меняются
+VALUE_CONFIG = ConfigDict(frozen=True)
+
+# Общий ограниченный тип для оценок 0.0-1.0: один валидатор на все модели
+Score = Annotated[float, Field(ge=0.0, le=1.0)]
+
+# Идентификаторы в ответах всегда приходят из БД как int — строгая проверка без приведения типов
+IntId = Annotated[int, Field(strict=True)]
+
+# Literal-аналоги enum'ов из app.models для входных схем: проверка по множеству строк
+# в pydantic-core вместо Enum.__call__. Экземпляры Enum по-прежнему принимаются.
+# В ORM значения переводятся обратно в Enum на границе с БД (UserRole(value) и т.п.)
+def _enum_to_value(v):
+    return v.value if isinstance(v, enum.Enum) else v
+
+RoleLiteral = Annotated[Literal['hr', 'user'], BeforeValidator(_enum_to_value)]
+VacancyStatusLiteral = Annotated[Literal['open', 'closed'], BeforeValidator(_enum_to_value)]
+EmploymentTypeLiteral = Annotated[
+    Literal['full_time', 'part_time', 'contract', 'freelance', 'internship'],
+    BeforeValidator(_enum_to_value),
+]
 
 class UserCreate(BaseModel):
+    model_config = REQUEST_CONFIG
+
     username: str
-    email: EmailStr
+    email: Email
     password: str
-    role: UserRole
+    role: RoleLiteral
     full_name: Optional[str] = None
 
 class UserLogin(BaseModel):
+    model_config = REQUEST_CONFIG
+
     username: str
     password: str
 
 class UserResponse(BaseModel):
-    id: int
+    id: IntId
     username: str
     email: str
     role: UserRole
@@ -35,32 +85,15 @@ class UserResponse(BaseModel):
     education: Optional[List[Dict[str, Any]]] = None
     work_experience: Optional[List[Dict[str, Any]]] = None
     # Новые поля для профиля
-    foreign_languages: Optional[List[Dict[str, Any]]] = None
-    other_competencies: Optional[List[str]] = None
-    programming_languages: Optional[List[str]] = None
+    foreign_languages: ForeignLanguages = None
+    other_competencies: CsvList = None
+    programming_languages: CsvList = None
     # Флаги для отслеживания взаимодействия с резюме
     resume_upload_seen: Optional[bool] = None
     resume_upload_skipped: Optional[bool] = None
     # XP пользователя
     xp: Optional[int] = None
 
-    @field_validator('programming_languages', 'other_competencies', mode='before')
-    @classmethod
-    def parse_string_to_list(cls, v):
-        if isinstance(v, str):
-            return [item.strip() for item in v.split(',') if item.strip()]
-        return v
-    
-    @field_validator('foreign_languages', mode='before')
-    @classmethod
-    def parse_foreign_languages(cls, v):
-        if isinstance(v, str):
-            # Если это строка, пытаемся разделить по запятым
-            items = [item.strip() for item in v.split(',') if item.strip()]
-            # Преобразуем в список объектов с языком и уровнем
-            return [{"language": item, "level": "Не указан"} for item in items]
-        return v
-
     class Config:
         from_attributes = True
 
@@ -77,11 +110,13 @@ class UserProfileUpdate(BaseModel):
     about: Optional[str] = None
     desired_salary: Optional[int] = None
     ready_to_relocate: Optional[bool] = None
-    employment_type: Optional[EmploymentType] = None
+    employment_type: Optional[EmploymentTypeLiteral] = None
     education: Optional[List[Dict[str, Any]]] = None
     work_experience: Optional[List[Dict[str, Any]]] = None
 
 class VacancyCreate(BaseModel):
+    model_config = REQUEST_CONFIG
+
     title: str
     description: str
     requirements: Optional[str] = None
@@ -92,7 +127,7 @@ class VacancyCreate(BaseModel):
     experience_level: Optional[str] = None
     benefits: Optional[str] = None  # Условия работы (через запятую)
     company: Optional[str] = None
-    status: VacancyStatus = VacancyStatus.OPEN
+    status: VacancyStatusLiteral = 'open'
     original_url: Optional[str] = None
     # Авто-интервью
     auto_interview_enabled: Optional[bool] = False
@@ -109,14 +144,14 @@ class VacancyUpdate(BaseModel):
     experience_level: Optional[str] = None
     benefits: Optional[str] = None  # Условия работы (через запятую)
     company: Optional[str] = None
-    status: Optional[VacancyStatus] = None
+    status: Optional[VacancyStatusLiteral] = None
     original_url: Optional[str] = None
     # Авто-интервью
     auto_interview_enabled: Optional[bool] = None
     auto_interview_threshold: Optional[int] = None
 
 class VacancyResponse(BaseModel):
-    id: int
+    id: IntId
     title: str
     description: str
     requirements: Optional[str]
@@ -132,15 +167,15 @@ class VacancyResponse(BaseModel):
     # Авто-интервью
     auto_interview_enabled: bool
     auto_interview_threshold: Optional[int]
-    creator_id: int
+    creator_id: IntId
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 class ResumeAnalysisResponse(BaseModel):
-    id: int
-    resume_id: int
+    id: IntId
+    resume_id: IntId
     name: Optional[str]
     position: Optional[str]
     experience: Optional[str]
@@ -166,9 +201,9 @@ class ResumeAnalysisResponse(BaseModel):
     class Config:
         from_attributes = True
 class ResumeResponse(BaseModel):
-    id: int
-    user_id: Optional[int]
-    vacancy_id: int
+    id: IntId
+    user_id: Optional[IntId]
+    vacancy_id: IntId
     file_path: str
     original_filename: str
     uploaded_at: datetime
@@ -184,6 +219,26 @@ class ResumeResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ResumeListItem(BaseModel):
+    """
+    Облегчённое представление резюме для списков: только скалярные поля,
+    без вложенных user/vacancy/analysis, чтобы не провоцировать lazy-load на каждую строку.
+    """
+    id: IntId
+    user_id: Optional[IntId]
+    vacancy_id: IntId
+    original_filename: str
+    uploaded_at: datetime
+    processed: bool
+    uploaded_by_hr: bool
+    status: ApplicationStatus
+    notes: Optional[str] = None
+    updated_at: datetime
+    hidden_for_hr: Optional[bool] = False
+
+    class Config:
+        from_attributes = True
+
 
 
 class InterviewCreate(BaseModel):
@@ -204,9 +259,9 @@ class InterviewUpdate(BaseModel):
     notes: Optional[str] = None
 
 class InterviewResponse(BaseModel):
-    id: int
-    vacancy_id: int
-    resume_id: int
+    id: IntId
+    vacancy_id: IntId
+    resume_id: IntId
     status: InterviewStatus
     scheduled_date: Optional[datetime]
     start_date: Optional[datetime]
@@ -231,6 +286,8 @@ class ResumeAnalyzeRequest(BaseModel):
     resume_text: str
 
 class BasicInfo(BaseModel):
+    model_config = VALUE_CONFIG
+
     name: Optional[str] = None
     position: Optional[str] = None
     experience: Optional[str] = None
@@ -241,16 +298,22 @@ class BasicInfo(BaseModel):
     recommendation: str
 
 class ExtendedInfo(BaseModel):
+    model_config = VALUE_CONFIG
+
     projects: List[str]
     work_experience: List[str]
     technologies: List[str]
     achievements: List[str]
 
 class ResumeQuality(BaseModel):
+    model_config = VALUE_CONFIG
+
     structured: bool
     effort_level: str
 
 class AntiManipulation(BaseModel):
+    model_config = VALUE_CONFIG
+
     suspicious_phrases_found: bool
     examples: List[str]
 
@@ -261,10 +324,14 @@ class ResumeAnalyzeResponse(BaseModel):
     anti_manipulation: AntiManipulation
 
 class ApplicationCreate(BaseModel):
+    model_config = REQUEST_CONFIG
+
     cover_letter: Optional[str] = None
 
 # QA Session Schemas - Схемы для вопросно-ответных сессий
 class QAQuestion(BaseModel):
+    model_config = VALUE_CONFIG
+
     id: str
     question: str
     field: str  # Поле профиля, которое уточняется
@@ -273,6 +340,8 @@ class QAQuestion(BaseModel):
     current_attempt: int = 0
 
 class QAAnswer(BaseModel):
+    model_config = VALUE_CONFIG
+
     question_id: str
     answer: str
     attempt: int
@@ -281,8 +350,8 @@ class QASessionCreate(BaseModel):
     user_id: int
 
 class QASessionResponse(BaseModel):
-    id: int
-    user_id: int
+    id: IntId
+    user_id: IntId
     status: str
     current_question_index: int
     questions: Optional[List[QAQuestion]] = None
@@ -303,6 +372,8 @@ class CandidateSearchRequest(BaseModel):
     Схема запроса для поиска кандидатов через AI-ассистента.
     HR отправляет описание вакансии и получает ранжированный список кандидатов.
     """
+    model_config = REQUEST_CONFIG
+
     job_title: str  # Название должности
     job_description: str  # Полное описание вакансии 
     required_skills: Optional[List[str]] = []  # Обязательные навыки для первичной фильтрации
@@ -315,14 +386,16 @@ class CandidateMatch(BaseModel):
     """
     Информация о найденном кандидате с оценкой соответствия
     """
-    user_id: int  # ID пользователя
+    model_config = VALUE_CONFIG
+
+    user_id: IntId  # ID пользователя
     full_name: str  # Полное имя кандидата
-    email: str  # Email кандидата  
+    email: str  # Email кандидата
     current_position: Optional[str] = None  # Текущая позиция
     experience_years: Optional[str] = None  # Опыт работы
     key_skills: Optional[List[str]] = []  # Ключевые навыки
     programming_languages: Optional[List[str]] = []  # Языки программирования
-    match_score: float  # Оценка соответствия (0.0 - 1.0)
+    match_score: Score  # Оценка соответствия (0.0 - 1.0)
     ai_summary: str  # AI-саммари: почему подходит/не подходит
     strengths: Optional[List[str]] = []  # Сильные стороны кандидата
     growth_areas: Optional[List[str]] = []  # Области для роста
@@ -342,6 +415,8 @@ class CandidateSearchResponse(BaseModel):
 # XP Schemas - Схемы для системы опыта
 class XPFieldBreakdown(BaseModel):
     """Детализация XP по конкретному полю профиля"""
+    model_config = VALUE_CONFIG
+
     xp: int
     filled: bool
     description: str
@@ -355,15 +430,38 @@ class XPFieldBreakdown(BaseModel):
     potential_per_item: Optional[int] = None
     max_items: Optional[int] = None
 
+class XPBreakdown(BaseModel):
+    """Детализация XP по всем полям профиля (набор полей совпадает с XPService.XP_CONFIG)"""
+    model_config = ConfigDict(extra='allow')
+
+    # Простые поля
+    first_name: XPFieldBreakdown
+    last_name: XPFieldBreakdown
+    phone: XPFieldBreakdown
+    birth_date: XPFieldBreakdown
+    location: XPFieldBreakdown
+    about: XPFieldBreakdown
+    desired_salary: XPFieldBreakdown
+    ready_to_relocate: XPFieldBreakdown
+    employment_type: XPFieldBreakdown
+    # Сложные поля (массивы)
+    programming_languages: XPFieldBreakdown
+    foreign_languages: XPFieldBreakdown
+    other_competencies: XPFieldBreakdown
+    work_experience: XPFieldBreakdown
+    education: XPFieldBreakdown
+
 class NextBonus(BaseModel):
     """Информация о следующем бонусе за заполненность"""
+    model_config = VALUE_CONFIG
+
     threshold: int
     bonus: int
     percentage_needed: float
 
 class XPInfoResponse(BaseModel):
     """Детальная информация о XP пользователя"""
-    user_id: int
+    user_id: IntId
     current_xp: int
     calculated_xp: int
     completion_percentage: float
@@ -372,7 +470,7 @@ class XPInfoResponse(BaseModel):
     completion_bonus: int
     base_xp: int
     next_bonus: Optional[NextBonus]
-    xp_breakdown: Dict[str, XPFieldBreakdown]
+    xp_breakdown: XPBreakdown
 
 class XPUpdateResponse(BaseModel):
     """Ответ при обновлении XP"""
@@ -390,8 +488,8 @@ class ChatSessionCreate(BaseModel):
 
 class ChatSessionResponse(BaseModel):
     """Информация о сессии чата"""
-    id: int
-    user_id: int  
+    id: IntId
+    user_id: IntId  
     title: str
     status: str
     context_data: Optional[Dict[str, Any]] = None
@@ -411,11 +509,14 @@ class ChatMessageCreate(BaseModel):
 
 class ChatMessageResponse(BaseModel):
     """Сообщение в чате"""
-    id: int
-    session_id: int
+    id: IntId
+    session_id: IntId
     role: str  # user, assistant, system
     content: str
-    metadata: Optional[Dict[str, Any]] = None
+    # В ORM колонка называется message_metadata (ChatMessage.metadata — MetaData SQLAlchemy)
+    metadata: Optional[Dict[str, Any]] = Field(
+        default=None, validation_alias=AliasChoices("message_metadata", "metadata")
+    )
     created_at: datetime
 
     class Config:
@@ -426,6 +527,8 @@ class AssistantChatRequest(BaseModel):
     Основной запрос к AI-ассистенту.
     Используется для отправки сообщения и получения ответа с рекомендациями.
     """
+    model_config = REQUEST_CONFIG
+
     message: str  # Сообщение пользователя
     session_id: Optional[int] = None  # ID существующей сессии (если None - создается новая)
     context: Optional[Dict[str, Any]] = None  # Дополнительный контекст
@@ -434,8 +537,8 @@ class AssistantChatResponse(BaseModel):
     """
     Ответ AI-ассистента с рекомендациями и дополнительными данными
     """
-    session_id: int  # ID сессии чата
-    message_id: int  # ID сообщения ассистента
+    session_id: IntId  # ID сессии чата
+    message_id: IntId  # ID сообщения ассистента
     response: str  # Текстовый ответ ассистента
     
     # Дополнительные данные ответа
@@ -445,11 +548,11 @@ class AssistantChatResponse(BaseModel):
     
     # Метаинформация
     response_type: str = "general"  # general, career_guidance, course_recommendation, etc.
-    confidence: Optional[float] = None  # Уверенность в ответе (0.0-1.0)
+    confidence: Optional[Score] = None  # Уверенность в ответе (0.0-1.0)
 
 class CourseResponse(BaseModel):
     """Информация о курсе"""
-    id: int
+    id: IntId
     title: str
     category: str
     description: Optional[str] = None
@@ -464,7 +567,7 @@ class CourseResponse(BaseModel):
 
 class RecommendationResponse(BaseModel):
     """Рекомендация от AI-ассистента"""
-    id: int
+    id: IntId
     recommendation_type: str  # course, vacancy, skill, action
     title: str
     description: Optional[str] = None
@@ -513,7 +616,7 @@ class CareerGuidanceResponse(BaseModel):
     
 class VacancyRecommendationResponse(BaseModel):
     """Рекомендация подходящих вакансий"""
-    vacancy_id: int
+    vacancy_id: IntId
     title: str
     company: Optional[str] = None
     match_percentage: float  # Процент соответствия (0.0-100.0)
@@ -562,7 +665,7 @@ class HRCandidateCard(BaseModel):
     Карточка кандидата для отображения в HR интерфейсе.
     Расширенная версия CandidateMatch с дополнительной информацией.
     """
-    user_id: int
+    user_id: IntId
     full_name: str
     email: str
     current_position: Optional[str] = None
@@ -580,7 +683,7 @@ class HRCandidateCard(BaseModel):
     work_experience: Optional[List[Dict[str, Any]]] = []
     
     # AI анализ
-    match_score: float
+    match_score: Score
     similarity_score: Optional[float] = None
     ai_summary: Optional[str] = None
     strengths: List[str] = []
@@ -631,8 +734,8 @@ class HRAssistantChatResponse(BaseModel):
     """
     Ответ HR AI-ассистента с расширенными данными для HR.
     """
-    session_id: int
-    message_id: int
+    session_id: IntId
+    message_id: IntId
     response: str
     
     # HR-специфичные данные
@@ -646,7 +749,7 @@ class HRAssistantChatResponse(BaseModel):
     quick_replies: Optional[List[str]] = []
     
     response_type: str = "general"  # general, candidate_search, analytics, vacancy_generation
-    confidence: Optional[float] = None
+    confidence: Optional[Score] = None
 
 class HRAssistantStatsResponse(BaseModel):
     """
@@ -667,3 +770,18 @@ class HRAssistantStatsResponse(BaseModel):
     # Эффективность
     average_candidates_per_search: Optional[float] = None
     successful_searches_percentage: Optional[float] = None
+
+
+# ====== Сериализация списков ======
+# Готовые адаптеры: валидация ORM-объектов и dump_json выполняются одним проходом
+# pydantic-core, без промежуточных dict и повторной сериализации в FastAPI
+
+VACANCY_LIST_ADAPTER = TypeAdapter(List[VacancyResponse])
+RESUME_LIST_ADAPTER = TypeAdapter(List[ResumeResponse])
+RESUME_LIST_ITEM_ADAPTER = TypeAdapter(List[ResumeListItem])
+INTERVIEW_LIST_ADAPTER = TypeAdapter(List[InterviewResponse])
+CHAT_MESSAGE_LIST_ADAPTER = TypeAdapter(List[ChatMessageResponse])
+
+def dump_list_json(adapter: TypeAdapter, rows, **dump_kwargs) -> bytes:
+    """Сериализует список ORM-объектов в JSON через заранее собранный TypeAdapter"""
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True), **dump_kwargs)
@@ -12,17 +12,23 @@ AI Assistant Service - Сервис для персонального карье
 
 import json
 import re
+import hashlib
+import logging
+from functools import lru_cache
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncIterator
 from datetime import datetime
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy.orm import Session, joinedload, defer
+from sqlalchemy import and_, or_, func, desc, text, bindparam, String, insert, update
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from app.config import settings
 from app.models import (
-    User, ChatSession, ChatMessage, Course, Vacancy, Vec_profile, 
-    AssistantRecommendation, UserRole
+    User, ChatSession, ChatMessage, Course, Vacancy, Vec_profile, Vec_vacancy,
+    AssistantRecommendation, UserRole, VacancyStatus
 )
 from app.schemas import (
     AssistantChatRequest, AssistantChatResponse, CourseRecommendationRequest,
@@ -32,6 +38,144 @@ from app.schemas import (
 
 # Импорты для векторного поиска
 import numpy as np
+from pydantic_core import from_json, to_json
+
+from app.services.semantic_cache import SemanticCache
+from app.services.quantization import quantize_int8, l2_normalize
+from app.services.vacancy_index import VacancyVectorIndex
+
+# Поля пользователя, от которых зависит результат _analyze_user_profile
+PROFILE_SNAPSHOT_FIELDS = (
+    "username", "email", "full_name", "first_name", "last_name", "location", "about",
+    "programming_languages", "other_competencies", "work_experience", "education",
+    "desired_salary", "ready_to_relocate", "employment_type",
+)
+PROFILE_CACHE_SIZE = 1024
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings.ai_assistant_log_level.upper())
+
+# Системный промпт неизменен и всегда идёт первым сообщением: общий префикс всех
+# запросов попадает в prefix cache LLM-сервера. Ничего не подставлять в него!
+SYSTEM_PROMPT = (
+    "Ты персональный карьерный консультант и HR-эксперт. "
+    "Помогаешь сотрудникам IT-компании развиваться в карьере, "
+    "рекомендуешь курсы, вакансии и составляешь планы развития. "
+    "ВАЖНО: Отвечай КРАТКО и ПО СУЩЕСТВУ. Максимум 3-4 предложения. "
+    "Используй списки и структурированный текст. Будь дружелюбным но лаконичным.\n"
+    "Дай персонализированный ответ как карьерный консультант. Учитывай профиль пользователя.\n"
+    "Если уместно, рекомендуй курсы или внутренние вакансии.\n"
+    "Отвечай дружелюбно и профессионально, не более 300 слов."
+)
+
+# Сколько текстов вакансий отправляется в один запрос векторизации
+EMBEDDING_BATCH_SIZE = 64
+
+# Ниже этих порогов embedding профиля почти не несёт сигнала для ранжирования,
+# и вместо векторного поиска используется сопоставление по названию вакансии
+MIN_PROFILE_FIELDS_FOR_EMBEDDING = 3
+MIN_PROFILE_TEXT_LENGTH = 60
+
+# Шаблоны ответов на вопросы о карьерном росте
+MISSING_FIELDS_RU = {
+    "first_name": "имя",
+    "last_name": "фамилия",
+    "about": "описание \"о себе\"",
+    "location": "местоположение",
+    "programming_languages": "языки программирования",
+    "other_competencies": "навыки и компетенции",
+    "work_experience": "опыт работы",
+    "education": "образование"
+}
+
+PROFILE_COMPLETION_TEMPLATE = """Для построения карьерного плана мне нужно лучше узнать вас! 📊
+
+Ваш профиль заполнен на {percentage}%. Для персонализированных рекомендаций рекомендую дозаполнить:
+
+{missing}
+
+После заполнения профиля я смогу:
+✅ Подобрать подходящие вакансии в компании
+✅ Рекомендовать курсы для развития нужных навыков  
+✅ Составить пошаговый план карьерного роста
+✅ Показать, какие навыки нужно подтянуть
+
+Хотите начать с заполнения профиля?"""
+
+CAREER_GUIDANCE_TEMPLATE = """Отличный вопрос о карьерном развитии! 🚀
+
+На основе анализа вашего профиля, вот мой план действий:
+
+**📚 Рекомендуемые курсы:**
+{courses}
+
+**🎯 Подходящие вакансии в компании:**
+{vacancies}
+
+**📈 Следующие шаги:**
+1. Пройти ключевые курсы по недостающим навыкам
+2. Обновить профиль новыми компетенциями  
+3. Откликнуться на подходящие внутренние вакансии
+4. Получить обратную связь от текущего руководителя
+
+Хотите подробнее обсудить конкретный курс или вакансию?"""
+
+
+@lru_cache(maxsize=256)
+def _render_profile_completion(percentage: float, missing_fields: Tuple[str, ...]) -> str:
+    """
+    Текст-приглашение дозаполнить профиль. Зависит только от процента и списка
+    незаполненных полей, поэтому одинаковые тексты берутся из кэша.
+    """
+    missing = "\n".join("• " + MISSING_FIELDS_RU.get(field, field) for field in missing_fields[:5])
+    return PROFILE_COMPLETION_TEMPLATE.format(percentage=percentage, missing=missing)
+
+# Ключевые слова вопросов о карьерном росте; компилируются в одно регулярное
+# выражение, чтобы сообщение сканировалось за один проход
+CAREER_KEYWORDS = (
+    "карьер", "рост", "развитие", "повысить", "продвинуться",
+    "стать", "senior", "middle", "junior", "позиция",
+    "должность", "повышение", "лестниц", "план развития"
+)
+CAREER_KEYWORDS_RE = re.compile(
+    "|".join(re.escape(kw) for kw in sorted(CAREER_KEYWORDS, key=len, reverse=True))
+)
+
+# Ранжирование курсов по пробелам в навыках целиком в PostgreSQL:
+# разворачиваем skills + technologies курса, считаем новые и уже известные навыки
+# и возвращаем только top-limit. Релевантность = новые * 1.0 + известные * 0.3
+COURSE_SKILL_GAP_SQL = text("""
+    WITH course_skills AS (
+        SELECT DISTINCT c.id, lower(s.skill) AS skill
+        FROM courses c
+        CROSS JOIN LATERAL (
+            SELECT json_array_elements_text(c.skills) AS skill
+            WHERE json_typeof(c.skills) = 'array'
+            UNION ALL
+            SELECT json_array_elements_text(c.technologies)
+            WHERE json_typeof(c.technologies) = 'array'
+        ) s
+        WHERE c.is_active = TRUE
+    )
+    SELECT id
+    FROM course_skills
+    GROUP BY id
+    HAVING count(*) FILTER (WHERE NOT skill = ANY(:user_skills)) > 0
+    ORDER BY
+        count(*) FILTER (WHERE NOT skill = ANY(:user_skills)) * 1.0
+        + count(*) FILTER (WHERE skill = ANY(:user_skills)) * 0.3 DESC,
+        id
+    LIMIT :limit
+""").bindparams(bindparam("user_skills", type_=ARRAY(String)))
+
+
+def _freeze_profile_value(value: Any) -> Any:
+    """Приводит значение поля профиля к хешируемому виду для ключа кэша"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    if hasattr(value, "value"):  # Enum
+        return value.value
+    return value
 
 
 class AIAssistantService:
@@ -48,19 +192,45 @@ class AIAssistantService:
     def __init__(self):
         self.provider = "scibox"
         self.embedding_dimension = 1024  # bge-m3 embeddings
+        # Общий пул соединений к LLM API: keep-alive вместо нового TCP/TLS на каждый вызов
+        self._client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=100),
+        )
+        # Кэш ответов на близкие по смыслу вопросы (в пределах одного пользователя)
+        self._semantic_cache = SemanticCache(dim=self.embedding_dimension, threshold=0.95)
+        # LRU-кэш анализа профиля: ключ — (user_id, снимок полей профиля)
+        self._profile_cache: "OrderedDict[Tuple[int, Tuple], Dict[str, Any]]" = OrderedDict()
+        # Индекс int8-векторов всех открытых вакансий (досинхронизируется по updated_at)
+        self._vacancy_index = VacancyVectorIndex(self.embedding_dimension)
+        # Синхронизация индекса не должна выполняться несколькими запросами одновременно
+        self._vacancy_index_lock = asyncio.Lock()
+
+    async def warmup(self, db: Session):
+        """
+        Прогрев при старте приложения: строит индекс вакансий (и векторизует
+        недостающие), чтобы первый запрос пользователя не платил за это.
+        """
+        await self._sync_vacancy_index(db)
+        logger.info("AI assistant warmed up: %d vacancies in index", len(self._vacancy_index))
+
+    async def aclose(self):
+        """Закрывает пул HTTP-соединений (вызывается при остановке приложения)"""
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
         
-    def _build_llm_request(self, prompt: str, is_embedding: bool = False) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+    def _build_llm_request(self, prompt: Union[str, List[str]], is_embedding: bool = False) -> tuple[str, Dict[str, str], Dict[str, Any]]:
         """
         Создает запрос к Scibox LLM API.
         Поддерживает как chat completion, так и embeddings.
+        Для embeddings prompt может быть списком строк — тогда все тексты уходят одним запросом.
+        Для chat список строк превращается в последовательные user-сообщения после SYSTEM_PROMPT.
         """
-        system_prompt = (
-            "Ты персональный карьерный консультант и HR-эксперт. "
-            "Помогаешь сотрудникам IT-компании развиваться в карьере, "
-            "рекомендуешь курсы, вакансии и составляешь планы развития. "
-            "ВАЖНО: Отвечай КРАТКО и ПО СУЩЕСТВУ. Максимум 3-4 предложения. "
-            "Используй списки и структурированный текст. Будь дружелюбным но лаконичным."
-        )
 
         # Используем разные URL для embeddings и chat
         if is_embedding:
@@ -77,9 +247,9 @@ class AIAssistantService:
             url = f"{base_url.rstrip('/')}/chat/completions"
             payload = {
                 "model": getattr(settings, 'scibox_model', 'Qwen2.5-72B-Instruct-AWQ'),
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt},
+                "messages": [{"role": "system", "content": SYSTEM_PROMPT}] + [
+                    {"role": "user", "content": content}
+                    for content in (prompt if isinstance(prompt, list) else [prompt])
                 ],
                 "max_tokens": 300,  # Короткие ответы для чата
                 "temperature": 0.6,  # Менее творческие, более структурированные ответы
@@ -93,39 +263,86 @@ class AIAssistantService:
         
         return url, headers, payload
 
-    async def _call_llm(self, prompt: str, is_embedding: bool = False) -> Any:
+    async def _call_llm(self, prompt: Union[str, List[str]], is_embedding: bool = False) -> Any:
         """
-        Выполняет запрос к LLM API
+        Выполняет запрос к LLM API.
+        Для списка текстов возвращает список embeddings в том же порядке.
         """
         url, headers, payload = self._build_llm_request(prompt, is_embedding)
 
-        print(f"🤖 AI Assistant LLM Request: {self.provider}")
-        print(f"📍 URL: {url}")
-        print(f"📊 Type: {'Embedding' if is_embedding else 'Chat'}")
+        logger.debug("LLM request provider=%s url=%s type=%s",
+                     self.provider, url, "embedding" if is_embedding else "chat")
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+        try:
+            # JSON кодируется/разбирается в Rust (pydantic-core), а не stdlib json:
+            # ответ с embeddings — это тысячи float на каждый текст
+            response = await self._client.post(url, headers=headers, content=to_json(payload))
+            response.raise_for_status()
+            data = from_json(response.content)
+            
+            if is_embedding:
+                if isinstance(prompt, list):
+                    items = sorted(data["data"], key=lambda item: item.get("index", 0))
+                    return [item["embedding"] for item in items]
+                return data["data"][0]["embedding"]
+            else:
+                return data["choices"][0]["message"]["content"]
                 
-                if is_embedding:
-                    return data["data"][0]["embedding"]
-                else:
-                    return data["choices"][0]["message"]["content"]
-                    
-            except httpx.HTTPStatusError as e:
-                print(f"❌ HTTP Error: {e.response.status_code} - {e.response.text}")
-                raise Exception(f"LLM API Error: {e.response.status_code}")
-            except Exception as e:
-                print(f"❌ Request Error: {e}")
-                raise Exception(f"LLM Request Failed: {str(e)}")
+        except httpx.HTTPStatusError as e:
+            logger.error("LLM HTTP error %s: %s", e.response.status_code, e.response.text)
+            raise Exception(f"LLM API Error: {e.response.status_code}")
+        except Exception as e:
+            logger.exception("LLM request failed")
+            raise Exception(f"LLM Request Failed: {str(e)}")
+
+    async def _stream_llm(self, prompt: Union[str, List[str]]) -> AsyncIterator[str]:
+        """
+        Потоковый chat-запрос к LLM (stream=True, SSE).
+        Отдаёт фрагменты текста ответа по мере генерации.
+        """
+        url, headers, payload = self._build_llm_request(prompt)
+        payload["stream"] = True
+
+        logger.debug("LLM stream request provider=%s url=%s", self.provider, url)
+
+        async with self._client.stream("POST", url, headers=headers, content=to_json(payload)) as response:
+            if response.status_code >= 400:
+                body = await response.aread()
+                logger.error("LLM HTTP error %s: %s", response.status_code, body[:500])
+                raise Exception(f"LLM API Error: {response.status_code}")
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = from_json(data).get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
 
     def _analyze_user_profile(self, user: User) -> Dict[str, Any]:
         """
         Анализирует профиль пользователя для персонализации ответов.
         Возвращает структурированную информацию о пользователе.
+        Результат кэшируется, пока не изменятся поля профиля; вызывающий код не должен его изменять.
         """
+        key = (user.id, tuple(_freeze_profile_value(getattr(user, field, None)) for field in PROFILE_SNAPSHOT_FIELDS))
+        cached = self._profile_cache.get(key)
+        if cached is not None:
+            self._profile_cache.move_to_end(key)
+            return cached
+
+        profile_analysis = self._build_profile_analysis(user)
+        self._profile_cache[key] = profile_analysis
+        if len(self._profile_cache) > PROFILE_CACHE_SIZE:
+            self._profile_cache.popitem(last=False)
+        return profile_analysis
+
+    def _build_profile_analysis(self, user: User) -> Dict[str, Any]:
+        """Строит структурированный анализ профиля пользователя"""
         profile_analysis = {
             "basic_info": {
                 "name": user.full_name or f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username,
@@ -193,39 +410,145 @@ class AIAssistantService:
         # Создаем текстовое представление профиля пользователя
         user_profile_text = self._create_user_profile_text(user)
         
+        # Разреженный профиль: не тратим вызов LLM на малоинформативный embedding
+        completeness = self._analyze_user_profile(user)["completeness"]
+        if (completeness["filled_fields"] < MIN_PROFILE_FIELDS_FOR_EMBEDDING
+                or len(user_profile_text) < MIN_PROFILE_TEXT_LENGTH):
+            logger.debug("Sparse profile for user %s, matching vacancies by title", user.id)
+            return self._match_vacancies_by_title(user, db, limit)
+        
         # Получаем embedding профиля пользователя
         try:
             user_embedding = await self._call_llm(user_profile_text, is_embedding=True)
-        except Exception as e:
-            print(f"❌ Failed to generate user embedding: {e}")
+        except Exception:
+            logger.exception("Failed to generate user embedding")
             return []
 
-        # Получаем активные вакансии
+        try:
+            await self._sync_vacancy_index(db)
+        except Exception:
+            logger.exception("Failed to generate vacancy embeddings")
+            return []
+        
+        # Поиск по всем открытым вакансиям в индексе, из БД загружаем только топ-limit
+        u_q = quantize_int8(l2_normalize(user_embedding))
+        top = self._vacancy_index.search(u_q, limit)
+        if not top:
+            return []
+        
+        vacancies_by_id = {
+            vacancy.id: vacancy
+            for vacancy in db.query(Vacancy).filter(Vacancy.id.in_([vacancy_id for vacancy_id, _ in top])).all()
+        }
+        return [
+            (vacancies_by_id[vacancy_id], similarity)
+            for vacancy_id, similarity in top
+            if vacancy_id in vacancies_by_id
+        ]
+
+    def _match_vacancies_by_title(self, user: User, db: Session, limit: int) -> List[Tuple[Vacancy, float]]:
+        """
+        Простой подбор по вхождению языков программирования пользователя в название
+        открытой вакансии. Similarity не вычисляется и равна 0.
+        """
+        keywords = [kw for kw in (user.programming_languages or []) if isinstance(kw, str) and kw.strip()]
+        if not keywords:
+            return []
+        
         vacancies = db.query(Vacancy).filter(
-            Vacancy.status == "open"
-        ).limit(50).all()  # Ограничиваем для производительности
+            Vacancy.status == VacancyStatus.OPEN,
+            or_(*[Vacancy.title.icontains(kw.strip(), autoescape=True) for kw in keywords])
+        ).order_by(desc(Vacancy.created_at)).limit(limit).all()
+        return [(vacancy, 0.0) for vacancy in vacancies]
+
+    async def _sync_vacancy_index(self, db: Session):
+        """
+        Приводит индекс вакансий в соответствие с БД.
+        Из vacancies читаются только (id, updated_at) открытых вакансий; полностью
+        загружаются и векторизуются лишь новые и изменившиеся, закрытые удаляются.
+        """
+        async with self._vacancy_index_lock:
+            await self._sync_vacancy_index_locked(db)
+
+    async def _sync_vacancy_index_locked(self, db: Session):
+        current = db.query(Vacancy.id, Vacancy.updated_at).filter(
+            Vacancy.status == VacancyStatus.OPEN
+        ).all()
+        stale_ids, removed_ids = self._vacancy_index.diff((row.id, row.updated_at) for row in current)
         
-        vacancy_similarities = []
+        if removed_ids:
+            self._vacancy_index.remove(removed_ids)
+        if not stale_ids:
+            return
         
-        for vacancy in vacancies:
-            try:
-                # Создаем описание вакансии для векторизации
-                vacancy_text = f"Вакансия: {vacancy.title}\nОписание: {vacancy.description or ''}\nТребования: {vacancy.requirements or ''}\nКомпания: {vacancy.company or ''}"
-                
-                # Получаем embedding вакансии
-                vacancy_embedding = await self._call_llm(vacancy_text, is_embedding=True)
-                
-                # Вычисляем cosine similarity
-                similarity = self._cosine_similarity(user_embedding, vacancy_embedding)
-                vacancy_similarities.append((vacancy, similarity))
-                
-            except Exception as e:
-                print(f"❌ Failed to process vacancy {vacancy.id}: {e}")
-                continue
+        logger.info("Syncing %d vacancies into vector index", len(stale_ids))
+        vacancies = db.query(Vacancy).filter(Vacancy.id.in_(stale_ids)).all()
+        if not vacancies:
+            return
+        Q = await self._get_vacancy_embeddings(vacancies, db)
+        self._vacancy_index.upsert(
+            [vacancy.id for vacancy in vacancies], Q, [vacancy.updated_at for vacancy in vacancies]
+        )
 
-        # Сортируем по убыванию сходства и возвращаем топ
-        vacancy_similarities.sort(key=lambda x: x[1], reverse=True)
-        return vacancy_similarities[:limit]
+    def _create_vacancy_text(self, vacancy: Vacancy) -> str:
+        """Создает текстовое представление вакансии для векторизации"""
+        return f"Вакансия: {vacancy.title}\nОписание: {vacancy.description or ''}\nТребования: {vacancy.requirements or ''}\nКомпания: {vacancy.company or ''}"
+
+    async def _get_vacancy_embeddings(self, vacancies: List[Vacancy], db: Session) -> np.ndarray:
+        """
+        Возвращает int8-embeddings вакансий из vec_vacancies матрицей (N, dim).
+        Векторизуются (одним батч-запросом) только новые вакансии и те, у которых
+        изменился текст, — это определяется по content_hash.
+        Float32-вектор при чтении не загружается (defer).
+        """
+        texts = [self._create_vacancy_text(vacancy) for vacancy in vacancies]
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+
+        stored = {
+            vec.vacancy_id: vec
+            for vec in db.query(Vec_vacancy).options(defer(Vec_vacancy.vector)).filter(
+                Vec_vacancy.vacancy_id.in_([vacancy.id for vacancy in vacancies])
+            ).all()
+        }
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(vacancies)
+        missing = []
+        for i, (vacancy, content_hash) in enumerate(zip(vacancies, hashes)):
+            vec = stored.get(vacancy.id)
+            if vec is not None and vec.content_hash == content_hash and vec.vector_q is not None:
+                embeddings[i] = np.frombuffer(vec.vector_q, dtype=np.int8)
+            else:
+                missing.append(i)
+
+        if missing:
+            logger.info("Embedding %d of %d vacancies", len(missing), len(vacancies))
+            new_embeddings = []
+            for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+                batch = missing[start:start + EMBEDDING_BATCH_SIZE]
+                new_embeddings.extend(await self._call_llm([texts[i] for i in batch], is_embedding=True))
+            # Векторы сохраняются нормированными: косинус = скалярное произведение
+            new_embeddings = [l2_normalize(embedding) for embedding in new_embeddings]
+            quantized = [quantize_int8(embedding) for embedding in new_embeddings]
+            for i, q in zip(missing, quantized):
+                embeddings[i] = q
+            try:
+                # Savepoint: ошибка записи кэша не должна откатывать сообщения чата
+                with db.begin_nested():
+                    for i, embedding, q in zip(missing, new_embeddings, quantized):
+                        vec = stored.get(vacancies[i].id)
+                        if vec is None:
+                            db.add(Vec_vacancy(
+                                vacancy_id=vacancies[i].id, content_hash=hashes[i], vector=embedding,
+                                vector_q=q.tobytes()
+                            ))
+                        else:
+                            vec.content_hash = hashes[i]
+                            vec.vector = embedding
+                            vec.vector_q = q.tobytes()
+            except Exception:
+                logger.exception("Failed to save vacancy embeddings")
+
+        return np.stack(embeddings)
 
     def _create_user_profile_text(self, user: User) -> str:
         """
@@ -271,24 +594,6 @@ class AIAssistantService:
         
         return profile_text
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Вычисляет косинусное сходство между векторами"""
-        try:
-            a = np.array(vec1)
-            b = np.array(vec2)
-            
-            dot_product = np.dot(a, b)
-            norm_a = np.linalg.norm(a)
-            norm_b = np.linalg.norm(b)
-            
-            if norm_a == 0 or norm_b == 0:
-                return 0.0
-            
-            similarity = dot_product / (norm_a * norm_b)
-            return float(similarity)
-        except Exception:
-            return 0.0
-
     async def _recommend_courses(self, user: User, db: Session, goal: Optional[str] = None, limit: int = 5) -> List[Course]:
         """
         Рекомендует курсы на основе анализа пробелов в навыках пользователя.
@@ -300,114 +605,149 @@ class AIAssistantService:
         if user.other_competencies:
             user_skills.update([skill.lower() for skill in user.other_competencies])
 
-        # Получаем все активные курсы
-        courses = db.query(Course).filter(Course.is_active == True).all()
-        
-        recommended_courses = []
-        
-        for course in courses:
-            course_skills = set()
-            if course.skills:
-                course_skills.update([skill.lower() for skill in course.skills])
-            if course.technologies:
-                course_skills.update([tech.lower() for tech in course.technologies])
-            
-            # Вычисляем пересечение навыков (что уже знает пользователь)
-            skill_intersection = user_skills.intersection(course_skills)
-            
-            # Вычисляем новые навыки (что получит пользователь)
-            new_skills = course_skills - user_skills
-            
-            # Логика рекомендации:
-            # 1. Курс должен давать новые навыки (new_skills > 0)
-            # 2. Но при этом иметь некоторую базу (небольшое пересечение приветствуется)
-            if len(new_skills) > 0:
-                # Вычисляем релевантность курса
-                relevance_score = len(new_skills) * 1.0 + len(skill_intersection) * 0.3
-                recommended_courses.append((course, relevance_score))
-        
-        # Сортируем по релевантности
-        recommended_courses.sort(key=lambda x: x[1], reverse=True)
+        # Логика рекомендации (считается в БД, см. COURSE_SKILL_GAP_SQL):
+        # 1. Курс должен давать новые навыки (new_skills > 0)
+        # 2. Но при этом иметь некоторую базу (небольшое пересечение приветствуется)
+        course_ids = [
+            row.id for row in db.execute(
+                COURSE_SKILL_GAP_SQL,
+                {"user_skills": sorted(user_skills), "limit": limit}
+            )
+        ]
+        if not course_ids:
+            return []
         
-        return [course for course, _ in recommended_courses[:limit]]
+        # Загружаем только отобранные курсы, сохраняя порядок релевантности
+        courses_by_id = {
+            course.id: course
+            for course in db.query(Course).filter(Course.id.in_(course_ids)).all()
+        }
+        return [courses_by_id[course_id] for course_id in course_ids if course_id in courses_by_id]
 
     def _detect_career_growth_question(self, message: str) -> bool:
         """
         Определяет, задает ли пользователь вопрос о карьерном росте.
         Возвращает True, если нужно дать совет о заполнении профиля и прохождении курсов.
         """
-        career_keywords = [
-            "карьер", "рост", "развитие", "повысить", "продвинуться", 
-            "стать", "senior", "middle", "junior", "позиция", 
-            "должность", "повышение", "лестниц", "план развития"
-        ]
-        
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in career_keywords)
+        return CAREER_KEYWORDS_RE.search(message.lower()) is not None
 
     async def process_chat_message(self, request: AssistantChatRequest, user: User, db: Session) -> AssistantChatResponse:
         """
         Основная функция обработки сообщения от пользователя.
         Анализирует запрос и генерирует персонализированный ответ с рекомендациями.
         """
-        print(f"🤖 Processing chat message from user {user.id}: {request.message[:50]}...")
+        logger.debug("Processing chat message from user %s: %.50s", user.id, request.message)
+        
+        received_at = datetime.utcnow()
         
         # Анализируем профиль пользователя
         profile_analysis = self._analyze_user_profile(user)
         
-        # Получаем или создаем сессию чата
-        if request.session_id:
-            session = db.query(ChatSession).filter(
-                ChatSession.id == request.session_id,
-                ChatSession.user_id == user.id
-            ).first()
-        else:
-            session = None
-            
-        if not session:
-            # Создаем новую сессию
-            session = ChatSession(
-                user_id=user.id,
-                title=f"Чат {datetime.now().strftime('%d.%m %H:%M')}",
-                context_data=profile_analysis
-            )
-            db.add(session)
-            db.flush()
-        
-        # Сохраняем сообщение пользователя
-        user_message = ChatMessage(
-            session_id=session.id,
-            role="user",
-            content=request.message
-        )
-        db.add(user_message)
-        db.flush()
-        
         # Определяем тип запроса и генерируем ответ
         if self._detect_career_growth_question(request.message):
             # Специальная логика для вопросов о карьерном росте
             response_data = await self._handle_career_growth_question(user, db, request.message, profile_analysis)
         else:
             # Общий ответ ассистента
-            response_data = await self._handle_general_question(user, db, request.message, profile_analysis)
-        
-        # Сохраняем ответ ассистента
-        assistant_message = ChatMessage(
-            session_id=session.id,
-            role="assistant",
-            content=response_data["response"],
-            metadata=response_data.get("metadata", {})
+            response_data = await self._handle_general_question_cached(user, db, request.message, profile_analysis)
+        
+        session_id, message_id = self._save_chat_exchange(
+            request, user, db, profile_analysis, response_data, received_at
         )
-        db.add(assistant_message)
+        return self._build_chat_response(session_id, message_id, response_data)
+
+    async def stream_chat_message(self, request: AssistantChatRequest, user: User, db: Session) -> AsyncIterator[str]:
+        """
+        Потоковая версия process_chat_message в формате Server-Sent Events.
+        Текст ответа LLM отдаётся событиями "delta" по мере генерации; после окончания
+        ответ сохраняется в БД и отправляется событие "done" с полным AssistantChatResponse.
+        """
+        received_at = datetime.utcnow()
+        profile_analysis = self._analyze_user_profile(user)
         
-        # Обновляем активность сессии
-        session.last_activity_at = datetime.utcnow()
+        if self._detect_career_growth_question(request.message):
+            # Ответы о карьерном росте собираются из шаблонов — отдаём целиком
+            response_data = await self._handle_career_growth_question(user, db, request.message, profile_analysis)
+            yield _sse_event("delta", {"content": response_data["response"]})
+        else:
+            query_embedding, namespace, cached = await self._lookup_semantic_cache(user, request.message, profile_analysis)
+            if cached is not None:
+                response_data = cached
+                yield _sse_event("delta", {"content": response_data["response"]})
+            else:
+                parts: List[str] = []
+                try:
+                    async for content in self._stream_llm(self._build_general_prompt(request.message, profile_analysis)):
+                        parts.append(content)
+                        yield _sse_event("delta", {"content": content})
+                except Exception:
+                    logger.exception("LLM stream error")
+                
+                if parts:
+                    response_data = await self._build_general_response(user, db, request.message, "".join(parts))
+                    if query_embedding is not None:
+                        self._semantic_cache.put(query_embedding, response_data, namespace=namespace)
+                else:
+                    response_data = _general_fallback_response()
+                    yield _sse_event("delta", {"content": response_data["response"]})
         
-        db.commit()
+        session_id, message_id = self._save_chat_exchange(
+            request, user, db, profile_analysis, response_data, received_at
+        )
+        response = self._build_chat_response(session_id, message_id, response_data)
+        # Модель сериализуется сразу в JSON, без промежуточного dict
+        yield _sse_event("done", response.model_dump_json())
+
+    def _save_chat_exchange(self, request: AssistantChatRequest, user: User, db: Session,
+                            profile_analysis: Dict[str, Any], response_data: Dict[str, Any],
+                            received_at: datetime) -> Tuple[int, int]:
+        """
+        Сохраняет вопрос и ответ, возвращает (session_id, message_id ответа ассистента).
+        Все записи — после генерации ответа, без ORM unit of work:
+        сессия (UPDATE/INSERT ... RETURNING id) и оба сообщения одним INSERT.
+        """
+        now = datetime.utcnow()
+        session_id = None
+        if request.session_id:
+            # Обновление активности заодно проверяет, что сессия принадлежит пользователю
+            session_id = db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == request.session_id, ChatSession.user_id == user.id)
+                .values(last_activity_at=now)
+                .returning(ChatSession.id)
+            ).scalar_one_or_none()
         
+        if session_id is None:
+            # Создаем новую сессию
+            session_id = db.execute(
+                insert(ChatSession)
+                .values(
+                    user_id=user.id,
+                    title=f"Чат {datetime.now().strftime('%d.%m %H:%M')}",
+                    context_data=profile_analysis,
+                    last_activity_at=now
+                )
+                .returning(ChatSession.id)
+            ).scalar_one()
+        
+        # Сообщение пользователя и ответ ассистента
+        message_ids = db.execute(
+            insert(ChatMessage).returning(ChatMessage.id, sort_by_parameter_order=True),
+            [
+                {"session_id": session_id, "role": "user", "content": request.message,
+                 "message_metadata": None, "created_at": received_at},
+                {"session_id": session_id, "role": "assistant", "content": response_data["response"],
+                 "message_metadata": response_data.get("metadata", {}), "created_at": now},
+            ]
+        ).scalars().all()
+        message_id = message_ids[-1]
+        db.commit()
+        return session_id, message_id
+
+    def _build_chat_response(self, session_id: int, message_id: int, response_data: Dict[str, Any]) -> AssistantChatResponse:
         return AssistantChatResponse(
-            session_id=session.id,
-            message_id=assistant_message.id,
+            session_id=session_id,
+            message_id=message_id,
             response=response_data["response"],
             recommendations=response_data.get("recommendations", []),
             actions=response_data.get("actions", []),
@@ -425,32 +765,9 @@ class AIAssistantService:
         
         if not completeness["is_complete"]:
             # Профиль заполнен не полностью - советуем дозаполнить
-            missing_fields_ru = {
-                "first_name": "имя",
-                "last_name": "фамилия", 
-                "about": "описание \"о себе\"",
-                "location": "местоположение",
-                "programming_languages": "языки программирования",
-                "other_competencies": "навыки и компетенции",
-                "work_experience": "опыт работы",
-                "education": "образование"
-            }
-            
-            missing_list = [missing_fields_ru.get(field, field) for field in completeness["missing_fields"]]
-            
-            response = f"""Для построения карьерного плана мне нужно лучше узнать вас! 📊
-
-Ваш профиль заполнен на {completeness['percentage']}%. Для персонализированных рекомендаций рекомендую дозаполнить:
-
-{chr(10).join([f"• {field}" for field in missing_list[:5]])}
-
-После заполнения профиля я смогу:
-✅ Подобрать подходящие вакансии в компании
-✅ Рекомендовать курсы для развития нужных навыков  
-✅ Составить пошаговый план карьерного роста
-✅ Показать, какие навыки нужно подтянуть
-
-Хотите начать с заполнения профиля?"""
+            response = _render_profile_completion(
+                completeness["percentage"], tuple(completeness["missing_fields"])
+            )
 
             return {
                 "response": response,
@@ -467,8 +784,13 @@ class AIAssistantService:
             }
         else:
             # Профиль заполнен - даем рекомендации по развитию
-            courses = await self._recommend_courses(user, db, goal=message)
-            vacancies = await self._find_relevant_vacancies(user, db)
+            # Подбор вакансий ждёт сеть (embeddings), подбор курсов — только БД:
+            # запускаем вместе, курсы считаются, пока идёт запрос за embedding.
+            # Сессия БД не используется конкурентно — _recommend_courses не содержит await
+            vacancies, courses = await asyncio.gather(
+                self._find_relevant_vacancies(user, db),
+                self._recommend_courses(user, db, goal=message),
+            )
             
             course_recommendations = []
             for course in courses[:3]:
@@ -480,23 +802,13 @@ class AIAssistantService:
                     "skills": course.skills[:3] if course.skills else []
                 })
 
-            response = f"""Отличный вопрос о карьерном развитии! 🚀
-
-На основе анализа вашего профиля, вот мой план действий:
-
-**📚 Рекомендуемые курсы:**
-{chr(10).join([f"• {course.title} ({course.category})" for course in courses[:3]])}
-
-**🎯 Подходящие вакансии в компании:**
-{chr(10).join([f"• {vacancy.title}" + (f" — {int(similarity*100)}% совпадение" if similarity > 0.5 else "") for vacancy, similarity in vacancies[:2]])}
-
-**📈 Следующие шаги:**
-1. Пройти ключевые курсы по недостающим навыкам
-2. Обновить профиль новыми компетенциями  
-3. Откликнуться на подходящие внутренние вакансии
-4. Получить обратную связь от текущего руководителя
-
-Хотите подробнее обсудить конкретный курс или вакансию?"""
+            response = CAREER_GUIDANCE_TEMPLATE.format(
+                courses="\n".join(f"• {course.title} ({course.category})" for course in courses[:3]),
+                vacancies="\n".join(
+                    f"• {vacancy.title}" + (f" — {int(similarity*100)}% совпадение" if similarity > 0.5 else "")
+                    for vacancy, similarity in vacancies[:2]
+                ),
+            )
 
             return {
                 "response": response,
@@ -514,14 +826,57 @@ class AIAssistantService:
                 "confidence": 0.85
             }
 
+    async def _handle_general_question_cached(self, user: User, db: Session, message: str, profile_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Общий вопрос через семантический кэш: если пользователь уже спрашивал
+        почти то же самое (cosine >= 0.95), возвращаем сохранённый ответ без вызова LLM.
+        """
+        query_embedding, namespace, cached = await self._lookup_semantic_cache(user, message, profile_analysis)
+        if cached is not None:
+            return cached
+
+        response_data = await self._handle_general_question(user, db, message, profile_analysis)
+        if query_embedding is not None and response_data.get("response_type") != "fallback":
+            self._semantic_cache.put(query_embedding, response_data, namespace=namespace)
+        return response_data
+
+    async def _lookup_semantic_cache(self, user: User, message: str, profile_analysis: Dict[str, Any]) -> Tuple[Optional[List[float]], Tuple, Optional[Dict[str, Any]]]:
+        """
+        Ищет сохранённый ответ на похожий вопрос.
+        Возвращает (embedding вопроса или None при ошибке, namespace, ответ или None).
+        """
+        # Ответ зависит от профиля, поэтому кэш разделён по пользователю и заполненности профиля
+        namespace = (user.id, profile_analysis["completeness"]["percentage"])
+        try:
+            query_embedding = await self._call_llm(message, is_embedding=True)
+        except Exception:
+            logger.exception("Failed to embed query for semantic cache")
+            return None, namespace, None
+
+        cached = self._semantic_cache.get(query_embedding, namespace=namespace)
+        if cached is not None:
+            logger.debug("Semantic cache hit for user %s", user.id)
+        return query_embedding, namespace, cached
+
     async def _handle_general_question(self, user: User, db: Session, message: str, profile_analysis: Dict[str, Any]) -> Dict[str, Any]:
         """
         Обработка общих вопросов к ассистенту.
         Использует LLM для генерации персонализированного ответа.
         """
+        try:
+            ai_response = await self._call_llm(self._build_general_prompt(message, profile_analysis))
+            return await self._build_general_response(user, db, message, ai_response)
+        except Exception:
+            logger.exception("LLM error")
+            return _general_fallback_response()
+
+    def _build_general_prompt(self, message: str, profile_analysis: Dict[str, Any]) -> List[str]:
+        """
+        User-сообщения для LLM. Порядок: статичный system → профиль → вопрос;
+        чем стабильнее начало, тем больше кэш-попаданий на стороне LLM-сервера.
+        """
         # Контекст для LLM на основе профиля пользователя
-        user_context = f"""
-Профиль пользователя:
+        user_context = f"""Профиль пользователя:
 - Имя: {profile_analysis['basic_info']['name']}
 - Навыки программирования: {', '.join(profile_analysis['skills']['programming_languages']) or 'Не указаны'}
 - Прочие навыки: {', '.join(profile_analysis['skills']['other_competencies']) or 'Не указаны'}
@@ -529,63 +884,63 @@ class AIAssistantService:
 - Заполненность профиля: {profile_analysis['completeness']['percentage']}%
 - О себе: {profile_analysis['basic_info']['about'] or 'Не заполнено'}
 """
+        return [user_context, f'Вопрос пользователя: "{message}"']
 
-        prompt = f"""
-{user_context}
+    async def _build_general_response(self, user: User, db: Session, message: str, ai_response: str) -> Dict[str, Any]:
+        """Дополняет ответ LLM рекомендациями курсов"""
+        # Пытаемся найти релевантные курсы, если в ответе упоминаются технологии
+        courses = await self._recommend_courses(user, db, goal=message)
+        course_recommendations = []
+        
+        if courses:
+            course_recommendations = [{
+                "type": "course",
+                "id": course.id,
+                "title": course.title,
+                "category": course.category
+            } for course in courses[:2]]
 
-Вопрос пользователя: "{message}"
+        return {
+            "response": ai_response,
+            "response_type": "general",
+            "recommendations": course_recommendations,
+            "quick_replies": [
+                "Покажи мои навыки",
+                "Как развиваться дальше?",
+                "Покажи подходящие вакансии"
+            ],
+            "confidence": 0.7
+        }
 
-Дай персонализированный ответ как карьерный консультант. Учитывай профиль пользователя.
-Если уместно, рекомендуй курсы или внутренние вакансии.
-Отвечай дружелюбно и профессионально, не более 300 слов.
-"""
 
-        try:
-            ai_response = await self._call_llm(prompt)
-            
-            # Пытаемся найти релевантные курсы, если в ответе упоминаются технологии
-            courses = await self._recommend_courses(user, db, goal=message)
-            course_recommendations = []
-            
-            if courses:
-                course_recommendations = [{
-                    "type": "course",
-                    "id": course.id,
-                    "title": course.title,
-                    "category": course.category
-                } for course in courses[:2]]
+def _general_fallback_response() -> Dict[str, Any]:
+    """Fallback ответ, если LLM недоступна"""
+    return {
+        "response": "Спасибо за вопрос! Я анализирую ваш запрос. Пока что рекомендую изучить доступные курсы и внутренние вакансии для развития карьеры.",
+        "response_type": "fallback",
+        "actions": [
+            {"type": "navigate", "target": "/candidate/vacancies", "label": "Посмотреть вакансии"}
+        ],
+        "confidence": 0.3
+    }
 
-            return {
-                "response": ai_response,
-                "response_type": "general",
-                "recommendations": course_recommendations,
-                "quick_replies": [
-                    "Покажи мои навыки",
-                    "Как развиваться дальше?",
-                    "Покажи подходящие вакансии"
-                ],
-                "confidence": 0.7
-            }
-            
-        except Exception as e:
-            print(f"❌ LLM error: {e}")
-            # Fallback ответ
-            return {
-                "response": "Спасибо за вопрос! Я анализирую ваш запрос. Пока что рекомендую изучить доступные курсы и внутренние вакансии для развития карьеры.",
-                "response_type": "fallback",
-                "actions": [
-                    {"type": "navigate", "target": "/candidate/vacancies", "label": "Посмотреть вакансии"}
-                ],
-                "confidence": 0.3
-            }
+
+def _sse_event(event: str, data: Union[Dict[str, Any], str]) -> str:
+    """Форматирует событие Server-Sent Events (строка data считается готовым JSON)"""
+    if not isinstance(data, str):
+        data = to_json(data).decode()
+    return f"event: {event}\ndata: {data}\n\n"
 
 
 # Глобальный экземпляр сервиса
 _ai_assistant_service = None
+_ai_assistant_service_lock = threading.Lock()
 
 def get_ai_assistant_service() -> AIAssistantService:
-    """Получить экземпляр AI-ассистента"""
+    """Получить экземпляр AI-ассистента (создаётся ровно один раз, в т.ч. из потоков threadpool)"""
     global _ai_assistant_service
     if _ai_assistant_service is None:
-        _ai_assistant_service = AIAssistantService()
+        with _ai_assistant_service_lock:
+            if _ai_assistant_service is None:
+                _ai_assistant_service = AIAssistantService()
     return _ai_assistant_service
@@ -5,6 +5,9 @@
 #
 
 import os
+import asyncio
+import threading
+from collections import OrderedDict
 
 from loguru import logger
 
@@ -12,7 +15,6 @@ from pipecat.frames.frames import LLMRunFrame, EndFrame
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
-import time
 from pipecat.services.gemini_multimodal_live.gemini import (
     GeminiMultimodalLiveLLMService,
     GeminiVADParams
@@ -30,7 +32,6 @@ from pipecat.adapters.schemas.tools_schema import ToolsSchema
 from pipecat.services.llm_service import FunctionCallParams
 from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
 import aiohttp
-import json
 from app.schemas import InterviewResponse
 from pipecat.transports.services.daily import DailyTransport, DailyParams
 from pipecat.processors.transcript_processor import TranscriptProcessor
@@ -64,13 +65,93 @@ stop_interview = FunctionSchema(
     required=["report"]
 )
 tools = ToolsSchema(standard_tools=[datetime_function, stop_interview])
+# Static prompt templates: built once at import, only the placeholders are filled per interview
+SYSTEM_INSTRUCTION_TEMPLATE = """
+Ты — Александра, продвинутый HR-интервьюер.
+
+**Задача:** Провести структурированное интервью на **русском языке**, соблюдая этические нормы (без дискриминационных вопросов). Твоя роль — оценить кандидата и подготовить отчет для HR-менеджера, **а не принимать решение о найме**.
+Текущее время: {current_time}
+
+---
+
+### **План Действий**
+
+**1. Внутренний анализ (перед первым вопросом):**
+* Выдели из вакансии 5-7 ключевых компетенций.
+* Сопоставь их с резюме, определи главные темы для проверки.
+
+**2. Проведение интервью (взаимодействие с кандидатом):**
+* **Структура по времени:** Придерживайся плана: Вступление (~5%), Основные вопросы (~70%), Вопросы кандидата (~15%), Завершение (~10%).
+* **Начало:** Кратко представься и озвучь план беседы.
+* **Диалог:** Задавай по **одному** вопросу за раз. Если ответ неполный — задавай уточняющие вопросы.
+* **Завершение:** Будь нейтрален. Поблагодари, озвучь следующие шаги (например, «Мы свяжемся с вами в течение N дней») и пожелай хорошего дня. Не давай никаких намеков на решение.
+
+**3. Итоговый отчет (для HR-менеджера):**
+* **Оценка по компетенциям:**
+    * `[Компетенция]`: `[Подтверждена / Частично / Не подтверждена]` — `[Краткое обоснование]`
+* **Сильные стороны:** (список 2-3)
+* **Риски / Зоны роста:** (список 1-2)
+* **Рекомендация:** `[Рекомендовать / Рассмотреть / Не рекомендовать]` с четкой аргументацией.
+Пожалуйста, произноси числительные на русском языке, для этого можешь перевести их в письменную форму, например, 3 - "три"
+    """
+CANDIDATE_MESSAGE_TEMPLATE = """**Входные данные о кандидате:**
+* **Вакансия: {vacancy_data}**
+* **Резюме: {resume_data}**
+* **Время (минут):5**. Поприветствуй кандидата и начни собеседование."""
+# Fields of vacancy/resume that are not shown to the interviewer LLM
+VACANCY_PROMPT_EXCLUDE = {"id", "original_url", "creator_id", "hr_id", "auto_interview_enabled", "created_at", "updated_at", "status"}
+RESUME_PROMPT_EXCLUDE = {"id", "user_id", "vacancy_id", "file_path", "original_filename", "uploaded_at", "processed", "uploaded_by_hr", "hidden_for_hr", "updated_at", "status", "user"}
+# Serialized vacancy/resume reused across interviews, keyed by (kind, id, updated_at)
+PROMPT_JSON_CACHE_SIZE = 256
+_prompt_json_cache: "OrderedDict[tuple, str]" = OrderedDict()
+# Rendering runs in worker threads (see _prepare_interview_inputs)
+_prompt_json_cache_lock = threading.Lock()
+
+def _render_prompt_json(kind: str, model, exclude: set) -> str:
+    # Same vacancy is interviewed many times; dump it once per version
+    key = (kind, model.id, model.updated_at)
+    with _prompt_json_cache_lock:
+        cached = _prompt_json_cache.get(key)
+        if cached is not None:
+            _prompt_json_cache.move_to_end(key)
+            return cached
+    # Serialize straight to JSON in pydantic-core (Enum/datetime handled, UTF-8 kept as is),
+    # without an intermediate dict and a second pass through stdlib json
+    data = model.model_dump_json(indent=2, exclude=exclude)
+    with _prompt_json_cache_lock:
+        _prompt_json_cache[key] = data
+        if len(_prompt_json_cache) > PROMPT_JSON_CACHE_SIZE:
+            _prompt_json_cache.popitem(last=False)
+    return data
+
+def _prepare_interview_inputs(interview_data) -> tuple:
+    # CPU-bound validation + serialization; called via asyncio.to_thread to keep the loop free
+    interview = InterviewResponse.model_validate(interview_data)
+    vacancy_data = _render_prompt_json("vacancy", interview.vacancy, VACANCY_PROMPT_EXCLUDE)
+    resume_data = _render_prompt_json("resume", interview.resume, RESUME_PROMPT_EXCLUDE)
+    return interview, vacancy_data, resume_data
+
+# Pause before disconnecting so the bot can finish its closing phrase
+STOP_INTERVIEW_GRACE_SECONDS = 10
 async def get_current_datetime(params: FunctionCallParams):
     # Fetch weather data from your API
     datetime_data = {"datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
     await params.result_callback(datetime_data)
 # Create a tools schema with your functions
-def _make_stop_interview(transport: DailyTransport, api_base_url: str, auth_headers: dict, interview_id: int, transcription_ref: dict):
-    async def _stop_interview(params: FunctionCallParams):
+class StopInterviewHandler:
+    """stop_interview tool: saves the report and dialogue, then ends the call"""
+
+    __slots__ = ("transport", "api_base_url", "auth_headers", "interview_id", "transcription", "session")
+
+    def __init__(self, transport: DailyTransport, api_base_url: str, auth_headers: dict, interview_id: int, transcription: dict, session: aiohttp.ClientSession):
+        self.transport = transport
+        self.api_base_url = api_base_url
+        self.auth_headers = auth_headers
+        self.interview_id = interview_id
+        self.transcription = transcription
+        self.session = session
+
+    async def __call__(self, params: FunctionCallParams):
         try:
             args = params.arguments or {}
             report = args.get("report")
@@ -79,37 +160,76 @@ def _make_stop_interview(transport: DailyTransport, api_base_url: str, auth_head
             if report:
                 payload["summary"] = report
             # Attach dialogue transcription if available
-            if transcription_ref:
-                payload["dialogue"] = transcription_ref
-            logger.info(f"Interview {interview_id} stopped with report: {report}")
-            async with aiohttp.ClientSession() as session:
-                # Save summary/end_date via API
-                url = f"{api_base_url}/interviews/{interview_id}"
-                async with session.put(url, json=payload, headers=auth_headers) as resp:
-                    resp_text = await resp.text()
-                    if resp.status >= 400:
-                        logger.error(f"Failed to update interview {interview_id}: {resp.status} {resp_text}")
-                        await params.result_callback({"ok": False, "status": resp.status, "body": resp_text})
-                    else:
-                        logger.info(f"Interview {interview_id} updated successfully")
-                        # Disconnect WebRTC session
-                        try:
-                            time.sleep(10)
-                            await transport.output().stop(EndFrame())
-                            logger.info("Transport disconnected")
-                        except Exception as e:
-                            logger.error(f"Error disconnecting transport: {e}")
-                        await params.result_callback({"ok": True})
+            # (entries are (timestamp, role, content) tuples, materialized to dicts only here)
+            if self.transcription:
+                payload["dialogue"] = {
+                    "dialogue": [
+                        {"timestamp": timestamp, "role": role, "content": content}
+                        for timestamp, role, content in self.transcription["dialogue"]
+                    ]
+                }
+            logger.info(f"Interview {self.interview_id} stopped with report: {report}")
+            # Save summary/end_date via API (shared session of run_bot, keep-alive connection)
+            url = f"{self.api_base_url}/interviews/{self.interview_id}"
+            async with self.session.put(url, json=payload, headers=self.auth_headers) as resp:
+                resp_text = await resp.text()
+                if resp.status >= 400:
+                    logger.error(f"Failed to update interview {self.interview_id}: {resp.status} {resp_text}")
+                    await params.result_callback({"ok": False, "status": resp.status, "body": resp_text})
+                else:
+                    logger.info(f"Interview {self.interview_id} updated successfully")
+                    # Disconnect WebRTC session
+                    try:
+                        # Non-blocking wait: the event loop keeps serving the transport and other bots
+                        await asyncio.sleep(STOP_INTERVIEW_GRACE_SECONDS)
+                        await self.transport.output().stop(EndFrame())
+                        logger.info("Transport disconnected")
+                    except Exception as e:
+                        logger.error(f"Error disconnecting transport: {e}")
+                    await params.result_callback({"ok": True})
         except Exception as e:
             logger.exception("Unhandled error in stop_interview")
             try:
                 await params.result_callback({"ok": False, "error": str(e)})
             except Exception:
                 pass
-    return _stop_interview
+
+async def _login(session: aiohttp.ClientSession, api_base_url: str) -> dict:
+    # Returns auth headers for server-to-server calls (empty if login failed)
+    api_token = None
+    async with session.post(f"{api_base_url}/auth/login", json={"username": f"{os.getenv('HR_USERNAME')}", "password": f"{os.getenv('HR_PASSWORD')}"}) as response:
+        if response.status == 200:
+            api_token = await response.json()
+            api_token = api_token["access_token"]
+        else:
+            logger.error(f"Failed to get API token. Status code: {response.status}")
+    return {"Authorization": f"Bearer {api_token}"} if api_token else {}
+
+async def _fetch_interview(session: aiohttp.ClientSession, api_base_url: str, interview_id, auth_headers: dict):
+    interview_data = None
+    async with session.get(f"{api_base_url}/interviews/{interview_id}", headers=auth_headers) as response:
+        if response.status == 200:
+            interview_data = await response.json()
+            logger.info(f"Interview data: {interview_data}")
+        else:
+            logger.error(f"Failed to get interview data. Status code: {response.status}")
+    return interview_data
 
 async def run_bot(interview_id, room_url, token):
+    # One HTTP session (connection pool) for all backend API calls of the bot
+    session = aiohttp.ClientSession()
+    try:
+        await _run_bot(session, interview_id, room_url, token)
+    finally:
+        await session.close()
+
+async def _run_bot(session: aiohttp.ClientSession, interview_id, room_url, token):
     logger.info(f"Starting bot")
+    # Configure API base and auth for server-to-server calls.
+    # Login runs in the background while the transport and video services are built
+    api_base_url = os.getenv("API_BASE_URL", "http://localhost:8000")
+    login_task = asyncio.create_task(_login(session, api_base_url))
+
     pipecat_transport = DailyTransport(
         room_url=room_url,
         token=token,
@@ -127,71 +247,29 @@ async def run_bot(interview_id, room_url, token):
     ),
     )
 
-    # Configure API base and auth for server-to-server calls
-    api_base_url = os.getenv("API_BASE_URL", "http://localhost:8000")
-    api_token = None
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{api_base_url}/auth/login", json={"username": f"{os.getenv('HR_USERNAME')}", "password": f"{os.getenv('HR_PASSWORD')}"}) as response:
-            if response.status == 200:
-                api_token = await response.json()
-                api_token = api_token["access_token"]
-            else:
-                logger.error(f"Failed to get API token. Status code: {response.status}")
-    auth_headers = {"Authorization": f"Bearer {api_token}"} if api_token else {}
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{api_base_url}/interviews/{interview_id}", headers=auth_headers) as response:
-            if response.status == 200:
-                interview_data = await response.json()
-                logger.info(f"Interview data: {interview_data}")
-            else:
-                logger.error(f"Failed to get interview data. Status code: {response.status}")
-    interview = InterviewResponse.model_validate(interview_data)
-    vacancy = interview.vacancy
-    resume = interview.resume
-    # Получаем JSON-дружелюбные dict, чтобы корректно сериализовать Enum и datetime
-    vacancy_dict = vacancy.model_dump(
-        mode='json',
-        exclude={"id", "original_url", "creator_id", "hr_id", "auto_interview_enabled", "created_at", "updated_at", "status"}
-    )
-    resume_dict = resume.model_dump(
-        mode='json',
-        exclude={"id", "user_id", "vacancy_id", "file_path", "original_filename", "uploaded_at", "processed", "uploaded_by_hr", "hidden_for_hr", "updated_at", "status", "user"}
+    auth_headers = await login_task
+    # Interview fetch only needs the auth header; build services that don't depend on it meanwhile
+    interview_task = asyncio.create_task(_fetch_interview(session, api_base_url, interview_id, auth_headers))
+    simli = SimliVideoService(
+        SimliConfig(
+            apiKey=os.getenv("SIMLI_API_KEY"),
+            faceId=os.getenv("SIMLI_FACE_ID"),
+            handleSilence=True,
+            maxIdleTime=30,
+        ),
+        use_turn_server=True,
+        latency_interval=0
     )
+    transcript = TranscriptProcessor()
 
-    vacancy_data = json.dumps(vacancy_dict, ensure_ascii=False, indent=2)
-    resume_data = json.dumps(resume_dict, ensure_ascii=False, indent=2)
+    interview_data = await interview_task
+    # Validation of nested vacancy/resume runs off the event loop,
+    # so the Daily transport handshake is not blocked meanwhile
+    interview, vacancy_data, resume_data = await asyncio.to_thread(_prepare_interview_inputs, interview_data)
     
     logger.info(f"Vacancy data: {vacancy_data}")
     logger.info(f"Resume data: {resume_data}")
-    system_instruction = f"""
-Ты — Александра, продвинутый HR-интервьюер.
-
-**Задача:** Провести структурированное интервью на **русском языке**, соблюдая этические нормы (без дискриминационных вопросов). Твоя роль — оценить кандидата и подготовить отчет для HR-менеджера, **а не принимать решение о найме**.
-Текущее время: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
----
-
-### **План Действий**
-
-**1. Внутренний анализ (перед первым вопросом):**
-* Выдели из вакансии 5-7 ключевых компетенций.
-* Сопоставь их с резюме, определи главные темы для проверки.
-
-**2. Проведение интервью (взаимодействие с кандидатом):**
-* **Структура по времени:** Придерживайся плана: Вступление (~5%), Основные вопросы (~70%), Вопросы кандидата (~15%), Завершение (~10%).
-* **Начало:** Кратко представься и озвучь план беседы.
-* **Диалог:** Задавай по **одному** вопросу за раз. Если ответ неполный — задавай уточняющие вопросы.
-* **Завершение:** Будь нейтрален. Поблагодари, озвучь следующие шаги (например, «Мы свяжемся с вами в течение N дней») и пожелай хорошего дня. Не давай никаких намеков на решение.
-
-**3. Итоговый отчет (для HR-менеджера):**
-* **Оценка по компетенциям:**
-    * `[Компетенция]`: `[Подтверждена / Частично / Не подтверждена]` — `[Краткое обоснование]`
-* **Сильные стороны:** (список 2-3)
-* **Риски / Зоны роста:** (список 1-2)
-* **Рекомендация:** `[Рекомендовать / Рассмотреть / Не рекомендовать]` с четкой аргументацией.
-Пожалуйста, произноси числительные на русском языке, для этого можешь перевести их в письменную форму, например, 3 - "три"
-    """
+    system_instruction = SYSTEM_INSTRUCTION_TEMPLATE.format(current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     context = OpenAILLMContext(
     messages=[
         {
@@ -200,10 +278,7 @@ async def run_bot(interview_id, room_url, token):
         },
         {
             "role": "user",
-            "content": f"""**Входные данные о кандидате:**
-* **Вакансия: {vacancy_data}**
-* **Резюме: {resume_data}**
-* **Время (минут):5**. Поприветствуй кандидата и начни собеседование."""
+            "content": CANDIDATE_MESSAGE_TEMPLATE.format(vacancy_data=vacancy_data, resume_data=resume_data)
         }
     ])
     llm = GeminiMultimodalLiveLLMService(
@@ -223,7 +298,8 @@ async def run_bot(interview_id, room_url, token):
         tools=tools,
     )
     context_aggregator = llm.create_context_aggregator(context)
-    # Shared transcription object to accumulate dialogue during session
+    # Shared transcription object to accumulate dialogue during session;
+    # utterances are stored as compact (timestamp, role, content) tuples
     transcription = {"dialogue": []}
     llm.register_function(
     "get_current_datetime",
@@ -233,20 +309,9 @@ async def run_bot(interview_id, room_url, token):
     # Register stop_interview tool to allow LLM to save summary and end the session
     llm.register_function(
         "stop_interview",
-        _make_stop_interview(pipecat_transport, api_base_url, auth_headers, interview_id, transcription),
+        StopInterviewHandler(pipecat_transport, api_base_url, auth_headers, interview_id, transcription, session),
         cancel_on_interruption=True,
     )
-    simli = SimliVideoService(
-        SimliConfig(
-            apiKey=os.getenv("SIMLI_API_KEY"),
-            faceId=os.getenv("SIMLI_FACE_ID"),
-            handleSilence=True,
-            maxIdleTime=30,
-        ),
-        use_turn_server=True,
-        latency_interval=0
-    )
-    transcript = TranscriptProcessor()
     # Build the pipeline
     pipeline = Pipeline(
         [
@@ -289,7 +354,7 @@ async def run_bot(interview_id, room_url, token):
     @transcript.event_handler("on_transcript_update")
     async def on_transcript_update(processor, frame):
         for msg in frame.messages:
-            transcription["dialogue"].append({"timestamp": msg.timestamp if msg.timestamp else "", "role": msg.role, "content": msg.content})
+            transcription["dialogue"].append((msg.timestamp or "", msg.role, msg.content))
     # Run the pipeline
     runner = PipelineRunner(handle_sigint=False)
     await runner.run(task)
\ No newline at end of file
@@ -2,14 +2,107 @@
 Сервис для выбора лучшего кандидата с использованием ИИ
 """
 
-import json
-import re
+import asyncio
+import heapq
+import logging
+import os
+import random
+from bisect import bisect_left
 import httpx
+from pydantic import TypeAdapter
+from pydantic_core import from_json
 from typing import List, Dict, Any, Optional
+from typing_extensions import NotRequired, TypedDict
 from datetime import datetime
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Полный payload (промпт со всеми кандидатами) логируется только при AI_DEBUG=1
+_AI_DEBUG = os.getenv("AI_DEBUG") == "1"
+
+SYSTEM_PROMPT = (
+    "Ты профессиональный HR-аналитик с опытом подбора персонала. "
+    "Анализируй кандидатов максимально объективно и профессионально, "
+    "учитывая результаты интервью, опыт работы и соответствие требованиям вакансии."
+)
+
+
+def _extract_json_block(text: str) -> str:
+    """
+    Вырезает первый JSON-объект из ответа ИИ одним линейным проходом:
+    от первой '{' до парной ей '}' с учётом строк и экранирования,
+    поэтому текст или markdown после объекта не попадает в срез.
+    Если объект не закрыт, берётся срез до последней '}'; если скобок нет —
+    текст возвращается как есть.
+    """
+    start = text.find('{')
+    if start == -1:
+        return text
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    end = text.rfind('}')
+    return text[start:end + 1] if end > start else text
+
+
+# Обоснования моковой оценки по интервалам (0.4, 0.6, 0.8]: индекс — число пройденных порогов
+FALLBACK_REASONS = (
+    "Низкое соответствие требованиям вакансии",
+    "Среднее соответствие, требует дополнительного обучения",
+    "Хорошее соответствие, есть потенциал для развития",
+    "Отличное соответствие требованиям вакансии, высокие результаты на интервью",
+)
+FALLBACK_THRESHOLDS = (0.4, 0.6, 0.8)
+
+class RankedCandidate(TypedDict):
+    """Кандидат в ответе ИИ (схема из промпта ранжирования)"""
+    candidate_id: int
+    candidate_name: str
+    resume_id: int
+    interview_id: int
+    ranking_score: float
+    reasoning: str
+    interview_summary: NotRequired[Optional[str]]
+
+
+class RankingResponse(TypedDict):
+    ranked_candidates: List[RankedCandidate]
+
+
+# Разбор и проверка ответа ИИ за один проход pydantic-core: сразу в dict нужной формы,
+# ответ с пропущенными полями считается ошибкой и уходит в fallback
+RANKING_RESPONSE_ADAPTER = TypeAdapter(RankingResponse)
+
+# Сколько кандидатов ранжируется одним запросом к ИИ
+RANKING_CHUNK_SIZE = 10
+
+_fallback_random = random.Random()
+
+
+def _fallback_reasoning(score: float) -> str:
+    return FALLBACK_REASONS[bisect_left(FALLBACK_THRESHOLDS, score)]
+
 
 class CandidateSelectionService:
     """Сервис для выбора лучшего кандидата через ИИ"""
@@ -17,15 +110,32 @@ class CandidateSelectionService:
     def __init__(self):
         # Конфиг читаем из settings
         self.provider = ("scibox").lower()
-
-    def _build_request(self, prompt: str) -> tuple[str, Dict[str, str], Dict[str, Any]]:
-        """Собирает URL, заголовки и payload под выбранного провайдера."""
-        system_prompt = (
-            "Ты профессиональный HR-аналитик с опытом подбора персонала. "
-            "Анализируй кандидатов максимально объективно и профессионально, "
-            "учитывая результаты интервью, опыт работы и соответствие требованиям вакансии."
+        # Долгоживущий клиент с пулом соединений: без нового TCP/TLS на каждое ранжирование
+        self._client = httpx.AsyncClient(
+            timeout=120.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
         )
+        # URL, ключ и статичная часть payload не меняются между вызовами — собираем один раз
+        self._url, api_key, model = self._provider_config()
+        # httpx не мутирует переданный dict заголовков, поэтому он общий для всех запросов
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self._system_message = {"role": "system", "content": SYSTEM_PROMPT}
+        self._payload_template = {
+            "model": model,
+            "max_tokens": 8000,
+            "temperature": 0.7,
+            "top_p": 0.9,
+        }
 
+    async def aclose(self):
+        """Закрывает пул HTTP-соединений (вызывается при остановке приложения)"""
+        await self._client.aclose()
+
+    def _provider_config(self) -> tuple[str, str, str]:
+        """Возвращает (url, api_key, model) выбранного провайдера из settings."""
         if self.provider == "scibox":
             # SciBox LLM Service
             url = settings.scibox_base_url or "http://176.119.5.23:4000/v1"
@@ -41,49 +151,39 @@ class CandidateSelectionService:
             api_key = settings.heroku_ai_api_key or ""
             model = settings.heroku_ai_model or "gpt-4o-mini"
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            "max_tokens": 8000,
-            "temperature": 0.7,
-            "top_p": 0.9,
-        }
-        return url, headers, payload
+        return url, api_key, model
+
+    def _build_request(self, prompt: str) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Собирает URL, заголовки и payload под выбранного провайдера."""
+        # Поверхностная копия шаблона: меняется только user-сообщение
+        payload = dict(self._payload_template)
+        payload["messages"] = [self._system_message, {"role": "user", "content": prompt}]
+        return self._url, self._headers, payload
 
     async def call_ai(self, prompt: str) -> str:
         """Вызывает AI API и возвращает контент ассистента (строка)."""
         url, headers, payload = self._build_request(prompt)
 
-        print(f"🔍 AI Provider: {self.provider}")
-        print(f"🔍 Request URL: {url}")
-        print(f"🔍 Request Headers (masked auth): {{k: ('***' if k.lower()=='authorization' else v) for k,v in headers.items()}}")
-        print(f"🔍 Request Payload: {payload}")
-
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-                print(f"🔍 Response Status: {response.status_code}")
-                print(f"🔍 Response Headers: {response.headers}")
-                print(f"🔍 Response Body: {response.text}")
-
-                response.raise_for_status()
-                data = response.json()
-                # Ожидаем OpenAI-совместимый формат
-                return data["choices"][0]["message"]["content"]
-            except httpx.HTTPStatusError as e:
-                print(f"❌ HTTP Status Error: {e}")
-                print(f"❌ Response Text: {e.response.text}")
-                raise
-            except Exception as e:
-                print(f"❌ AI Provider API Error: {e}")
-                raise
+        # %-аргументы форматируются только при включённом DEBUG
+        logger.debug("AI request provider=%s url=%s prompt_chars=%d", self.provider, url, len(prompt))
+        if _AI_DEBUG:
+            logger.debug("AI request payload: %s", payload)
+
+        try:
+            response = await self._client.post(url, headers=headers, json=payload)
+            logger.debug("AI response status=%s", response.status_code)
+
+            response.raise_for_status()
+            # Разбираем байты тела напрямую: без декодирования в str и без вывода тела в лог
+            data = from_json(response.content)
+            # Ожидаем OpenAI-совместимый формат
+            return data["choices"][0]["message"]["content"]
+        except httpx.HTTPStatusError as e:
+            logger.error("AI HTTP status error %s: %s", e.response.status_code, e.response.text)
+            raise
+        except Exception:
+            logger.exception("AI provider API error")
+            raise
 
     async def rank_candidates_with_ai(self, vacancy_data: dict, candidates_data: list) -> Dict[str, Any]:
         """
@@ -101,21 +201,48 @@ class CandidateSelectionService:
 ЗАРПЛАТА: {vacancy_data['salary_from'] or 'Не указана'} - {vacancy_data['salary_to'] or 'Не указана'}
         """.strip()
 
-        # Формируем описание кандидатов
-        candidates_description = ""
+        # Кандидаты ранжируются пачками по RANKING_CHUNK_SIZE параллельными запросами:
+        # короткие промпты быстрее декодируются и не упираются в лимит контекста
+        chunks = [
+            candidates_data[i:i + RANKING_CHUNK_SIZE]
+            for i in range(0, len(candidates_data), RANKING_CHUNK_SIZE)
+        ]
+        results = await asyncio.gather(*[
+            self._rank_chunk(vacancy_description, chunk) for chunk in chunks
+        ])
+
+        # Сливаем отсортированные по убыванию оценки подсписки
+        ranked_candidates = list(heapq.merge(
+            *results, key=lambda candidate: candidate.get("ranking_score", 0), reverse=True
+        ))
+        return {"ranked_candidates": ranked_candidates}
+
+    async def _rank_chunk(self, vacancy_description: str, candidates_data: list) -> List[Dict[str, Any]]:
+        """
+        Ранжирует одну пачку кандидатов через ИИ.
+        Возвращает список, отсортированный по убыванию ranking_score;
+        при ошибке ИИ — моковое ранжирование этой пачки.
+        """
+        # Формируем описание кандидатов (части собираются в список и склеиваются один раз)
+        candidate_parts = []
         for i, candidate in enumerate(candidates_data, 1):
-            candidates_description += f"""
+            # Каждое поле читаем из dict один раз
+            skills = candidate['candidate_skills']
+            experience = candidate['candidate_experience']
+            education = candidate['candidate_education']
+            candidate_parts.append(f"""
 КАНДИДАТ {i}:
 - Имя: {candidate['candidate_name']}
 - ID кандидата: {candidate['candidate_id']}
 - ID резюме: {candidate['resume_id']}
 - ID интервью: {candidate['interview_id']}
 - Отчет по интервью: {candidate['interview_summary']}
-- Навыки: {', '.join(candidate['candidate_skills']) if candidate['candidate_skills'] else 'Не указаны'}
-- Количество позиций в опыте работы: {len(candidate['candidate_experience']) if candidate['candidate_experience'] else 0}
-- Количество записей об образовании: {len(candidate['candidate_education']) if candidate['candidate_education'] else 0}
+- Навыки: {', '.join(skills) if skills else 'Не указаны'}
+- Количество позиций в опыте работы: {len(experience) if experience else 0}
+- Количество записей об образовании: {len(education) if education else 0}
 ---
-            """.strip()
+            """.strip())
+        candidates_description = "".join(candidate_parts)
 
         prompt = f"""
 Проанализируй кандидатов для вакансии и отсортируй их от лучшего к худшему по релевантности.
@@ -162,55 +289,39 @@ class CandidateSelectionService:
             ai_response = await self.call_ai(prompt)
             
             # Извлекаем JSON из ответа
-            json_match = re.search(r'\{[\s\S]*\}', ai_response)
-            if json_match:
-                json_str = json_match.group()
-                analysis_data = json.loads(json_str)
-            else:
-                analysis_data = json.loads(ai_response)
-            
-            return analysis_data
+            ranked = RANKING_RESPONSE_ADAPTER.validate_json(_extract_json_block(ai_response))["ranked_candidates"]
+            ranked.sort(key=lambda candidate: candidate.get("ranking_score", 0), reverse=True)
+            return ranked
         except Exception as e:
-            print(f"Ошибка ранжирования кандидатов: {e}")
+            logger.error(f"Ошибка ранжирования кандидатов: {str(e)}")
             # Возвращаем моковые данные в случае ошибки
-            return self._get_fallback_ranking(candidates_data)
+            return self._get_fallback_ranking(candidates_data)["ranked_candidates"]
 
     def _get_fallback_ranking(self, candidates_data: list) -> Dict[str, Any]:
         """Возвращает моковое ранжирование в случае ошибки ИИ"""
-        import random
-        
-        ranked_candidates = []
-        for candidate in candidates_data:
-            # Простая оценка на основе длины отчета по интервью
-            base_score = min(0.9, len(candidate['interview_summary']) / 1000)
-            # Добавляем небольшой рандом для разнообразия
-            score = base_score + random.uniform(0, 0.1)
-            score = min(1.0, score)
-            
-            # Определяем обоснование на основе оценки
-            if score > 0.8:
-                reasoning = "Отличное соответствие требованиям вакансии, высокие результаты на интервью"
-            elif score > 0.6:
-                reasoning = "Хорошее соответствие, есть потенциал для развития"
-            elif score > 0.4:
-                reasoning = "Среднее соответствие, требует дополнительного обучения"
-            else:
-                reasoning = "Низкое соответствие требованиям вакансии"
-            
-            ranked_candidates.append({
-                "candidate_id": candidate['candidate_id'],
-                "candidate_name": candidate['candidate_name'],
-                "resume_id": candidate['resume_id'],
-                "interview_id": candidate['interview_id'],
-                "ranking_score": round(score, 2),
-                "reasoning": reasoning,
-                "interview_summary": candidate['interview_summary'],
-                "resume_status": candidate.get('resume_status', 'pending')
-            })
-        
-        # Сортируем по убыванию оценки
-        ranked_candidates.sort(key=lambda x: x['ranking_score'], reverse=True)
-        
+        # Простая оценка на основе длины отчета по интервью
+        # плюс небольшой рандом для разнообразия; считаем все оценки одним проходом
+        scores = [
+            min(1.0, min(0.9, len(candidate['interview_summary']) / 1000) + _fallback_random.random() * 0.1)
+            for candidate in candidates_data
+        ]
+        # Сортируем индексы по убыванию оценки, без lambda на каждое сравнение
+        order = sorted(range(len(candidates_data)), key=scores.__getitem__, reverse=True)
+
+        ranked_candidates = [
+            {
+                "candidate_id": candidates_data[i]['candidate_id'],
+                "candidate_name": candidates_data[i]['candidate_name'],
+                "resume_id": candidates_data[i]['resume_id'],
+                "interview_id": candidates_data[i]['interview_id'],
+                "ranking_score": round(scores[i], 2),
+                "reasoning": _fallback_reasoning(scores[i]),
+                "interview_summary": candidates_data[i]['interview_summary'],
+                "resume_status": candidates_data[i].get('resume_status', 'pending')
+            }
+            for i in order
+        ]
+
         return {"ranked_candidates": ranked_candidates}
 
 
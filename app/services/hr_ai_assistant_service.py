@@ -9,13 +9,21 @@ HR AI Assistant Service - Специализированный сервис AI-
 5. Рекомендации по улучшению вакансий для привлечения лучших кандидатов
 """
 
+import asyncio
+import hashlib
 import httpx
 import json
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, cast, String, func
+from sqlalchemy import and_, or_, cast, String, func, select, text, insert, update
 
 from app.models import User, Vec_profile, ChatSession, ChatMessage, AssistantRecommendation
 from app.schemas import (
@@ -24,10 +32,110 @@ from app.schemas import (
     RecommendationResponse, ChatSessionResponse
 )
 from app.config import settings
+from app.database import SessionLocal
 from app.services.hr_candidate_search_service import get_hr_candidate_search_service
+from app.services.semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = (
+    "Ты профессиональный HR-консультант и эксперт по подбору персонала. "
+    "Помогаешь HR-менеджерам находить лучших кандидатов, создавать вакансии, "
+    "анализировать рынок труда. "
+    "ВАЖНО: Отвечай КРАТКО и СТРУКТУРИРОВАННО. Максимум 3-4 предложения. "
+    "Используй списки, будь профессиональным и конкретным."
+)
+
+# Интенты HR-запросов в порядке приоритета: одно регулярное выражение на интент
+# вместо цикла проверок подстрок
+INTENT_PATTERNS = {
+    "candidate_search": re.compile("|".join(map(re.escape, ["найди кандидатов", "поиск кандидатов", "кандидаты на", "ищу"]))),
+    "vacancy_generation": re.compile("|".join(map(re.escape, ["создай вакансию", "генерируй описание", "составь", "вакансия"]))),
+    "hr_analytics": re.compile("|".join(map(re.escape, ["аналитика", "статистика", "сколько кандидатов", "топ навыки"]))),
+}
+
+# Разбор требований без LLM: словари и регулярные выражения собираются один раз
+DEFAULT_REQUIREMENTS_TITLE = "Разработчик"
+COMMON_SKILLS = ("python", "java", "javascript", "react", "node.js", "sql", "git", "docker", "kubernetes")
+# Навык -> все навыки списка, входящие в него подстрокой (javascript -> java, javascript)
+SKILL_SUBSUMES = {skill: frozenset(other for other in COMMON_SKILLS if other in skill) for skill in COMMON_SKILLS}
+# Lookahead позволяет находить совпадения, начинающиеся внутри предыдущего
+SKILL_RE = re.compile("(?=(" + "|".join(map(re.escape, sorted(COMMON_SKILLS, key=len, reverse=True))) + "))")
+LEVEL_RE = re.compile(r"(?P<junior>junior|стажер|начинающий)|(?P<senior>senior|ведущий|старший)")
+TITLE_RE = re.compile(
+    r"(?P<backend>backend|бэкенд)|(?P<frontend>frontend|фронтенд)|(?P<data>data)"
+    r"|(?P<data_role>scientist|analyst)|(?P<ml>machine learning|ml)"
+)
+
+JSON_DECODER = json.JSONDecoder()
+
+# Рекомендации по навыкам и зарплатам — неизменяемые пресеты
+MARKET_POSITION_RE = re.compile(r"(?P<backend>backend|python)|(?P<frontend>frontend|react)|(?P<data>data)")
+MARKET_SKILLS = {
+    "backend": ("Python", "Django", "FastAPI", "PostgreSQL", "Docker", "Git", "REST API"),
+    "frontend": ("JavaScript", "React", "TypeScript", "CSS", "HTML", "Git", "Webpack"),
+    "data": ("Python", "SQL", "Pandas", "NumPy", "Machine Learning", "Git", "Jupyter"),
+    "default": ("Git", "SQL", "Python", "JavaScript"),
+}
+SALARY_RECOMMENDATIONS = MappingProxyType({
+    "junior": MappingProxyType({"from": 80000, "to": 120000}),
+    "middle": MappingProxyType({"from": 120000, "to": 200000}),
+    "senior": MappingProxyType({"from": 200000, "to": 350000}),
+})
+
+# HR-аналитика: агрегаты считаются в PostgreSQL и кэшируются на несколько минут
+ANALYTICS_CACHE_TTL_SECONDS = 300.0
+# programming_languages — JSON-массив строк; не-массивы (NULL, объект) считаем пустыми
+TOP_SKILLS_SQL = text("""
+    SELECT skill, COUNT(*) AS cnt
+    FROM users
+    CROSS JOIN LATERAL json_array_elements_text(
+        CASE WHEN json_typeof(users.programming_languages) = 'array'
+             THEN users.programming_languages ELSE '[]'::json END
+    ) AS skill
+    WHERE users.role = 'USER'
+    GROUP BY skill
+    ORDER BY cnt DESC, skill
+    LIMIT :limit
+""")
+# Ключевые слова уровней опыта — те же, что в фильтре поиска кандидатов
+EXPERIENCE_LEVEL_MARKERS = {
+    "junior": ("junior", "начинающий"),
+    "middle": ("middle", "средний"),
+    "senior": ("senior", "lead", "архитектор"),
+}
+
+# LRU-кэш ответов LLM: шаблонные HR-промпты часто повторяются между сессиями
+LLM_CACHE_SIZE = 1024
+LLM_CACHE_TTL_SECONDS = 300.0
+
+# Ответы _generate_llm_response при сбое LLM — их не кэшируем
+LLM_ERROR_NO_CHOICES = "Не удалось получить ответ от AI."
+LLM_ERROR_API = "Ошибка при обращении к AI. Попробуйте позже."
+LLM_ERROR_TECHNICAL = "Техническая ошибка при генерации ответа."
+LLM_ERROR_RESPONSES = frozenset({LLM_ERROR_NO_CHOICES, LLM_ERROR_API, LLM_ERROR_TECHNICAL})
+
+# Семантический кэш HR-консультаций: перефразированный вопрос получает готовый ответ
+EMBEDDING_DIMENSION = 1024  # bge-m3
+CONSULTATION_CACHE_THRESHOLD = 0.85
+EMBEDDING_CACHE_SIZE = 1024
+
+# Кэш поиска кандидатов по близким запросам; короткий TTL — база кандидатов меняется
+SEARCH_CACHE_THRESHOLD = 0.92
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL_SECONDS = 600.0
+
+# last_activity_at сессии чата пишется в БД не чаще раза в N секунд
+SESSION_ACTIVITY_FLUSH_SECONDS = 30.0
+SESSION_ACTIVITY_MAX_TRACKED = 4096
+
+# Типовые советы по улучшению вакансии
+DEFAULT_VACANCY_SUGGESTIONS = [
+    "Рассмотрите добавление remote-опций для привлечения большего количества кандидатов",
+    "Укажите конкретные технологии для более точного поиска",
+    "Добавьте информацию о корпоративной культуре",
+]
+
 
 class HRAIAssistantService:
     """
@@ -41,6 +149,54 @@ class HRAIAssistantService:
     def __init__(self):
         # Используем тот же поисковый сервис для кандидатов
         self.candidate_search_service = get_hr_candidate_search_service()
+        # Общий пул соединений к LLM API: keep-alive вместо нового TCP/TLS на каждый вызов
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60),
+        )
+        # URL, заголовки и system-сообщение зависят только от конфига — собираем один раз
+        base_url = getattr(settings, 'scibox_base_url', 'https://llm.t1v.scibox.tech/v1')
+        api_key = getattr(settings, 'scibox_api_key', 'sk-your-api-key-here')
+        self._llm_url = f"{base_url.rstrip('/')}/chat/completions"
+        self._llm_headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self._llm_model = getattr(settings, 'scibox_model', 'Qwen2.5-72B-Instruct-AWQ')
+        self._system_message = {"role": "system", "content": SYSTEM_PROMPT}
+        embeddings_base_url = getattr(settings, 'scibox_embeddings_base_url', 'https://llm.t1v.scibox.tech/v1')
+        embeddings_api_key = getattr(settings, 'scibox_embeddings_api_key', 'sk-your-api-key-here')
+        self._embeddings_url = f"{embeddings_base_url.rstrip('/')}/embeddings"
+        self._embeddings_headers = {
+            "Authorization": f"Bearer {embeddings_api_key}",
+            "Content-Type": "application/json",
+        }
+        # Ограничение параллельных запросов к LLM (независимые промпты запускаются через gather)
+        self._llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        # sha256(model|max_tokens|prompt) -> (истекает в monotonic-секундах или None, ответ)
+        self._llm_cache: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        # Запросы в полёте: одинаковые промпты ждут один вызов LLM
+        self._llm_inflight: Dict[str, "asyncio.Task[str]"] = {}
+        self._consultation_cache = SemanticCache(
+            dim=EMBEDDING_DIMENSION, threshold=CONSULTATION_CACHE_THRESHOLD, max_entries=1024
+        )
+        # Агрегаты HR-аналитики: ключ -> (истекает в monotonic-секундах, значение)
+        self._analytics_cache: Dict[Tuple, Tuple[float, Any]] = {}
+        # id сессии чата -> time.monotonic() последней записи last_activity_at в БД
+        self._session_activity: Dict[int, float] = {}
+        # Доступ к _session_activity идёт из потоков asyncio.to_thread
+        self._session_activity_lock = threading.Lock()
+        # SIM-LRU кэш поиска кандидатов: ближайший по смыслу прошлый запрос -> его результат
+        self._search_cache = SemanticCache(
+            dim=EMBEDDING_DIMENSION, threshold=SEARCH_CACHE_THRESHOLD,
+            max_entries=SEARCH_CACHE_SIZE, ttl_seconds=SEARCH_CACHE_TTL_SECONDS
+        )
+        # LRU-кэш embedding-ов вопросов: текст -> вектор
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def aclose(self):
+        """Закрывает пул HTTP-соединений (вызывается при остановке приложения)"""
+        await self._client.aclose()
 
     async def handle_chat_message(
         self,
@@ -53,66 +209,76 @@ class HRAIAssistantService:
         Интеллектуально определяет тип запроса и направляет к нужному обработчику.
         """
         try:
-            # Получаем или создаем сессию чата
-            if request.session_id:
-                session = db.query(ChatSession).filter(
-                    ChatSession.id == request.session_id,
-                    ChatSession.user_id == hr_user.id
-                ).first()
-                if not session:
-                    session = self._create_new_session(db, hr_user, "HR Консультация")
-            else:
-                session = self._create_new_session(db, hr_user, "HR AI Чат")
-
-            # Сохраняем сообщение пользователя
-            user_message = ChatMessage(
-                session_id=session.id,
-                role="user",
-                content=request.message
+            # Сессия чата и сообщение пользователя пишутся в пуле потоков (своя сессия БД)
+            # параллельно с генерацией ответа: ответ от этой записи не зависит
+            session_id, response_data = await asyncio.gather(
+                asyncio.to_thread(self._open_session_with_message, hr_user.id, request),
+                self._process_hr_request(db, hr_user, request.message),
             )
-            db.add(user_message)
-            db.commit()
 
-            # Определяем тип запроса и генерируем ответ
-            response_data = await self._process_hr_request(db, hr_user, request.message, session)
-
-            # Сохраняем ответ ассистента
-            assistant_message = ChatMessage(
-                session_id=session.id,
-                role="assistant",
-                content=response_data["response"],
-                metadata={
-                    "recommendations": response_data.get("recommendations", []),
-                    "actions": response_data.get("actions", []),
-                    "quick_replies": response_data.get("quick_replies", [])
-                }
-            )
-            db.add(assistant_message)
+            message_id = await asyncio.to_thread(self._save_assistant_message, session_id, response_data)
 
-            # Обновляем время последней активности сессии
-            session.last_activity_at = datetime.utcnow()
-            db.commit()
-
-            return AssistantChatResponse(
-                session_id=session.id,
-                message_id=assistant_message.id,
-                response=response_data["response"],
-                recommendations=response_data.get("recommendations", []),
-                actions=response_data.get("actions", []),
-                quick_replies=response_data.get("quick_replies", []),
-                response_type=response_data.get("response_type", "general"),
-                confidence=response_data.get("confidence", 0.8)
-            )
+            return self._build_chat_response(session_id, message_id, response_data)
 
         except Exception as e:
             logger.error(f"Ошибка в HR AI ассистенте: {str(e)}")
             # Возвращаем базовый ответ при ошибке
-            return AssistantChatResponse(
-                session_id=request.session_id or 0,
-                message_id=0,
-                response="Извините, произошла ошибка. Попробуйте переформулировать ваш запрос.",
-                response_type="error"
-            )
+            return _chat_error_response(request)
+
+    async def stream_chat_message(
+        self,
+        db: Session,
+        hr_user: User,
+        request: AssistantChatRequest
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая версия handle_chat_message в формате Server-Sent Events.
+        HR-консультации отдаются событиями "delta" по мере генерации LLM, остальные
+        типы запросов — одним "delta"; в конце — событие "done" с AssistantChatResponse.
+        """
+        # Сессия чата и сообщение пользователя сохраняются параллельно с генерацией
+        persist_task = asyncio.create_task(
+            asyncio.to_thread(self._open_session_with_message, hr_user.id, request)
+        )
+        try:
+            if self._detect_intent(request.message) is None:
+                response_data = None
+                async for event, payload in self._stream_hr_consultation(request.message):
+                    if event == "delta":
+                        yield _sse_event("delta", {"content": payload})
+                    else:
+                        response_data = payload
+            else:
+                response_data = await self._process_hr_request(db, hr_user, request.message)
+                yield _sse_event("delta", {"content": response_data["response"]})
+
+            session_id = await persist_task
+            message_id = await asyncio.to_thread(self._save_assistant_message, session_id, response_data)
+            response = self._build_chat_response(session_id, message_id, response_data)
+        except Exception as e:
+            logger.error(f"Ошибка в HR AI ассистенте: {str(e)}")
+            # Сообщение пользователя могло успеть сохраниться — отдаём id его сессии
+            session_id = None
+            try:
+                session_id = await persist_task
+            except Exception as persist_error:
+                logger.error(f"Не удалось сохранить сообщение HR-чата: {str(persist_error)}")
+            response = _chat_error_response(request, session_id)
+        # Модель сериализуется сразу в JSON, без промежуточного dict
+        yield _sse_event("done", response.model_dump_json())
+
+    def _build_chat_response(self, session_id: int, message_id: int,
+                             response_data: Dict[str, Any]) -> AssistantChatResponse:
+        return AssistantChatResponse(
+            session_id=session_id,
+            message_id=message_id,
+            response=response_data["response"],
+            recommendations=response_data.get("recommendations", []),
+            actions=response_data.get("actions", []),
+            quick_replies=response_data.get("quick_replies", []),
+            response_type=response_data.get("response_type", "general"),
+            confidence=response_data.get("confidence", 0.8)
+        )
 
     async def search_candidates_with_vacancy(
         self,
@@ -135,9 +301,26 @@ class HRAIAssistantService:
                 threshold_filter_limit=vacancy_description.get("threshold_filter_limit", 40)
             )
 
+            # Похожий запрос уже выполнялся — отдаём его кандидатов без эмбеддинга, векторного поиска и AI-анализа
+            max_candidates = search_request.max_candidates
+            namespace = ((search_request.experience_level or "").lower(), search_request.threshold_filter_limit)
+            query_embedding = None
+            if max_candidates is not None:
+                query_embedding = await self._embed_text(_search_cache_text(search_request))
+            if query_embedding is not None:
+                cached = self._search_cache.get(query_embedding, namespace=namespace)
+                if cached is not None:
+                    cached_max, cached_result = cached
+                    if max_candidates <= cached_max:
+                        return cached_result.model_copy(
+                            update={"candidates": cached_result.candidates[:max_candidates]}
+                        )
+
             # Выполняем поиск через существующий сервис
             search_result = await self.candidate_search_service.search_candidates(db, search_request)
             
+            if query_embedding is not None and search_result.processed_by_ai > 0:
+                self._search_cache.put(query_embedding, (max_candidates, search_result), namespace=namespace)
             return search_result
 
         except Exception as e:
@@ -163,22 +346,18 @@ class HRAIAssistantService:
         с помощью LLM и данных о существующих кандидатах.
         """
         try:
-            # Формируем промпт для генерации описания вакансии
-            prompt = self._build_vacancy_generation_prompt(requirements)
-            
-            # Запрашиваем LLM
-            response_text = await self._generate_llm_response(prompt, max_tokens=800)
-            
+            position = requirements.get("position", "")
+            # Формируем промпт для генерации описания вакансии и запрашиваем LLM
+            response_text = await self._generate_llm_response(
+                self._build_vacancy_generation_prompt(requirements), max_tokens=800
+            )
+
             # Парсим ответ и возвращаем структурированные данные
             return {
                 "generated_description": response_text,
-                "suggestions": [
-                    "Рассмотрите добавление remote-опций для привлечения большего количества кандидатов",
-                    "Укажите конкретные технологии для более точного поиска",
-                    "Добавьте информацию о корпоративной культуре"
-                ],
-                "recommended_skills": self._extract_skills_from_market_data(db, requirements.get("position", "")),
-                "salary_recommendations": self._get_salary_recommendations(requirements.get("position", "")),
+                "suggestions": list(DEFAULT_VACANCY_SUGGESTIONS),
+                "recommended_skills": list(self._extract_skills_from_market_data(db, position)),
+                "salary_recommendations": self._get_salary_recommendations(position),
                 "response_type": "vacancy_generation"
             }
 
@@ -199,20 +378,10 @@ class HRAIAssistantService:
         Получает аналитические данные для HR по кандидатам и вакансиям.
         """
         try:
-            # Получаем статистику по кандидатам
-            total_candidates = db.query(User).filter(User.role == "USER").count()
-            
-            # Кандидаты с заполненными профилями
-            filled_profiles = db.query(User).filter(
-                User.role == "USER",
-                User.programming_languages.isnot(None)
-            ).count()
-            
-            # Топ навыки среди кандидатов
-            top_skills = self._get_top_candidate_skills(db, limit=10)
-            
-            # Статистика по уровням опыта
-            experience_stats = self._get_experience_distribution(db)
+            # Все запросы к БД — одним переходом в пул потоков
+            total_candidates, filled_profiles, top_skills, experience_stats = await asyncio.to_thread(
+                self._collect_hr_analytics, db
+            )
 
             return {
                 "total_candidates": total_candidates,
@@ -235,44 +404,148 @@ class HRAIAssistantService:
                 "response_type": "error"
             }
 
-    def _create_new_session(self, db: Session, hr_user: User, title: str) -> ChatSession:
-        """Создает новую сессию чата для HR-пользователя"""
-        session = ChatSession(
-            user_id=hr_user.id,
-            title=title,
-            context_data={
-                "user_role": "HR",
-                "created_at": datetime.utcnow().isoformat()
-            }
-        )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
-        return session
+    def _open_session_with_message(self, hr_user_id: int, request: AssistantChatRequest) -> int:
+        """
+        Находит или создает сессию чата и сохраняет сообщение пользователя одной транзакцией.
+        Выполняется в пуле потоков со своей сессией БД; возвращает id сессии чата.
+        Записи идут через Core (INSERT/UPDATE ... RETURNING), без ORM unit of work.
+        """
+        db = SessionLocal()
+        try:
+            # Получаем или создаем сессию чата (проверяя, что она принадлежит пользователю)
+            session_id = None
+            if request.session_id:
+                owned = and_(ChatSession.id == request.session_id, ChatSession.user_id == hr_user_id)
+                if self._session_activity_due(request.session_id):
+                    session_id = db.execute(
+                        update(ChatSession).where(owned)
+                        .values(last_activity_at=datetime.utcnow())
+                        .returning(ChatSession.id)
+                    ).scalar_one_or_none()
+                else:
+                    session_id = db.execute(select(ChatSession.id).where(owned)).scalar_one_or_none()
+            if session_id is None:
+                title = "HR Консультация" if request.session_id else "HR AI Чат"
+                # last_activity_at новой сессии выставляется default-ом при вставке
+                session_id = self._create_new_session(db, hr_user_id, title)
+            self._mark_session_activity(session_id)
+
+            # Сохраняем сообщение пользователя
+            db.execute(insert(ChatMessage).values(
+                session_id=session_id,
+                role="user",
+                content=request.message
+            ))
+            db.commit()
+            return session_id
+        finally:
+            db.close()
+
+    def _session_activity_due(self, session_id: int) -> bool:
+        """
+        Нужно ли записать last_activity_at: не чаще раза в SESSION_ACTIVITY_FLUSH_SECONDS
+        (debounce частых сообщений).
+        """
+        with self._session_activity_lock:
+            return self._session_activity_due_locked(session_id, time.monotonic())
+
+    def _session_activity_due_locked(self, session_id: int, now: float) -> bool:
+        last_flush = self._session_activity.get(session_id)
+        return last_flush is None or now - last_flush >= SESSION_ACTIVITY_FLUSH_SECONDS
+
+    def _mark_session_activity(self, session_id: int):
+        now = time.monotonic()
+        with self._session_activity_lock:
+            if not self._session_activity_due_locked(session_id, now):
+                return
+            if len(self._session_activity) > SESSION_ACTIVITY_MAX_TRACKED:
+                # Записи старше интервала ни на что не влияют — выбрасываем их
+                expired = [
+                    sid for sid, ts in self._session_activity.items()
+                    if now - ts >= SESSION_ACTIVITY_FLUSH_SECONDS
+                ]
+                for sid in expired:
+                    del self._session_activity[sid]
+            self._session_activity[session_id] = now
+
+    def _save_assistant_message(self, session_id: int, response_data: Dict[str, Any]) -> int:
+        """
+        Сохраняет ответ ассистента (Core INSERT ... RETURNING id); возвращает id сообщения.
+        Активность сессии уже обновлена вместе с сообщением пользователя.
+        """
+        db = SessionLocal()
+        try:
+            message_id = db.execute(
+                insert(ChatMessage).values(
+                    session_id=session_id,
+                    role="assistant",
+                    content=response_data["response"],
+                    message_metadata={
+                        "recommendations": response_data.get("recommendations", []),
+                        "actions": response_data.get("actions", []),
+                        "quick_replies": response_data.get("quick_replies", [])
+                    }
+                ).returning(ChatMessage.id)
+            ).scalar_one()
+            db.commit()
+            return message_id
+        finally:
+            db.close()
+
+    def _collect_hr_analytics(self, db: Session) -> Tuple[int, int, List[str], Dict[str, int]]:
+        """Синхронно собирает данные для HR-аналитики"""
+        # Всего кандидатов и кандидаты с заполненными профилями — одним запросом
+        # (Core select: без ORM Query и гидратации, только два числа)
+        counts = db.execute(
+            select(
+                func.count().label("total"),
+                func.count().filter(User.programming_languages.isnot(None)).label("filled"),
+            ).where(User.role == "USER")
+        ).one()
+        total_candidates, filled_profiles = counts.total, counts.filled
+
+        # Топ навыки среди кандидатов
+        top_skills = self._get_top_candidate_skills(db, limit=10)
+
+        # Статистика по уровням опыта
+        experience_stats = self._get_experience_distribution(db)
+        return total_candidates, filled_profiles, top_skills, experience_stats
+
+    def _create_new_session(self, db: Session, hr_user_id: int, title: str) -> int:
+        """Создает новую сессию чата для HR-пользователя; возвращает id (коммит — у вызывающего)"""
+        return db.execute(
+            insert(ChatSession).values(
+                user_id=hr_user_id,
+                title=title,
+                context_data={
+                    "user_role": "HR",
+                    "created_at": datetime.utcnow().isoformat()
+                }
+            ).returning(ChatSession.id)
+        ).scalar_one()
 
     async def _process_hr_request(
         self,
         db: Session,
         hr_user: User,
-        message: str,
-        session: ChatSession
+        message: str
     ) -> Dict[str, Any]:
         """
         Интеллектуально обрабатывает запрос HR-менеджера и определяет тип ответа
         """
-        message_lower = message.lower()
+        intent = self._detect_intent(message)
 
         # Определяем тип запроса по ключевым словам
-        if any(word in message_lower for word in ["найди кандидатов", "поиск кандидатов", "кандидаты на", "ищу"]):
+        if intent == "candidate_search":
             return await self._handle_candidate_search_request(db, hr_user, message)
         
-        elif any(word in message_lower for word in ["создай вакансию", "генерируй описание", "составь", "вакансия"]):
+        elif intent == "vacancy_generation":
             return await self._handle_vacancy_generation_request(db, hr_user, message)
         
-        elif any(word in message_lower for word in ["аналитика", "статистика", "сколько кандидатов", "топ навыки"]):
+        elif intent == "hr_analytics":
             analytics_data = await self.get_hr_analytics(db, hr_user)
             return {
-                "response": f"📊 **HR Аналитика:**\n\n**Всего кандидатов:** {analytics_data['total_candidates']}\n**Заполненных профилей:** {analytics_data['filled_profiles']} ({analytics_data['profile_completion_rate']}%)\n\n**Топ навыки:**\n" + "\n".join([f"• {skill}" for skill in analytics_data['top_skills'][:5]]),
+                "response": f"📊 **HR Аналитика:**\n\n**Всего кандидатов:** {analytics_data['total_candidates']}\n**Заполненных профилей:** {analytics_data['filled_profiles']} ({analytics_data['profile_completion_rate']}%)\n\n**Топ навыки:**\n" + "\n".join(f"• {skill}" for skill in analytics_data['top_skills'][:5]),
                 "response_type": "hr_analytics",
                 "actions": [
                     {"type": "view_analytics", "label": "Подробная аналитика"},
@@ -285,6 +558,14 @@ class HRAIAssistantService:
             # Общий HR-консалтинг
             return await self._handle_general_hr_consultation(db, hr_user, message)
 
+    def _detect_intent(self, message: str) -> Optional[str]:
+        """Возвращает первый по приоритету интент, ключевые слова которого есть в сообщении"""
+        message_lower = message.lower()
+        for intent, pattern in INTENT_PATTERNS.items():
+            if pattern.search(message_lower):
+                return intent
+        return None
+
     async def _handle_candidate_search_request(
         self,
         db: Session,
@@ -293,6 +574,7 @@ class HRAIAssistantService:
     ) -> Dict[str, Any]:
         """Обрабатывает запрос на поиск кандидатов"""
         # Извлекаем требования из сообщения с помощью LLM
+        # (если регулярные выражения уже распознали позицию и навыки — без вызова LLM)
         extraction_prompt = f"""
         Проанализируй запрос HR-менеджера и извлеки требования к вакансии в JSON формате:
         
@@ -308,31 +590,43 @@ class HRAIAssistantService:
         """
 
         try:
-            # Получаем структурированные требования от LLM
-            llm_response = await self._generate_llm_response(extraction_prompt, max_tokens=300)
-            
-            # Парсим JSON из ответа
-            vacancy_requirements = self._parse_vacancy_requirements(llm_response, message)
+            fast_requirements = self._extract_requirements_from_text(message)
+            if fast_requirements["required_skills"] and fast_requirements["title"] != DEFAULT_REQUIREMENTS_TITLE:
+                logger.info("Требования к вакансии извлечены без LLM (regex fast path)")
+                vacancy_requirements = self._with_requirement_defaults(fast_requirements)
+            else:
+                logger.info("Требования к вакансии извлекаются через LLM")
+                # Получаем структурированные требования от LLM
+                # Извлечение требований зависит только от текста запроса — кэшируем без TTL
+                llm_response = await self._generate_llm_response(extraction_prompt, max_tokens=300, cache_ttl=None)
+                
+                # Парсим JSON из ответа
+                vacancy_requirements = self._parse_vacancy_requirements(llm_response, message)
             
             # Выполняем поиск кандидатов
             search_result = await self.search_candidates_with_vacancy(db, vacancy_requirements)
             
             if search_result.processed_by_ai > 0:
-                response_text = f"🔍 **Найдены кандидаты для позиции '{vacancy_requirements['title']}':**\n\n"
-                response_text += f"**Всего профилей найдено:** {search_result.total_profiles_found}\n"
-                response_text += f"**Обработано AI:** {search_result.processed_by_ai}\n\n"
+                # Строки ответа собираются в список и склеиваются один раз
+                lines = [
+                    f"🔍 **Найдены кандидаты для позиции '{vacancy_requirements['title']}':**",
+                    "",
+                    f"**Всего профилей найдено:** {search_result.total_profiles_found}",
+                    f"**Обработано AI:** {search_result.processed_by_ai}",
+                    "",
+                ]
                 
                 if search_result.candidates:
-                    response_text += f"**Топ-{len(search_result.candidates)} кандидатов:**\n"
+                    lines.append(f"**Топ-{len(search_result.candidates)} кандидатов:**")
                     for i, candidate in enumerate(search_result.candidates[:3], 1):
-                        response_text += f"{i}. **{candidate.full_name}** (совпадение: {candidate.match_score:.0%})\n"
-                        response_text += f"   • Навыки: {', '.join(candidate.key_skills[:5])}\n"
+                        lines.append(f"{i}. **{candidate.full_name}** (совпадение: {candidate.match_score:.0%})")
+                        lines.append(f"   • Навыки: {', '.join(candidate.key_skills[:5])}")
                         if candidate.programming_languages:
-                            response_text += f"   • Языки: {', '.join(candidate.programming_languages)}\n"
-                        response_text += "\n"
+                            lines.append(f"   • Языки: {', '.join(candidate.programming_languages)}")
+                        lines.append("")
                 
                 return {
-                    "response": response_text,
+                    "response": "\n".join(lines) + "\n",
                     "response_type": "candidate_search",
                     "candidates_data": search_result.candidates,  # Для отображения карточек
                     "actions": [
@@ -408,102 +702,202 @@ class HRAIAssistantService:
     ) -> Dict[str, Any]:
         """Обрабатывает общие HR-консультации"""
         try:
-            consultation_prompt = f"""
-            Ты опытный HR-консультант. Ответь на вопрос коллеги-HR профессионально и полезно.
-            
-            Вопрос: "{message}"
-            
-            Дай практические советы и рекомендации. Ответ должен быть структурированным и лаконичным.
-            Максимум 200 слов.
-            """
+            # Похожий вопрос уже задавали — отвечаем из семантического кэша без вызова LLM
+            query_embedding = await self._embed_text(message)
+            if query_embedding is not None:
+                cached = self._consultation_cache.get(query_embedding)
+                if cached is not None:
+                    return dict(cached)
 
-            response_text = await self._generate_llm_response(consultation_prompt, max_tokens=400)
+            response_text = await self._generate_llm_response(_build_consultation_prompt(message), max_tokens=400)
 
-            return {
-                "response": f"💼 **HR Консультация:**\n\n{response_text}",
-                "response_type": "hr_consultation",
-                "quick_replies": ["Еще советы", "Примеры", "Лучшие практики"]
-            }
+            response_data = _consultation_response(response_text)
+            if query_embedding is not None and response_text not in LLM_ERROR_RESPONSES:
+                self._consultation_cache.put(query_embedding, response_data)
+            return response_data
 
         except Exception as e:
             logger.error(f"Ошибка при HR консультации: {str(e)}")
-            return {
-                "response": "Я опытный HR-консультант и готов помочь! Попробуйте переформулировать вопрос или задать конкретный запрос о поиске кандидатов, создании вакансий или HR-аналитике.",
-                "response_type": "general"
-            }
+            return _consultation_fallback_response()
+
+    async def _stream_hr_consultation(self, message: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Потоковая HR-консультация: отдаёт ("delta", фрагмент текста) по мере генерации
+        и в конце ("done", response_data). Использует тот же семантический кэш.
+        """
+        query_embedding = await self._embed_text(message)
+        if query_embedding is not None:
+            cached = self._consultation_cache.get(query_embedding)
+            if cached is not None:
+                yield "delta", cached["response"]
+                yield "done", dict(cached)
+                return
+
+        parts: List[str] = []
+        try:
+            async for content in self._stream_llm_response(_build_consultation_prompt(message), max_tokens=400):
+                if not parts:
+                    yield "delta", CONSULTATION_HEADER
+                parts.append(content)
+                yield "delta", content
+        except Exception as e:
+            logger.error(f"Ошибка потоковой HR консультации: {str(e)}")
+
+        if not parts:
+            response_data = _consultation_fallback_response()
+            yield "delta", response_data["response"]
+            yield "done", response_data
+            return
 
-    async def _generate_llm_response(self, prompt: str, max_tokens: int = 300) -> str:
-        """Генерирует ответ с помощью LLM"""
+        response_data = _consultation_response("".join(parts).strip())
+        if query_embedding is not None:
+            self._consultation_cache.put(query_embedding, response_data)
+        yield "done", response_data
+
+    async def _generate_llm_response(self, prompt: str, max_tokens: int = 300,
+                                     cache_ttl: Optional[float] = LLM_CACHE_TTL_SECONDS) -> str:
+        """
+        Генерирует ответ с помощью LLM.
+        Успешные ответы кэшируются (cache_ttl=None — без срока жизни),
+        одновременные одинаковые запросы ждут один общий вызов.
+        """
+        url, headers, payload = self._build_llm_request(prompt, max_tokens)
+        key = hashlib.sha256(f"{payload['model']}|{max_tokens}|{prompt}".encode("utf-8")).hexdigest()
+
+        cached = self._llm_cache_get(key)
+        if cached is not None:
+            return cached
+
+        task = self._llm_inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request_llm(key, url, headers, payload, cache_ttl))
+            self._llm_inflight[key] = task
+            task.add_done_callback(lambda _: self._llm_inflight.pop(key, None))
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    async def _stream_llm_response(self, prompt: str, max_tokens: int = 300) -> AsyncIterator[str]:
+        """
+        Потоковый запрос к LLM (stream=True, SSE): отдаёт фрагменты текста по мере генерации.
+        Ошибки HTTP пробрасываются; ответ не кэшируется (для кэша — _generate_llm_response).
+        """
         url, headers, payload = self._build_llm_request(prompt, max_tokens)
+        payload["stream"] = True
 
+        async with self._llm_semaphore:
+            async with self._client.stream("POST", url, json=payload, headers=headers) as response:
+                if response.status_code >= 400:
+                    body = await response.aread()
+                    logger.error(f"LLM API error: {response.status_code} - {body[:500]!r}")
+                    raise Exception(f"LLM API Error: {response.status_code}")
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    if choices:
+                        content = (choices[0].get("delta") or {}).get("content")
+                        if content:
+                            yield content
+
+    async def _request_llm(self, key: str, url: str, headers: Dict[str, str], payload: Dict[str, Any],
+                           cache_ttl: Optional[float]) -> str:
+        """Выполняет HTTP-запрос к LLM; в кэш попадают только успешные ответы"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "choices" in data and len(data["choices"]) > 0:
-                        return data["choices"][0]["message"]["content"].strip()
-                    else:
-                        return "Не удалось получить ответ от AI."
+            async with self._llm_semaphore:
+                response = await self._client.post(url, json=payload, headers=headers)
+
+            if response.status_code == 200:
+                data = response.json()
+                if "choices" in data and len(data["choices"]) > 0:
+                    content = data["choices"][0]["message"]["content"].strip()
+                    self._llm_cache_put(key, content, cache_ttl)
+                    return content
                 else:
-                    logger.error(f"LLM API error: {response.status_code} - {response.text}")
-                    return "Ошибка при обращении к AI. Попробуйте позже."
+                    return LLM_ERROR_NO_CHOICES
+            else:
+                logger.error(f"LLM API error: {response.status_code} - {response.text}")
+                return LLM_ERROR_API
 
         except Exception as e:
             logger.error(f"Ошибка при запросе к LLM: {str(e)}")
-            return "Техническая ошибка при генерации ответа."
+            return LLM_ERROR_TECHNICAL
+
+    def _llm_cache_get(self, key: str) -> Optional[str]:
+        entry = self._llm_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, content = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._llm_cache[key]
+            return None
+        self._llm_cache.move_to_end(key)
+        return content
+
+    def _llm_cache_put(self, key: str, content: str, ttl: Optional[float]):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._llm_cache[key] = (expires_at, content)
+        self._llm_cache.move_to_end(key)
+        while len(self._llm_cache) > LLM_CACHE_SIZE:
+            self._llm_cache.popitem(last=False)
+
+    async def _embed_text(self, text: str) -> Optional[List[float]]:
+        """Embedding текста через bge-m3 (с LRU-кэшем); None при ошибке"""
+        cached = self._embedding_cache.get(text)
+        if cached is not None:
+            self._embedding_cache.move_to_end(text)
+            return cached
+
+        try:
+            async with self._llm_semaphore:
+                response = await self._client.post(
+                    self._embeddings_url,
+                    json={"model": "bge-m3", "input": text},
+                    headers=self._embeddings_headers,
+                )
+            response.raise_for_status()
+            embedding = response.json()["data"][0]["embedding"]
+        except Exception as e:
+            logger.error(f"Ошибка при получении embedding: {str(e)}")
+            return None
+
+        self._embedding_cache[text] = embedding
+        if len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+            self._embedding_cache.popitem(last=False)
+        return embedding
 
     def _build_llm_request(self, prompt: str, max_tokens: int = 300) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
         """Создает запрос к Scibox LLM API для HR-ассистента"""
-        system_prompt = (
-            "Ты профессиональный HR-консультант и эксперт по подбору персонала. "
-            "Помогаешь HR-менеджерам находить лучших кандидатов, создавать вакансии, "
-            "анализировать рынок труда. "
-            "ВАЖНО: Отвечай КРАТКО и СТРУКТУРИРОВАННО. Максимум 3-4 предложения. "
-            "Используй списки, будь профессиональным и конкретным."
-        )
-
-        base_url = getattr(settings, 'scibox_base_url', 'https://llm.t1v.scibox.tech/v1')
-        api_key = getattr(settings, 'scibox_api_key', 'sk-your-api-key-here')
-        url = f"{base_url.rstrip('/')}/chat/completions"
-        
         payload = {
-            "model": getattr(settings, 'scibox_model', 'Qwen2.5-72B-Instruct-AWQ'),
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
+            "model": self._llm_model,
+            "messages": [self._system_message, {"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
             "temperature": 0.6,
             "top_p": 0.8,
         }
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-
-        return url, headers, payload
+        return self._llm_url, self._llm_headers, payload
 
     def _parse_vacancy_requirements(self, llm_response: str, original_message: str) -> Dict[str, Any]:
         """Парсит требования к вакансии из ответа LLM"""
+        # Разбираем первый JSON-объект ответа за один проход (текст после него игнорируется)
+        start = llm_response.find('{')
         try:
-            # Пытаемся распарсить JSON из ответа
-            import re
-            json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
-            if json_match:
-                requirements = json.loads(json_match.group())
-            else:
-                # Fallback парсинг на основе ключевых слов
-                requirements = self._extract_requirements_from_text(original_message)
-        except:
+            if start < 0:
+                raise ValueError("JSON object not found")
+            requirements, _ = JSON_DECODER.raw_decode(llm_response, start)
+        except ValueError:
             # Fallback парсинг на основе ключевых слов
             requirements = self._extract_requirements_from_text(original_message)
 
-        # Добавляем значения по умолчанию
+        return self._with_requirement_defaults(requirements)
+
+    def _with_requirement_defaults(self, requirements: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополняет требования к вакансии значениями по умолчанию"""
         return {
-            "title": requirements.get("title", "Разработчик"),
+            "title": requirements.get("title", DEFAULT_REQUIREMENTS_TITLE),
             "description": requirements.get("title", "Поиск специалиста"),
             "required_skills": requirements.get("required_skills", []),
             "experience_level": requirements.get("experience_level", "middle"),
@@ -516,26 +910,30 @@ class HRAIAssistantService:
         """Извлекает требования к вакансии из текста с помощью регулярных выражений"""
         text_lower = text.lower()
         
-        # Поиск уровня опыта
+        # Поиск уровня опыта (junior приоритетнее senior)
+        levels = {m.lastgroup for m in LEVEL_RE.finditer(text_lower)}
         experience_level = "middle"
-        if any(word in text_lower for word in ["junior", "стажер", "начинающий"]):
+        if "junior" in levels:
             experience_level = "junior"
-        elif any(word in text_lower for word in ["senior", "ведущий", "старший"]):
+        elif "senior" in levels:
             experience_level = "senior"
         
-        # Поиск навыков (базовый список)
-        common_skills = ["python", "java", "javascript", "react", "node.js", "sql", "git", "docker", "kubernetes"]
-        found_skills = [skill for skill in common_skills if skill in text_lower]
+        # Поиск навыков (базовый список): один проход, с учётом вложенных (java в javascript)
+        matched = set()
+        for m in SKILL_RE.finditer(text_lower):
+            matched.update(SKILL_SUBSUMES[m.group(1)])
+        found_skills = [skill for skill in COMMON_SKILLS if skill in matched]
         
         # Определение позиции
-        title = "Разработчик"
-        if "backend" in text_lower or "бэкенд" in text_lower:
+        markers = {m.lastgroup for m in TITLE_RE.finditer(text_lower)}
+        title = DEFAULT_REQUIREMENTS_TITLE
+        if "backend" in markers:
             title = "Backend разработчик"
-        elif "frontend" in text_lower or "фронтенд" in text_lower:
+        elif "frontend" in markers:
             title = "Frontend разработчик"
-        elif "data" in text_lower and ("scientist" in text_lower or "analyst" in text_lower):
+        elif "data" in markers and "data_role" in markers:
             title = "Data Scientist"
-        elif "ml" in text_lower or "machine learning" in text_lower:
+        elif "ml" in markers:
             title = "ML Engineer"
 
         return {
@@ -546,30 +944,57 @@ class HRAIAssistantService:
         }
 
     def _get_top_candidate_skills(self, db: Session, limit: int = 10) -> List[str]:
-        """Получает топ навыков среди кандидатов"""
+        """Получает топ навыков среди кандидатов (агрегация в БД, кэш на ANALYTICS_CACHE_TTL_SECONDS)"""
+        cached = self._analytics_cache_get(("top_skills", limit))
+        if cached is not None:
+            return cached
         try:
-            # Это упрощенная версия - в реальности нужно агрегировать JSON поля
-            # Возвращаем базовый список популярных навыков
-            return [
-                "Python", "JavaScript", "SQL", "Git", "Docker", 
-                "React", "Java", "Node.js", "PostgreSQL", "Django"
-            ]
+            rows = db.execute(TOP_SKILLS_SQL, {"limit": limit}).all()
+            top_skills = [row.skill for row in rows]
         except Exception as e:
             logger.error(f"Ошибка при получении топ навыков: {str(e)}")
+            db.rollback()
             return []
+        self._analytics_cache_put(("top_skills", limit), top_skills)
+        return top_skills
 
     def _get_experience_distribution(self, db: Session) -> Dict[str, int]:
-        """Получает распределение кандидатов по уровню опыта"""
+        """
+        Получает распределение кандидатов по уровню опыта.
+        Уровень определяется по упоминаниям в "о себе" и опыте работы (как в фильтре поиска),
+        поэтому кандидат может попасть в несколько уровней. Один запрос с COUNT ... FILTER.
+        """
+        cached = self._analytics_cache_get(("experience",))
+        if cached is not None:
+            return cached
         try:
-            # Упрощенная версия
-            return {
-                "junior": 45,
-                "middle": 65,
-                "senior": 28
-            }
+            work_experience_text = User.work_experience.cast(String)
+            counts = db.execute(
+                select(*[
+                    func.count().filter(or_(*[
+                        condition
+                        for marker in markers
+                        for condition in (User.about.ilike(f"%{marker}%"), work_experience_text.ilike(f"%{marker}%"))
+                    ])).label(level)
+                    for level, markers in EXPERIENCE_LEVEL_MARKERS.items()
+                ]).where(User.role == "USER")
+            ).one()
         except Exception as e:
             logger.error(f"Ошибка при получении распределения опыта: {str(e)}")
+            db.rollback()
             return {}
+        distribution = dict(counts._mapping)
+        self._analytics_cache_put(("experience",), distribution)
+        return distribution
+
+    def _analytics_cache_get(self, key: Tuple) -> Optional[Any]:
+        entry = self._analytics_cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def _analytics_cache_put(self, key: Tuple, value: Any):
+        self._analytics_cache[key] = (time.monotonic() + ANALYTICS_CACHE_TTL_SECONDS, value)
 
     def _build_vacancy_generation_prompt(self, requirements: Dict[str, Any]) -> str:
         """Создает промпт для генерации описания вакансии"""
@@ -587,26 +1012,83 @@ class HRAIAssistantService:
         - Условия
         """
 
-    def _extract_skills_from_market_data(self, db: Session, position: str) -> List[str]:
+    def _extract_skills_from_market_data(self, db: Session, position: str) -> Tuple[str, ...]:
         """Извлекает рекомендуемые навыки на основе анализа рынка"""
-        position_lower = position.lower()
-        
-        if "backend" in position_lower or "python" in position_lower:
-            return ["Python", "Django", "FastAPI", "PostgreSQL", "Docker", "Git", "REST API"]
-        elif "frontend" in position_lower or "react" in position_lower:
-            return ["JavaScript", "React", "TypeScript", "CSS", "HTML", "Git", "Webpack"]
-        elif "data" in position_lower:
-            return ["Python", "SQL", "Pandas", "NumPy", "Machine Learning", "Git", "Jupyter"]
-        else:
-            return ["Git", "SQL", "Python", "JavaScript"]
+        return _market_skills_for(position.lower())
 
     def _get_salary_recommendations(self, position: str) -> Dict[str, Any]:
-        """Получает рекомендации по зарплате для позиции"""
-        return {
-            "junior": {"from": 80000, "to": 120000},
-            "middle": {"from": 120000, "to": 200000},
-            "senior": {"from": 200000, "to": 350000}
-        }
+        """
+        Получает рекомендации по зарплате для позиции.
+        Возвращает копию: результат уходит в ответ и metadata сообщения (JSON).
+        """
+        return {level: dict(salary_range) for level, salary_range in SALARY_RECOMMENDATIONS.items()}
+
+
+@lru_cache(maxsize=128)
+def _market_skills_for(position_lower: str) -> Tuple[str, ...]:
+    """Рекомендуемые навыки по позиции (в нижнем регистре); приоритет: backend, frontend, data"""
+    markers = {m.lastgroup for m in MARKET_POSITION_RE.finditer(position_lower)}
+    for group in ("backend", "frontend", "data"):
+        if group in markers:
+            return MARKET_SKILLS[group]
+    return MARKET_SKILLS["default"]
+
+
+CONSULTATION_HEADER = "💼 **HR Консультация:**\n\n"
+
+
+def _build_consultation_prompt(message: str) -> str:
+    """Промпт для общей HR-консультации"""
+    return f"""
+            Ты опытный HR-консультант. Ответь на вопрос коллеги-HR профессионально и полезно.
+            
+            Вопрос: "{message}"
+            
+            Дай практические советы и рекомендации. Ответ должен быть структурированным и лаконичным.
+            Максимум 200 слов.
+            """
+
+
+def _search_cache_text(search_request: CandidateSearchRequest) -> str:
+    """Текст запроса поиска кандидатов для семантического кэша"""
+    return (
+        f"Вакансия: {search_request.job_title}\n"
+        f"Описание: {search_request.job_description}\n"
+        f"Навыки: {', '.join(search_request.required_skills or [])}\n"
+        f"Дополнительно: {search_request.additional_requirements or ''}"
+    )
+
+
+def _consultation_response(response_text: str) -> Dict[str, Any]:
+    return {
+        "response": f"{CONSULTATION_HEADER}{response_text}",
+        "response_type": "hr_consultation",
+        "quick_replies": ["Еще советы", "Примеры", "Лучшие практики"]
+    }
+
+
+def _consultation_fallback_response() -> Dict[str, Any]:
+    return {
+        "response": "Я опытный HR-консультант и готов помочь! Попробуйте переформулировать вопрос или задать конкретный запрос о поиске кандидатов, создании вакансий или HR-аналитике.",
+        "response_type": "general"
+    }
+
+
+def _chat_error_response(request: AssistantChatRequest, session_id: Optional[int] = None) -> AssistantChatResponse:
+    """Базовый ответ при ошибке обработки сообщения"""
+    return AssistantChatResponse(
+        session_id=session_id or request.session_id or 0,
+        message_id=0,
+        response="Извините, произошла ошибка. Попробуйте переформулировать ваш запрос.",
+        response_type="error"
+    )
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """Форматирует событие Server-Sent Events (строка data считается готовым JSON)"""
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {data}\n\n"
 
 
 # Глобальный экземпляр сервиса
@@ -3,22 +3,85 @@
 Реализует алгоритм умной фильтрации и RAG-модель для персонализированного поиска
 """
 
+import asyncio
+import hashlib
 import json
 import re
 import httpx
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, String
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy import and_, or_, cast, func, literal, select, String
 
 from app.config import settings
 from app.models import User, Vec_profile, UserRole
 from app.schemas import CandidateSearchRequest, CandidateSearchResponse, CandidateMatch
+from app.services.quantization import l2_normalize
+from app.services.semantic_cache import SemanticCache
 
 # Импорты для работы с векторами и LangChain
-import numpy as np
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC
+
+SYSTEM_PROMPT = (
+    "Ты профессиональный HR-эксперт с опытом подбора IT-персонала. "
+    "Анализируй профили кандидатов максимально объективно, учитывая "
+    "их навыки, опыт работы, образование и потенциал для развития."
+)
+
+# Кэш embedding-ов вакансий: sha256 текста вакансии -> вектор
+JOB_EMBEDDING_CACHE_SIZE = 512
+# Кэш AI-анализов: тот же кандидат и вакансия, близкая по смыслу, получают готовый анализ
+ANALYSIS_CACHE_THRESHOLD = 0.95
+ANALYSIS_CACHE_SIZE = 4096
+ANALYSIS_CACHE_TTL_SECONDS = 24 * 3600.0
+# Сколько кандидатов анализируется одним запросом к LLM и бюджет токенов на каждого
+ANALYSIS_BATCH_SIZE = 5
+ANALYSIS_TOKENS_PER_CANDIDATE = 300
+# Инкрементальный разбор потокового JSON-ответа с анализами
+JSON_DECODER = json.JSONDecoder()
+# Запасное извлечение JSON-массива, если модель проигнорировала JSON mode
+JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+# Сколько ближайших по FP16-индексу профилей переранжируется по точным FP32-векторам
+VECTOR_RERANK_CANDIDATES = 100
+# До этого числа отфильтрованных кандидатов — точный kNN по ним; больше — сначала ANN
+# по halfvec-индексу с запасом ANN_OVERFETCH_FACTOR * limit, затем фильтры навыков
+EXACT_KNN_MAX_CANDIDATES = 2000
+ANN_OVERFETCH_FACTOR = 10
+
+# Колонки User, нужные для текста профиля и AI-анализа (остальные не загружаются)
+CANDIDATE_COLUMNS = (
+    User.id, User.username, User.email, User.full_name, User.display_name,
+    User.location, User.about, User.desired_salary, User.ready_to_relocate, User.employment_type,
+    User.education, User.work_experience, User.foreign_languages,
+    User.other_competencies, User.programming_languages,
+)
+
+# Общие IT термины для дополнительной фильтрации (порядок — приоритет при отборе)
+IT_TERMS = (
+    'backend', 'frontend', 'fullstack', 'devops', 'qa', 'analyst', 'manager',
+    'mobile', 'web', 'api', 'database', 'cloud', 'docker', 'kubernetes',
+    'agile', 'scrum', 'team lead', 'architect', 'senior', 'middle', 'junior'
+)
+# Один проход по тексту вместо поиска каждого термина; lookahead находит и перекрывающиеся вхождения
+IT_TERMS_RE = re.compile("(?=(" + "|".join(map(re.escape, sorted(IT_TERMS, key=len, reverse=True))) + "))")
+
+
+def _clamp_score(value: float) -> float:
+    """Ограничивает оценку диапазоном 0.0-1.0 (сходство через <#> бывает отрицательным)"""
+    return max(0.0, min(1.0, value))
+
+
+def _normalize_llm_score(value, default: float = 0.5) -> float:
+    """Приводит match_score из ответа LLM к 0.0-1.0: модель иногда отвечает в процентах (85)"""
+    try:
+        score = float(str(value).strip().rstrip('%'))
+    except (TypeError, ValueError):
+        return default
+    if score > 1.0:
+        score /= 100.0
+    return _clamp_score(score)
 
 
 class HRCandidateSearchService:
@@ -38,79 +101,152 @@ class HRCandidateSearchService:
         # Конфигурация LLM провайдера (по умолчанию Scibox)
         self.provider = "scibox"
         self.embedding_dimension = 1024  # Размерность векторов bge-m3
-
-    def _build_llm_request(self, prompt: str, is_embedding: bool = False) -> tuple[str, Dict[str, str], Dict[str, Any]]:
-        """
-        Создает запрос к LLM API (Scibox).
-        Поддерживает как chat completion, так и embeddings endpoints.
-        """
-        system_prompt = (
-            "Ты профессиональный HR-эксперт с опытом подбора IT-персонала. "
-            "Анализируй профили кандидатов максимально объективно, учитывая "
-            "их навыки, опыт работы, образование и потенциал для развития."
+        # Ограничение числа одновременных запросов к LLM при анализе кандидатов
+        self._llm_semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        # Общий пул соединений к LLM API: keep-alive вместо нового TCP/TLS на каждый вызов
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60),
         )
+        self._job_embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        # namespace (user_id, хэш данных профиля): изменение профиля кандидата инвалидирует его анализы
+        self._analysis_cache = SemanticCache(
+            dim=self.embedding_dimension, threshold=ANALYSIS_CACHE_THRESHOLD,
+            max_entries=ANALYSIS_CACHE_SIZE, ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS
+        )
+        # Счетчики попаданий/промахов кэшей для наблюдаемости
+        self.cache_stats: Counter = Counter()
 
-        # Конфигурация для Scibox API
+        # URL, заголовки и system-сообщение зависят только от конфига — собираем один раз
         base_url = getattr(settings, 'scibox_embeddings_base_url', 'https://llm.t1v.scibox.tech/v1')
         api_key = getattr(settings, 'scibox_embeddings_api_key', 'sk-your-api-key-here')
-        
-        headers = {
+        self._headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
+        self._embeddings_url = f"{base_url.rstrip('/')}/embeddings"
+        self._chat_url = f"{settings.scibox_base_url.rstrip('/')}/chat/completions"
+        self._chat_model = getattr(settings, 'scibox_model', 'Qwen2.5-72B-Instruct-AWQ')
+        self._system_message = {"role": "system", "content": SYSTEM_PROMPT}
+
+    async def aclose(self):
+        """Закрывает пул HTTP-соединений (вызывается при остановке приложения)"""
+        await self._client.aclose()
 
+    def _build_llm_request(self, prompt: str, is_embedding: bool = False,
+                           max_tokens: int = 1000) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        Создает запрос к LLM API (Scibox).
+        Поддерживает как chat completion, так и embeddings endpoints.
+        """
         if is_embedding:
             # Запрос для получения эмбеддингов
-            url = f"{base_url.rstrip('/')}/embeddings"
-            payload = {
-                "model": "bge-m3",  # Embedding модель
-                "input": prompt
-            }
-        else:
-            # Запрос для chat completion
-            url = f"{settings.scibox_base_url.rstrip('/')}/chat/completions"
-            payload = {
-                "model": getattr(settings, 'scibox_model', 'Qwen2.5-72B-Instruct-AWQ'),
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt},
-                ],
-                "max_tokens": 1000,
-                "temperature": 0.3,  # Низкая температура для более консистентных результатов
-                "top_p": 0.9,
-            }
-        
-        return url, headers, payload
+            return self._embeddings_url, self._headers, {"model": "bge-m3", "input": prompt}
+
+        # Запрос для chat completion
+        payload = {
+            "model": self._chat_model,
+            "messages": [self._system_message, {"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.3,  # Низкая температура для более консистентных результатов
+            "top_p": 0.9,
+        }
+        return self._chat_url, self._headers, payload
 
-    async def _call_llm(self, prompt: str, is_embedding: bool = False) -> Any:
+    async def _call_llm(self, prompt: str, is_embedding: bool = False, max_tokens: int = 1000) -> Any:
         """
         Выполняет запрос к LLM API
         """
-        url, headers, payload = self._build_llm_request(prompt, is_embedding)
+        url, headers, payload = self._build_llm_request(prompt, is_embedding, max_tokens)
 
         print(f"🤖 LLM Request: {self.provider}")
         print(f"📍 URL: {url}")
         print(f"📊 Type: {'Embedding' if is_embedding else 'Chat Completion'}")
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+        try:
+            response = await self._client.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            data = response.json()
+            
+            if is_embedding:
+                # Возвращаем вектор эмбеддинга
+                return data["data"][0]["embedding"]
+            else:
+                # Возвращаем текст ответа
+                return data["choices"][0]["message"]["content"]
                 
-                if is_embedding:
-                    # Возвращаем вектор эмбеддинга
-                    return data["data"][0]["embedding"]
-                else:
-                    # Возвращаем текст ответа
-                    return data["choices"][0]["message"]["content"]
-                    
-            except httpx.HTTPStatusError as e:
-                print(f"❌ HTTP Error: {e.response.status_code} - {e.response.text}")
-                raise Exception(f"LLM API Error: {e.response.status_code}")
-            except Exception as e:
-                print(f"❌ Request Error: {e}")
-                raise Exception(f"LLM Request Failed: {str(e)}")
+        except httpx.HTTPStatusError as e:
+            print(f"❌ HTTP Error: {e.response.status_code} - {e.response.text}")
+            raise Exception(f"LLM API Error: {e.response.status_code}")
+        except Exception as e:
+            print(f"❌ Request Error: {e}")
+            raise Exception(f"LLM Request Failed: {str(e)}")
+
+    async def _stream_llm_analyses(self, prompt: str, max_tokens: int) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Потоковый запрос к LLM (stream=True, JSON mode): отдает объекты массива анализов
+        по мере того, как модель их дописывает.
+        """
+        url, headers, payload = self._build_llm_request(prompt, max_tokens=max_tokens)
+        payload["stream"] = True
+        payload["response_format"] = {"type": "json_object"}
+
+        print(f"🤖 LLM Request: {self.provider}")
+        print(f"📍 URL: {url}")
+        print("📊 Type: Chat Completion (stream)")
+
+        text = ""
+        pos = None  # позиция в text после '[' — начало еще не разобранных объектов
+        parsed_any = False
+        async with self._llm_semaphore:
+            async with self._client.stream("POST", url, headers=headers, json=payload) as response:
+                if response.status_code >= 400:
+                    body = await response.aread()
+                    print(f"❌ HTTP Error: {response.status_code} - {body[:500]!r}")
+                    raise Exception(f"LLM API Error: {response.status_code}")
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    content = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if not content:
+                        continue
+                    text += content
+
+                    if pos is None:
+                        start = text.find("[")
+                        if start < 0:
+                            continue
+                        pos = start + 1
+                    # Разбираем все объекты, которые уже дописаны целиком
+                    while True:
+                        while pos < len(text) and text[pos] in " \t\r\n,":
+                            pos += 1
+                        if pos >= len(text) or text[pos] == "]":
+                            break
+                        try:
+                            analysis_data, pos = JSON_DECODER.raw_decode(text, pos)
+                        except json.JSONDecodeError:
+                            break  # объект еще не дописан
+                        if isinstance(analysis_data, dict):
+                            parsed_any = True
+                            yield analysis_data
+
+        if not parsed_any:
+            # Модель не соблюла формат — пробуем извлечь JSON-массив из полного ответа
+            json_match = JSON_ARRAY_RE.search(text)
+            analyses = json.loads(json_match.group() if json_match else text)
+            if isinstance(analyses, dict):
+                analyses = analyses.get("analyses", [])
+            if not isinstance(analyses, list):
+                raise ValueError("LLM response has no analyses array")
+            for analysis_data in analyses:
+                if isinstance(analysis_data, dict):
+                    yield analysis_data
 
     async def _generate_job_embedding(self, job_description: str, job_title: str) -> List[float]:
         """
@@ -118,30 +254,45 @@ class HRCandidateSearchService:
         """
         # Объединяем название и описание для создания полного контекста
         full_job_context = f"Вакансия: {job_title}\n\nОписание: {job_description}"
+        cache_key = hashlib.sha256(full_job_context.encode("utf-8")).hexdigest()
+
+        cached = self._job_embedding_cache.get(cache_key)
+        if cached is not None:
+            self._job_embedding_cache.move_to_end(cache_key)
+            self.cache_stats["job_embedding_hits"] += 1
+            return cached
+        self.cache_stats["job_embedding_misses"] += 1
         
         try:
-            embedding = await self._call_llm(full_job_context, is_embedding=True)
+            # Нормируем, как и векторы профилей: сходство — скалярное произведение
+            embedding = l2_normalize(await self._call_llm(full_job_context, is_embedding=True)).tolist()
+            self._job_embedding_cache[cache_key] = embedding
+            if len(self._job_embedding_cache) > JOB_EMBEDDING_CACHE_SIZE:
+                self._job_embedding_cache.popitem(last=False)
             return embedding
         except Exception as e:
             print(f"❌ Failed to generate job embedding: {e}")
             # Возвращаем нулевой вектор в случае ошибки
             return [0.0] * self.embedding_dimension
 
-    def _apply_basic_filters(self, db: Session, required_skills: List[str], experience_level: Optional[str]) -> Any:
+    def _apply_basic_filters(self, required_skills: List[str], experience_level: Optional[str]) -> Any:
         """
         Применяет базовые фильтры по навыкам и опыту работы.
-        Возвращает QuerySet пользователей, соответствующих критериям.
+        Возвращает Core-запрос select(User.id) пользователей, соответствующих критериям
+        (ORM-объекты не создаются).
         """
-        query = db.query(User).filter(
+        query = select(User.id).where(
             User.role == UserRole.USER,  # Только обычные пользователи (не HR)
             User.is_active == True
         )
 
-        # Фильтр по навыкам программирования
+        # Фильтр по навыкам программирования.
+        # ILIKE по JSON, приведенному к VARCHAR, обслуживается GIN-индексами pg_trgm
+        # (create_skill_search_indexes.py) — выражения должны совпадать с индексными
         if required_skills and len(required_skills) > 0:
             skill_conditions = []
-            for skill in required_skills:
-                skill = skill.strip()
+            # ILIKE регистронезависим: дубликаты навыков в разном регистре не нужны
+            for skill in dict.fromkeys(skill.strip().lower() for skill in required_skills):
                 if skill:  # Проверяем, что навык не пустой
                     # Ищем в языках программирования (JSON -> текст)
                     skill_conditions.append(
@@ -158,7 +309,7 @@ class HRCandidateSearchService:
             
             if skill_conditions:
                 # Хотя бы один навык должен совпадать
-                query = query.filter(or_(*skill_conditions))
+                query = query.where(or_(*skill_conditions))
 
         # Фильтр по уровню опыта (опционально)
         if experience_level and experience_level.lower() in ['junior', 'middle', 'senior']:
@@ -197,7 +348,7 @@ class HRCandidateSearchService:
                 ])
             
             if experience_conditions:
-                query = query.filter(or_(*experience_conditions))
+                query = query.where(or_(*experience_conditions))
 
         return query
 
@@ -230,39 +381,38 @@ class HRCandidateSearchService:
             
             if additional_conditions:
                 # Хотя бы одно дополнительное условие должно выполняться
-                query = query.filter(or_(*additional_conditions))
+                query = query.where(or_(*additional_conditions))
 
         return query
 
     async def _perform_vector_search(self, db: Session, job_embedding: List[float], 
-                                   filtered_users: List[User], limit: int = 20) -> List[Tuple[User, float]]:
+                                   candidate_ids_query: Any, limit: int = 20,
+                                   total_candidates: Optional[int] = None) -> List[Tuple[User, float]]:
         """
         Выполняет векторный поиск среди отфильтрованных пользователей.
+        candidate_ids_query — select(User.id) с фильтрами навыков: в SQL он используется
+        как подзапрос, строки User (только нужные колонки) загружаются лишь для top-k.
+        total_candidates (COUNT запроса) выбирает план: точный kNN по отфильтрованным
+        или сначала ANN по индексу, затем фильтры.
         Если векторные профили отсутствуют, создает их на лету.
         Возвращает список кандидатов с их similarity scores.
         """
-        user_ids = [user.id for user in filtered_users]
-        
-        # Запрос к векторной базе для поиска наиболее похожих профилей
-        vector_results = db.query(Vec_profile, User).join(User).filter(
-            Vec_profile.user_id.in_(user_ids)
-        ).all()
-
-        print(f"🔍 Found {len(vector_results)} users with existing vector profiles")
-        
-        candidates_with_similarity = []
-        users_with_vectors = set()
+        candidate_ids = candidate_ids_query.subquery()
+        
+        # Отфильтрованные пользователи без векторного профиля (их строки нужны для текста профиля)
+        users_without_vectors = await asyncio.to_thread(
+            lambda: db.execute(
+                select(User)
+                .options(load_only(*CANDIDATE_COLUMNS))
+                .outerjoin(Vec_profile, Vec_profile.user_id == User.id)
+                .where(User.id.in_(select(candidate_ids.c.id)), Vec_profile.user_id.is_(None))
+            ).scalars().all()
+        )
         
-        # Обрабатываем пользователей с существующими векторными профилями
-        for vec_profile, user in vector_results:
-            similarity = self._cosine_similarity(job_embedding, vec_profile.vector)
-            candidates_with_similarity.append((user, similarity))
-            users_with_vectors.add(user.id)
-            print(f"📊 User {user.id} ({user.full_name or user.username}): similarity = {similarity:.3f}")
+        # Кандидаты, для которых не удалось построить профиль, идут с базовой оценкой
+        fallback_candidates = []
 
         # Для пользователей без векторных профилей создаем профили на лету
-        users_without_vectors = [user for user in filtered_users if user.id not in users_with_vectors]
-        
         if users_without_vectors:
             print(f"🔄 Creating vector profiles for {len(users_without_vectors)} users...")
             for user in users_without_vectors:
@@ -271,35 +421,104 @@ class HRCandidateSearchService:
                     user_profile_text = self._create_user_profile_text(user)
                     user_embedding = await self._call_llm(user_profile_text, is_embedding=True)
                     
-                    # Сохраняем векторный профиль в базу
+                    # Сохраняем векторный профиль в базу (нормированным, см. Vec_profile)
                     vec_profile = Vec_profile(
                         user_id=user.id,
-                        vector=user_embedding
+                        vector=l2_normalize(user_embedding)
                     )
                     db.add(vec_profile)
-                    
-                    # Вычисляем similarity
-                    similarity = self._cosine_similarity(job_embedding, user_embedding)
-                    candidates_with_similarity.append((user, similarity))
-                    print(f"✅ Created vector profile for user {user.id}: similarity = {similarity:.3f}")
+                    print(f"✅ Created vector profile for user {user.id}")
                     
                 except Exception as e:
                     print(f"❌ Failed to create vector profile for user {user.id}: {e}")
                     # Добавляем с базовой оценкой
-                    candidates_with_similarity.append((user, 0.5))
+                    fallback_candidates.append((user, 0.5))
             
-            # Сохраняем изменения в базе данных
+            # Сохраняем изменения в базе данных (до ранжирования — новые профили тоже участвуют)
             try:
-                db.commit()
+                await asyncio.to_thread(db.commit)
                 print(f"✅ Saved {len(users_without_vectors)} new vector profiles")
             except Exception as e:
                 db.rollback()
                 print(f"❌ Failed to save vector profiles: {e}")
 
+        # Ранжирование в PostgreSQL одним запросом: фильтры навыков -> векторный top-k -> строки User.
+        # Векторы нормированы, поэтому косинус равен скалярному произведению (<#> возвращает
+        # его со знаком минус). Двухэтапно: отбор по FP16-копии (halfvec-индекс),
+        # затем точный пересчет по FP32
+        if any(job_embedding):
+            candidates_with_similarity = []
+            if total_candidates is None or total_candidates > EXACT_KNN_MAX_CANDIDATES:
+                # Фильтр неселективен: ANN-подзапрос без WHERE идет по HNSW-индексу первым,
+                # фильтры применяются к его top-N (иначе планировщик сканирует кандидатов
+                # и перебирает их векторы построчно)
+                candidates_with_similarity = await asyncio.to_thread(
+                    self._rank_by_vector, db, job_embedding, candidate_ids, limit, True
+                )
+                if len(candidates_with_similarity) < limit:
+                    print("🔁 ANN top-N after filters is short, falling back to exact kNN")
+                    candidates_with_similarity = []
+            if not candidates_with_similarity:
+                # Фильтр селективен: точный kNN только по отфильтрованным профилям
+                candidates_with_similarity = await asyncio.to_thread(
+                    self._rank_by_vector, db, job_embedding, candidate_ids, limit, False
+                )
+        else:
+            # Эмбеддинг вакансии не получен (нулевой вектор) — сходство со всеми 0
+            ranking_query = (
+                select(User, literal(0.0).label("similarity"))
+                .options(load_only(*CANDIDATE_COLUMNS))
+                .join(Vec_profile, Vec_profile.user_id == User.id)
+                .where(User.id.in_(select(candidate_ids.c.id)))
+                .limit(limit)
+            )
+            candidates_with_similarity = [
+                (user, similarity)
+                for user, similarity in await asyncio.to_thread(lambda: db.execute(ranking_query).all())
+            ]
+        for user, similarity in candidates_with_similarity:
+            print(f"📊 User {user.id} ({user.full_name or user.username}): similarity = {similarity:.3f}")
+
         # Сортируем по убыванию сходства и ограничиваем количество
+        candidates_with_similarity.extend(fallback_candidates)
         candidates_with_similarity.sort(key=lambda x: x[1], reverse=True)
         return candidates_with_similarity[:limit]
 
+    def _rank_by_vector(self, db: Session, job_embedding: List[float], candidate_ids: Any,
+                        limit: int, ann_first: bool) -> List[Tuple[User, float]]:
+        """
+        Top-k отфильтрованных кандидатов по сходству с вакансией (синхронно, через asyncio.to_thread).
+        ann_first=True: ANN top-N по halfvec-индексу по всем профилям, затем фильтр по candidate_ids.
+        ann_first=False: отбор только среди candidate_ids (точный перебор при селективном фильтре).
+        В обоих случаях итоговый порядок — точное скалярное произведение по FP32.
+        """
+        shortlist = select(Vec_profile.user_id, Vec_profile.vector)
+        if ann_first:
+            shortlist_size = max(limit * ANN_OVERFETCH_FACTOR, VECTOR_RERANK_CANDIDATES)
+        else:
+            shortlist = shortlist.where(Vec_profile.user_id.in_(select(candidate_ids.c.id)))
+            shortlist_size = max(limit, VECTOR_RERANK_CANDIDATES)
+        shortlist = (
+            shortlist
+            .order_by(cast(Vec_profile.vector, HALFVEC(1024)).max_inner_product(
+                cast(job_embedding, HALFVEC(1024))
+            ))
+            .limit(shortlist_size)
+            .subquery()
+        )
+
+        distance = shortlist.c.vector.max_inner_product(job_embedding)
+        ranking_query = (
+            select(User, (-distance).label("similarity"))
+            .options(load_only(*CANDIDATE_COLUMNS))
+            .join(shortlist, shortlist.c.user_id == User.id)
+            .order_by(distance)
+            .limit(limit)
+        )
+        if ann_first:
+            ranking_query = ranking_query.where(User.id.in_(select(candidate_ids.c.id)))
+        return [(user, similarity) for user, similarity in db.execute(ranking_query).all()]
+
     def _create_user_profile_text(self, user: User) -> str:
         """
         Создает текстовое представление профиля пользователя для векторизации
@@ -399,39 +618,11 @@ class HRCandidateSearchService:
         
         return profile_text
 
-    def _cosine_similarity(self, vec1: List[float], vec2) -> float:
-        """
-        Вычисляет косинусное сходство между двумя векторами
-        """
-        try:
-            # Преобразуем в numpy arrays для вычислений
-            a = np.array(vec1)
-            b = np.array(vec2)
-            
-            # Косинусное сходство = dot(a,b) / (||a|| * ||b||)
-            dot_product = np.dot(a, b)
-            norm_a = np.linalg.norm(a)
-            norm_b = np.linalg.norm(b)
-            
-            if norm_a == 0 or norm_b == 0:
-                return 0.0
-            
-            similarity = dot_product / (norm_a * norm_b)
-            return float(similarity)
-        except Exception as e:
-            print(f"❌ Similarity calculation error: {e}")
-            return 0.0
-
-    async def _analyze_candidate_with_ai(self, user: User, job_description: str, 
-                                       job_title: str, similarity_score: float) -> CandidateMatch:
-        """
-        Анализирует отдельного кандидата с помощью LLM.
-        Генерирует детальную оценку соответствия и саммари.
-        """
-        # Формируем описание кандидата для анализа
-        candidate_info = f"""
-КАНДИДАТ:
-Имя: {user.full_name or f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username}
+    def _format_candidate_info(self, user: User, similarity_score: float) -> str:
+        """Краткое описание кандидата для промпта анализа"""
+        return f"""
+ID кандидата: {user.id}
+Имя: {user.display_name}
 Email: {user.email}
 Локация: {user.location or 'Не указана'}
 О себе: {user.about or 'Не указано'}
@@ -443,220 +634,300 @@ Email: {user.email}
 Векторная схожесть с вакансией: {similarity_score:.2f}
         """.strip()
 
-        prompt = f"""
-Проанализируй соответствие кандидата требованиям вакансии.
+    def _analysis_cache_namespace(self, user: User) -> Tuple[int, int]:
+        """Ключ кэша анализов: у User нет updated_at, поэтому версия профиля — хэш данных для промпта"""
+        return user.id, hash(self._format_candidate_info(user, 0.0))
+
+    async def _analyze_candidates_batch(self, users_with_similarity: List[Tuple[User, float]],
+                                        job_description: str, job_title: str,
+                                        job_embedding: Optional[List[float]] = None) -> List[CandidateMatch]:
+        """
+        Анализирует группу кандидатов одним запросом к LLM.
+        Вакансия и инструкции передаются один раз на всю группу; кандидаты,
+        которых нет в ответе модели, получают базовую оценку.
+        Если передан job_embedding, успешные анализы кэшируются по смыслу вакансии.
+        """
+        results: Dict[int, CandidateMatch] = {}
+        pending = []
+        for user, similarity_score in users_with_similarity:
+            if job_embedding is not None:
+                cached = self._analysis_cache.get(job_embedding, namespace=self._analysis_cache_namespace(user))
+                if cached is not None:
+                    self.cache_stats["analysis_hits"] += 1
+                    results[user.id] = cached.model_copy(update={"similarity_score": similarity_score})
+                    continue
+                self.cache_stats["analysis_misses"] += 1
+            pending.append((user, similarity_score))
+
+        if pending:
+            candidates_block = "\n\n".join(
+                f"КАНДИДАТ {index}:\n{self._format_candidate_info(user, similarity_score)}"
+                for index, (user, similarity_score) in enumerate(pending, 1)
+            )
+
+            prompt = f"""
+Проанализируй соответствие каждого кандидата требованиям вакансии.
 
 ВАКАНСИЯ:
 Название: {job_title}
 Описание: {job_description}
 
-{candidate_info}
+{candidates_block}
 
-ЗАДАЧИ:
+ЗАДАЧИ (для каждого кандидата):
 1. Оцени соответствие кандидата от 0.0 до 1.0 (где 1.0 - идеальное соответствие)
 2. Выдели 2-3 основные сильные стороны кандидата
 3. Укажи 1-2 области для развития или недостающие навыки
 4. Напиши краткое заключение (2-3 предложения)
 
-ОТВЕТ В ФОРМАТЕ JSON:
+ОТВЕТ В ФОРМАТЕ JSON, в массиве analyses по одному объекту на кандидата:
 {{
-    "match_score": 0.85,
-    "strengths": ["Сильная сторона 1", "Сильная сторона 2"],
-    "growth_areas": ["Область для развития 1", "Область для развития 2"],
-    "summary": "Краткое заключение об этом кандидате и его соответствии вакансии"
+    "analyses": [
+        {{
+            "user_id": 123,
+            "match_score": 0.85,
+            "strengths": ["Сильная сторона 1", "Сильная сторона 2"],
+            "growth_areas": ["Область для развития 1", "Область для развития 2"],
+            "summary": "Краткое заключение об этом кандидате и его соответствии вакансии"
+        }}
+    ]
 }}
 
-ВАЖНО: Отвечай ТОЛЬКО JSON без дополнительного текста!
-        """
+ВАЖНО: Отвечай ТОЛЬКО JSON без дополнительного текста! user_id бери из поля "ID кандидата".
+            """
 
-        try:
-            ai_response = await self._call_llm(prompt)
-            
-            # Извлекаем JSON из ответа
-            json_match = re.search(r'\{[\s\S]*\}', ai_response)
-            if json_match:
-                analysis_data = json.loads(json_match.group())
-            else:
-                analysis_data = json.loads(ai_response)
-
-            # Создаем объект CandidateMatch
-            return CandidateMatch(
-                user_id=user.id,
-                full_name=user.full_name or f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username,
-                email=user.email,
-                current_position=self._extract_current_position(user),
-                experience_years=self._calculate_experience_years(user),
-                key_skills=user.other_competencies or [],
-                programming_languages=user.programming_languages or [],
-                match_score=analysis_data.get("match_score", 0.5),
-                ai_summary=analysis_data.get("summary", "Анализ недоступен"),
-                strengths=analysis_data.get("strengths", []),
-                growth_areas=analysis_data.get("growth_areas", []),
-                similarity_score=similarity_score
-            )
+            pending_by_id = {user.id: (user, similarity_score) for user, similarity_score in pending}
+            try:
+                # Анализы разбираются по мере генерации: если ответ оборвется на лимите токенов,
+                # уже завершенные объекты не теряются
+                async for analysis_data in self._stream_llm_analyses(
+                    prompt, max_tokens=ANALYSIS_TOKENS_PER_CANDIDATE * len(pending)
+                ):
+                    try:
+                        user_id = int(analysis_data.get("user_id"))
+                    except (TypeError, ValueError):
+                        continue
+                    if user_id not in pending_by_id or user_id in results:
+                        continue
+                    user, similarity_score = pending_by_id[user_id]
+                    current_position, experience_years = self._summarize_experience(user)
+                    candidate_match = CandidateMatch(
+                        user_id=user.id,
+                        full_name=user.display_name,
+                        email=user.email,
+                        current_position=current_position,
+                        experience_years=experience_years,
+                        key_skills=user.other_competencies or [],
+                        programming_languages=user.programming_languages or [],
+                        match_score=_normalize_llm_score(analysis_data.get("match_score", 0.5)),
+                        ai_summary=analysis_data.get("summary", "Анализ недоступен"),
+                        strengths=analysis_data.get("strengths", []),
+                        growth_areas=analysis_data.get("growth_areas", []),
+                        similarity_score=similarity_score
+                    )
+                    if job_embedding is not None:
+                        self._analysis_cache.put(
+                            job_embedding, candidate_match, namespace=self._analysis_cache_namespace(user)
+                        )
+                    results[user.id] = candidate_match
 
-        except Exception as e:
-            print(f"❌ AI analysis error for user {user.id}: {e}")
-            # Возвращаем базовую оценку в случае ошибки
-            return self._create_fallback_candidate_match(user, similarity_score)
+            except Exception as e:
+                print(f"❌ AI batch analysis error for users {[user.id for user, _ in pending]}: {e}")
 
-    def _extract_current_position(self, user: User) -> Optional[str]:
-        """Извлекает текущую позицию из опыта работы"""
+            for user, _ in pending:
+                if user.id not in results:
+                    print(f"⚠️ No AI analysis returned for user {user.id}")
+
+        # Базовая оценка для тех, кого не удалось проанализировать
+        return [
+            results.get(user.id) or self._create_fallback_candidate_match(user, similarity_score)
+            for user, similarity_score in users_with_similarity
+        ]
+
+    def _summarize_experience(self, user: User) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Один проход по опыту работы: (текущая позиция, общий опыт).
+        Текущая позиция — первая работа с is_current или без period_end, иначе первая в списке.
+        """
         if not user.work_experience:
-            return None
-        
-        # Ищем текущую работу (is_current: true или нет end_date)
+            return None, None
+
+        current_position = None
+        current_found = False
+        positions_with_dates = 0
         for experience in user.work_experience:
-            if isinstance(experience, dict):
-                if experience.get('is_current') or not experience.get('period_end'):
-                    return experience.get('role') or experience.get('position')
-        
+            if not isinstance(experience, dict):
+                continue
+            # Ищем текущую работу (is_current: true или нет end_date)
+            if not current_found and (experience.get('is_current') or not experience.get('period_end')):
+                current_position = experience.get('role') or experience.get('position')
+                current_found = True
+            # Простая оценка: считаем год за каждую позицию с датами начала и конца
+            if experience.get('period_start') and experience.get('period_end'):
+                positions_with_dates += 1
+
         # Если текущая работа не найдена, возвращаем последнюю
-        if user.work_experience:
-            last_exp = user.work_experience[0] if isinstance(user.work_experience[0], dict) else None
-            if last_exp:
-                return last_exp.get('role') or last_exp.get('position')
-        
-        return None
+        if not current_found:
+            last_exp = user.work_experience[0]
+            if isinstance(last_exp, dict):
+                current_position = last_exp.get('role') or last_exp.get('position')
 
-    def _calculate_experience_years(self, user: User) -> Optional[str]:
-        """Вычисляет общий опыт работы в годах"""
-        if not user.work_experience:
-            return None
-        
-        total_months = 0
-        for experience in user.work_experience:
-            if isinstance(experience, dict):
-                start_date = experience.get('period_start')
-                end_date = experience.get('period_end') 
-                
-                # Простая оценка: если есть даты, считаем разность
-                if start_date and end_date:
-                    try:
-                        # Примерная логика подсчета (можно улучшить)
-                        total_months += 12  # Заглушка: считаем год за каждую позицию
-                    except:
-                        pass
-        
+        total_months = positions_with_dates * 12
         if total_months > 0:
             years = total_months // 12
-            return f"{years} лет" if years > 1 else f"{total_months} мес."
-        
-        return "Опыт не указан"
+            experience_years = f"{years} лет" if years > 1 else f"{total_months} мес."
+        else:
+            experience_years = "Опыт не указан"
+
+        return current_position, experience_years
 
     def _create_fallback_candidate_match(self, user: User, similarity_score: float) -> CandidateMatch:
         """Создает базовую оценку кандидата при ошибке AI"""
         base_score = min(0.8, similarity_score + 0.2) if similarity_score > 0.5 else similarity_score
         
+        current_position, experience_years = self._summarize_experience(user)
         return CandidateMatch(
             user_id=user.id,
-            full_name=user.full_name or f"{user.first_name or ''} {user.last_name or ''}".strip() or user.username,
+            full_name=user.display_name,
             email=user.email,
-            current_position=self._extract_current_position(user),
-            experience_years=self._calculate_experience_years(user),
+            current_position=current_position,
+            experience_years=experience_years,
             key_skills=user.other_competencies or [],
             programming_languages=user.programming_languages or [],
-            match_score=round(base_score, 2),
+            match_score=round(_clamp_score(base_score), 2),
             ai_summary="Базовая оценка на основе векторного сходства профиля",
             strengths=["Есть релевантный опыт"] if similarity_score > 0.6 else [],
             growth_areas=["Требует дополнительного анализа"],
             similarity_score=similarity_score
         )
 
+    def _create_strong_candidate_match(self, user: User, similarity_score: float) -> CandidateMatch:
+        """Создает оценку кандидата с высоким векторным сходством без вызова AI"""
+        current_position, experience_years = self._summarize_experience(user)
+        return CandidateMatch(
+            user_id=user.id,
+            full_name=user.display_name,
+            email=user.email,
+            current_position=current_position,
+            experience_years=experience_years,
+            key_skills=user.other_competencies or [],
+            programming_languages=user.programming_languages or [],
+            match_score=round(_clamp_score(similarity_score), 2),
+            ai_summary="Профиль кандидата очень близок к описанию вакансии по векторному сходству",
+            strengths=["Профиль близок к требованиям вакансии"],
+            growth_areas=[],
+            similarity_score=similarity_score
+        )
+
     async def search_candidates(self, db: Session, request: CandidateSearchRequest) -> CandidateSearchResponse:
         """
         Основная функция поиска кандидатов.
         Реализует полный цикл: фильтрация -> векторный поиск -> AI анализ
         """
         start_time = time.time()
-        applied_filters = []
 
         print(f"🔍 Starting candidate search for: {request.job_title}")
         
-        # Шаг 1: Применяем базовые фильтры
-        print("📋 Applying basic filters...")
-        base_query = self._apply_basic_filters(db, request.required_skills, request.experience_level)
-        base_candidates = base_query.all()
-        
-        if request.required_skills:
-            applied_filters.append(f"Skills: {', '.join(request.required_skills)}")
-        if request.experience_level:
-            applied_filters.append(f"Experience: {request.experience_level}")
-        
-        print(f"📊 Found {len(base_candidates)} candidates after basic filtering")
-
-        # Шаг 2: Дополнительная фильтрация, если слишком много кандидатов
-        filtered_candidates = base_candidates
-        if len(base_candidates) > request.threshold_filter_limit:
-            print(f"⚡ Too many candidates ({len(base_candidates)}), applying additional filters...")
-            
-            # Извлекаем дополнительные ключевые слова из описания вакансии
-            additional_keywords = self._extract_key_terms(request.job_description)
-            additional_query = self._apply_additional_filters(base_query, additional_keywords)
-            filtered_candidates = additional_query.all()
-            
-            applied_filters.append(f"Additional keywords: {', '.join(additional_keywords[:3])}")
-            print(f"📊 After additional filtering: {len(filtered_candidates)} candidates")
-
-        # Шаг 3: Генерируем векторное представление вакансии
-        print("🧠 Generating job embedding...")
-        job_embedding = await self._generate_job_embedding(request.job_description, request.job_title)
+        # Шаги 1-2 (синхронные запросы к БД) выполняются в пуле потоков
+        # параллельно с шагом 3 (эмбеддинг вакансии): они не зависят друг от друга
+        print("📋 Applying filters and generating job embedding...")
+        (candidate_ids_query, total_found, applied_filters), job_embedding = await asyncio.gather(
+            asyncio.to_thread(self._filter_candidates, db, request),
+            self._generate_job_embedding(request.job_description, request.job_title),
+        )
 
         # Шаг 4: Векторный поиск среди отфильтрованных кандидатов  
         print("🔎 Performing vector similarity search...")
         candidates_with_similarity = await self._perform_vector_search(
-            db, job_embedding, filtered_candidates, request.max_candidates
+            db, job_embedding, candidate_ids_query, request.max_candidates, total_found
         )
 
-        # Шаг 5: AI-анализ каждого кандидата
-        print(f"🤖 Analyzing {len(candidates_with_similarity)} candidates with AI...")
+        # Шаг 5: AI-анализ кандидатов группами по ANALYSIS_BATCH_SIZE.
+        # Очевидно слабые и очевидно сильные по векторному сходству оцениваются без LLM
         analyzed_candidates = []
-        
+        needs_ai = []
         for user, similarity in candidates_with_similarity:
-            try:
-                candidate_match = await self._analyze_candidate_with_ai(
-                    user, request.job_description, request.job_title, similarity
-                )
-                analyzed_candidates.append(candidate_match)
-            except Exception as e:
-                print(f"❌ Failed to analyze candidate {user.id}: {e}")
-                # Добавляем базовую оценку
-                fallback_match = self._create_fallback_candidate_match(user, similarity)
-                analyzed_candidates.append(fallback_match)
+            if similarity < settings.candidate_ai_min_similarity:
+                analyzed_candidates.append(self._create_fallback_candidate_match(user, similarity))
+            elif similarity > settings.candidate_ai_max_similarity:
+                analyzed_candidates.append(self._create_strong_candidate_match(user, similarity))
+            else:
+                needs_ai.append((user, similarity))
+
+        print(f"🤖 Analyzing {len(needs_ai)} of {len(candidates_with_similarity)} candidates with AI...")
+        # Группы независимы — запускаем их параллельно, не более llm_max_concurrency одновременно
+        batches = await asyncio.gather(*[
+            self._analyze_candidates_batch(
+                needs_ai[i:i + ANALYSIS_BATCH_SIZE],
+                request.job_description, request.job_title, job_embedding
+            )
+            for i in range(0, len(needs_ai), ANALYSIS_BATCH_SIZE)
+        ])
+        analyzed_candidates.extend(candidate for batch in batches for candidate in batch)
 
         # Шаг 6: Сортируем по финальной оценке AI
         analyzed_candidates.sort(key=lambda x: x.match_score, reverse=True)
 
         processing_time = time.time() - start_time
         print(f"✅ Search completed in {processing_time:.2f}s")
+        print(f"📦 Cache stats: {dict(self.cache_stats)}")
 
         return CandidateSearchResponse(
             job_title=request.job_title,
-            total_profiles_found=len(filtered_candidates),
+            total_profiles_found=total_found,
             processed_by_ai=len(analyzed_candidates),
             filters_applied=applied_filters,
             candidates=analyzed_candidates,
             processing_time_seconds=round(processing_time, 2)
         )
 
+    def _filter_candidates(self, db: Session, request: CandidateSearchRequest) -> Tuple[Any, int, List[str]]:
+        """
+        Шаги 1-2 поиска: базовые фильтры и, если кандидатов слишком много, дополнительные.
+        Строки пользователей не загружаются — только считаются через COUNT.
+        Синхронная функция — вызывается через asyncio.to_thread.
+        Возвращает (select(User.id) отфильтрованных кандидатов, их количество, описания примененных фильтров).
+        """
+        applied_filters = []
+
+        # Шаг 1: Применяем базовые фильтры
+        print("📋 Applying basic filters...")
+        base_query = self._apply_basic_filters(request.required_skills, request.experience_level)
+        base_count = self._count(db, base_query)
+        
+        if request.required_skills:
+            applied_filters.append(f"Skills: {', '.join(request.required_skills)}")
+        if request.experience_level:
+            applied_filters.append(f"Experience: {request.experience_level}")
+        
+        print(f"📊 Found {base_count} candidates after basic filtering")
+
+        # Шаг 2: Дополнительная фильтрация, если слишком много кандидатов
+        candidate_ids_query, total_found = base_query, base_count
+        if base_count > request.threshold_filter_limit:
+            print(f"⚡ Too many candidates ({base_count}), applying additional filters...")
+            
+            # Извлекаем дополнительные ключевые слова из описания вакансии
+            additional_keywords = self._extract_key_terms(request.job_description)
+            candidate_ids_query = self._apply_additional_filters(base_query, additional_keywords)
+            total_found = self._count(db, candidate_ids_query)
+            
+            applied_filters.append(f"Additional keywords: {', '.join(additional_keywords[:3])}")
+            print(f"📊 After additional filtering: {total_found} candidates")
+
+        return candidate_ids_query, total_found, applied_filters
+
+    def _count(self, db: Session, query: Any) -> int:
+        """COUNT(*) по Core-запросу"""
+        return db.scalar(select(func.count()).select_from(query.subquery()))
+
     def _extract_key_terms(self, text: str) -> List[str]:
         """
         Извлекает ключевые термины из описания вакансии для дополнительной фильтрации
         """
         # Простая эвристика для извлечения ключевых слов
-        key_terms = []
-        
-        # Общие IT термины
-        it_terms = [
-            'backend', 'frontend', 'fullstack', 'devops', 'qa', 'analyst', 'manager',
-            'mobile', 'web', 'api', 'database', 'cloud', 'docker', 'kubernetes',
-            'agile', 'scrum', 'team lead', 'architect', 'senior', 'middle', 'junior'
-        ]
-        
-        text_lower = text.lower()
-        for term in it_terms:
-            if term in text_lower:
-                key_terms.append(term)
+        found = {m.group(1) for m in IT_TERMS_RE.finditer(text.lower())}
+        key_terms = [term for term in IT_TERMS if term in found]
         
         return key_terms[:5]  # Ограничиваем количество дополнительных терминов
 
@@ -0,0 +1,37 @@
+"""
+Скалярное int8-квантование embedding-векторов.
+
+Вектор хранится как int8 (в 4 раза меньше float32), квантуется с масштабом
+scale = max|v| / 127: v ≈ q * scale. Для косинусной схожести масштабы сокращаются,
+поэтому ранжирование выполняется прямо по целочисленным векторам, а scale не хранится.
+"""
+
+import numpy as np
+
+
+def l2_normalize(vector) -> np.ndarray:
+    """Нормирует вектор к единичной длине (нулевой вектор возвращается как есть)"""
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.sqrt(np.dot(v, v))
+    return v / norm if norm > 0 else v
+
+
+def int8_inverse_norms(Q: np.ndarray) -> np.ndarray:
+    """
+    Обратные нормы строк int8-матрицы (0 для нулевых строк).
+    Считаются один раз при добавлении векторов, чтобы при поиске косинус
+    сводился к скалярному произведению и умножению.
+    """
+    Q32 = Q.astype(np.int32)
+    norms = np.sqrt(np.einsum('ij,ij->i', Q32, Q32).astype(np.float64))
+    return np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+
+def quantize_int8(vector) -> np.ndarray:
+    """Квантует вектор в int8 с масштабом на вектор"""
+    v = np.asarray(vector, dtype=np.float32)
+    max_abs = float(np.max(np.abs(v))) if v.size else 0.0
+    if max_abs == 0.0:
+        return np.zeros(v.shape, dtype=np.int8)
+    scale = max_abs / 127.0
+    return np.clip(np.round(v / scale), -127, 127).astype(np.int8)
@@ -0,0 +1,96 @@
+"""
+Семантический кэш ответов по embedding-векторам запросов.
+
+Запросы, близкие по смыслу (косинусная схожесть выше порога), получают
+сохранённый ранее ответ без повторного вызова LLM.
+Для быстрого поиска кандидатов используется LSH на случайных проекциях:
+знаки проекций вектора на n_planes гиперплоскостей дают номер корзины,
+и косинус считается только внутри своей корзины.
+Хранение — в памяти процесса, с вытеснением по LRU и TTL.
+"""
+
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """LRU+TTL кэш с приближённым поиском по косинусной схожести"""
+
+    def __init__(self, dim: int, n_planes: int = 8, threshold: float = 0.95,
+                 max_entries: int = 1024, ttl_seconds: float = 3600.0, seed: int = 0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((n_planes, dim)).astype(np.float32)
+        self._powers = (1 << np.arange(n_planes)).astype(np.int64)
+        # entry_id -> (bucket_key, нормированный вектор, значение, время записи)
+        self._entries: "OrderedDict[int, Tuple[Tuple[Hashable, int], np.ndarray, Any, float]]" = OrderedDict()
+        self._buckets: Dict[Tuple[Hashable, int], List[int]] = {}
+        self._ids = count()
+
+    def _normalize(self, embedding) -> Optional[np.ndarray]:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.sqrt(np.dot(vec, vec))
+        if norm == 0:
+            return None
+        return vec / norm
+
+    def _bucket_key(self, vec: np.ndarray, namespace: Hashable) -> Tuple[Hashable, int]:
+        bits = (self._planes @ vec) > 0
+        return namespace, int(bits @ self._powers)
+
+    def _remove(self, entry_id: int):
+        bucket_key, _, _, _ = self._entries.pop(entry_id)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is not None:
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[bucket_key]
+
+    def get(self, embedding, namespace: Hashable = None) -> Optional[Any]:
+        """Возвращает сохранённое значение для похожего запроса или None"""
+        vec = self._normalize(embedding)
+        if vec is None:
+            return None
+        bucket_key = self._bucket_key(vec, namespace)
+        entry_ids = self._buckets.get(bucket_key)
+        if not entry_ids:
+            return None
+
+        now = time.monotonic()
+        for entry_id in [e for e in entry_ids if now - self._entries[e][3] > self.ttl_seconds]:
+            self._remove(entry_id)
+        entry_ids = self._buckets.get(bucket_key)
+        if not entry_ids:
+            return None
+
+        matrix = np.stack([self._entries[e][1] for e in entry_ids])
+        sims = matrix @ vec
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+
+        entry_id = entry_ids[best]
+        self._entries.move_to_end(entry_id)
+        return self._entries[entry_id][2]
+
+    def put(self, embedding, value: Any, namespace: Hashable = None):
+        """Сохраняет значение для запроса; при переполнении вытесняет самые старые записи"""
+        vec = self._normalize(embedding)
+        if vec is None:
+            return
+        bucket_key = self._bucket_key(vec, namespace)
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (bucket_key, vec, value, time.monotonic())
+        self._buckets.setdefault(bucket_key, []).append(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
@@ -0,0 +1,99 @@
+"""
+In-memory индекс int8-векторов открытых вакансий для AI-ассистента.
+
+Держит матрицу (N, dim) int8 по всему корпусу открытых вакансий и отметки
+updated_at, по которым при каждом поиске досинхронизируются только новые,
+изменённые и закрытые вакансии. Обратные нормы векторов считаются при
+добавлении, поэтому поиск топ-k — одно целочисленное умножение, масштабирование
+и частичная сортировка, без ограничения числа просматриваемых вакансий.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.quantization import int8_inverse_norms
+
+
+class VacancyVectorIndex:
+    """Индекс вакансий: vacancy_id -> int8-вектор"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._ids = np.empty(0, dtype=np.int64)
+        self._Q = np.empty((0, dim), dtype=np.int8)
+        self._inv_norms = np.empty(0, dtype=np.float64)
+        self._positions: Dict[int, int] = {}
+        self._versions: Dict[int, Optional[datetime]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def diff(self, current: Iterable[Tuple[int, Optional[datetime]]]) -> Tuple[List[int], List[int]]:
+        """
+        Сравнивает индекс с актуальным списком (id, updated_at) открытых вакансий.
+        Возвращает (id для добавления/обновления, id для удаления).
+        """
+        current_versions = dict(current)
+        stale = [
+            vacancy_id for vacancy_id, updated_at in current_versions.items()
+            if vacancy_id not in self._versions or self._versions[vacancy_id] != updated_at
+        ]
+        removed = [vacancy_id for vacancy_id in self._versions if vacancy_id not in current_versions]
+        return stale, removed
+
+    def upsert(self, ids: List[int], Q: np.ndarray, versions: List[Optional[datetime]]):
+        """Добавляет или обновляет векторы вакансий"""
+        Q = np.asarray(Q, dtype=np.int8)
+        inv_norms = int8_inverse_norms(Q)
+        new_rows = []
+        new_ids = []
+        new_inv_norms = []
+        for vacancy_id, q, inv_norm, version in zip(ids, Q, inv_norms, versions):
+            pos = self._positions.get(vacancy_id)
+            if pos is not None:
+                self._Q[pos] = q
+                self._inv_norms[pos] = inv_norm
+            else:
+                self._positions[vacancy_id] = len(self._ids) + len(new_ids)
+                new_ids.append(vacancy_id)
+                new_rows.append(q)
+                new_inv_norms.append(inv_norm)
+            self._versions[vacancy_id] = version
+        if new_ids:
+            self._ids = np.concatenate([self._ids, np.asarray(new_ids, dtype=np.int64)])
+            self._Q = np.concatenate([self._Q, np.stack(new_rows).astype(np.int8)])
+            self._inv_norms = np.concatenate([self._inv_norms, np.asarray(new_inv_norms, dtype=np.float64)])
+
+    def remove(self, ids: List[int]):
+        """Удаляет вакансии из индекса (закрытые или удалённые)"""
+        drop = [self._positions[vacancy_id] for vacancy_id in ids if vacancy_id in self._positions]
+        for vacancy_id in ids:
+            self._versions.pop(vacancy_id, None)
+        if not drop:
+            return
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[drop] = False
+        self._ids = self._ids[keep]
+        self._Q = self._Q[keep]
+        self._inv_norms = self._inv_norms[keep]
+        self._positions = {int(vacancy_id): pos for pos, vacancy_id in enumerate(self._ids)}
+
+    def search(self, u_q: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Возвращает топ-k (vacancy_id, cosine similarity) по убыванию схожести"""
+        if not len(self._ids) or k <= 0:
+            return []
+        u_q = np.asarray(u_q, dtype=np.int8)
+        u_dot = float(np.einsum('j,j->', u_q, u_q, dtype=np.int32))
+        if u_dot == 0:
+            return []
+        # einsum накапливает в int32 поблочно: матрица читается как int8, без копии (N, dim) int32
+        dots = np.einsum('ij,j->i', self._Q, u_q, dtype=np.int32)
+        sims = dots * self._inv_norms / np.sqrt(u_dot)
+        if k < len(sims):
+            top_idx = np.argpartition(-sims, k)[:k]
+        else:
+            top_idx = np.arange(len(sims))
+        top_idx = top_idx[np.argsort(-sims[top_idx])]
+        return [(int(self._ids[i]), float(sims[i])) for i in top_idx]
@@ -0,0 +1,34 @@
+"""
+Скрипт для создания trigram-индексов поиска кандидатов по навыкам
+"""
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+# Выражения совпадают с фильтрами HRCandidateSearchService._apply_basic_filters
+# (JSON-поле, приведенное к VARCHAR, + ILIKE '%навык%'), иначе индекс не используется
+SKILL_SEARCH_INDEXES = {
+    "ix_users_programming_languages_trgm": "((programming_languages::varchar) gin_trgm_ops)",
+    "ix_users_other_competencies_trgm": "((other_competencies::varchar) gin_trgm_ops)",
+    "ix_users_about_trgm": "(about gin_trgm_ops)",
+}
+
+def create_skill_search_indexes():
+    """Создает GIN-индексы pg_trgm для ILIKE-поиска навыков и обновляет статистику"""
+    try:
+        # Создаем движок базы данных
+        engine = create_engine(settings.database_url)
+
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for name, expression in SKILL_SEARCH_INDEXES.items():
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON users USING gin {expression}"))
+            conn.execute(text("ANALYZE users"))
+
+        print(f"✅ Индексы поиска по навыкам созданы: {', '.join(SKILL_SEARCH_INDEXES)}")
+
+    except Exception as e:
+        print(f"❌ Ошибка при создании индексов: {e}")
+
+if __name__ == "__main__":
+    create_skill_search_indexes()
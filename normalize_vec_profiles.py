@@ -0,0 +1,34 @@
+"""
+Скрипт для нормализации векторных профилей (vec_profiles)
+"""
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def normalize_vec_profiles():
+    """
+    Нормирует существующие векторы профилей и пересоздает HNSW-индекс по их
+    FP16-копии (halfvec). Запускать также после смены embedding-модели.
+    """
+    try:
+        # Создаем движок базы данных
+        engine = create_engine(settings.database_url)
+
+        with engine.begin() as conn:
+            # l2_normalize — функция pgvector (>= 0.7.0)
+            result = conn.execute(text("UPDATE vec_profiles SET vector = l2_normalize(vector)"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_vec_profiles_vector_hnsw"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_vec_profiles_vector_halfvec_hnsw"))
+            conn.execute(text(
+                "CREATE INDEX ix_vec_profiles_vector_halfvec_hnsw ON vec_profiles "
+                "USING hnsw ((vector::halfvec(1024)) halfvec_ip_ops)"
+            ))
+            conn.execute(text("ANALYZE vec_profiles"))
+
+        print(f"✅ Нормализовано векторных профилей: {result.rowcount}")
+
+    except Exception as e:
+        print(f"❌ Ошибка при нормализации векторов: {e}")
+
+if __name__ == "__main__":
+    normalize_vec_profiles()